@@ -0,0 +1,68 @@
+"""
+bench commands for the Confidential App.
+
+Discovered by bench through the ``commands`` list below, e.g.::
+
+    bench --site yoursite.local rebuild-confidential-access
+"""
+
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-confidential-access")
+@click.option("--doctype", help="Only rebuild rows for this DocType (BOM, Stock Entry or Work Order)")
+@pass_context
+def rebuild_confidential_access(context, doctype=None):
+    """Regenerate the Confidential Effective Access table from the child-table mappings."""
+    import frappe
+    from confidential_app.confidential_app.utils.effective_access import rebuild_effective_access
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        rebuild_effective_access(doctype)
+        frappe.db.commit()
+    finally:
+        frappe.destroy()
+
+
+@click.command("export-confidential-access-log")
+@click.option("--from-date", required=True, help="First day to export (YYYY-MM-DD)")
+@click.option("--to-date", required=True, help="Last day to export (YYYY-MM-DD)")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default="csv", show_default=True)
+@click.option("--output", required=True, type=click.Path(dir_okay=False), help="File to write")
+@click.option("--user", help="Only entries of this user")
+@click.option("--access-type", help="Only this access type (View, Print, Export, Denied, Modified)")
+@click.option("--reference-doctype", help="Only entries for this DocType")
+@click.option("--reference-name", help="Only entries for this document")
+@pass_context
+def export_confidential_access_log(context, from_date, to_date, fmt, output, user=None,
+                                   access_type=None, reference_doctype=None, reference_name=None):
+    """Stream Confidential Access Log entries for a date range to a CSV or JSONL file."""
+    import os
+
+    import frappe
+    from confidential_app.confidential_app.utils.audit_export import export_access_log_to_file
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        export_access_log_to_file(
+            output, from_date, to_date,
+            filters={
+                "user": user,
+                "access_type": access_type,
+                "reference_doctype": reference_doctype,
+                "reference_name": reference_name,
+            },
+            fmt=fmt,
+        )
+    finally:
+        frappe.destroy()
+    click.echo(f"Wrote {output} ({os.path.getsize(output)} bytes)")
+
+
+commands = [rebuild_confidential_access, export_confidential_access_log]
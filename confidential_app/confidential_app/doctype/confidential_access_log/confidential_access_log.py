@@ -11,19 +11,24 @@ class ConfidentialAccessLog(Document):
 			self.ip_address = frappe.local.request_ip if hasattr(frappe.local, "request_ip") else ""
 
 
+def on_doctype_update():
+	"""Composite indexes for the audit lookups (by document and by user, newest first)."""
+	frappe.db.add_index(
+		"Confidential Access Log",
+		["reference_doctype", "reference_name", "timestamp"],
+		"reference_timestamp_index",
+	)
+	frappe.db.add_index("Confidential Access Log", ["user", "timestamp"], "user_timestamp_index")
+
+
 def log_access(user, access_type, reference_doctype, reference_name, details=None):
-	"""Create an audit log entry for confidential document access."""
+	"""Record an audit event for confidential document access.
+
+	The event is journaled and written in a batch at the end of the request
+	(see confidential_app.confidential_app.utils.audit).
+	"""
 	try:
-		log = frappe.get_doc({
-			"doctype": "Confidential Access Log",
-			"user": user,
-			"access_type": access_type,
-			"reference_doctype": reference_doctype,
-			"reference_name": reference_name,
-			"details": details,
-			"timestamp": now_datetime(),
-			"ip_address": frappe.local.request_ip if hasattr(frappe.local, "request_ip") else "",
-		})
-		log.insert(ignore_permissions=True)
+		from confidential_app.confidential_app.utils.audit import enqueue_access_event
+		enqueue_access_event(user, access_type, reference_doctype, reference_name, details)
 	except Exception:
 		frappe.log_error("Failed to create Confidential Access Log", frappe.get_traceback())
@@ -0,0 +1,20 @@
+import frappe
+from frappe.model.document import Document
+
+
+class ConfidentialAccessRollup(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index(
+		"Confidential Access Rollup",
+		["date", "access_type"],
+		"date_access_type_index",
+	)
+	frappe.db.add_index(
+		"Confidential Access Rollup",
+		["reference_doctype", "reference_name", "date"],
+		"reference_date_index",
+	)
+	frappe.db.add_index("Confidential Access Rollup", ["user", "date"], "user_date_index")
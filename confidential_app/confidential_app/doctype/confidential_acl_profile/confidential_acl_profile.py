@@ -0,0 +1,14 @@
+import frappe
+from frappe.model.document import Document
+
+
+class ConfidentialACLProfile(Document):
+	def on_update(self):
+		from confidential_app.confidential_app.utils.effective_access import sync_effective_access
+		sync_effective_access(self.doctype, [self.name])
+
+	def on_trash(self):
+		frappe.db.delete(
+			"Confidential Effective Access",
+			{"reference_doctype": self.doctype, "reference_name": self.name},
+		)
@@ -0,0 +1,11 @@
+import frappe
+from frappe.model.document import Document
+
+
+class ConfidentialBOMClosure(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Confidential BOM Closure", ["ancestor", "descendant"])
+	frappe.db.add_index("Confidential BOM Closure", ["descendant", "ancestor"])
@@ -0,0 +1,19 @@
+import frappe
+from frappe.model.document import Document
+
+
+class ConfidentialEffectiveAccess(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index(
+		"Confidential Effective Access",
+		["reference_doctype", "principal_type", "principal", "reference_name"],
+		"principal_lookup_index",
+	)
+	frappe.db.add_index(
+		"Confidential Effective Access",
+		["reference_doctype", "reference_name"],
+		"reference_index",
+	)
@@ -0,0 +1,12 @@
+import frappe
+from frappe.model.document import Document
+
+
+class ConfidentialNotificationPreference(Document):
+	def on_update(self):
+		from confidential_app.confidential_app.utils.notifications import clear_delivery_mode_cache
+		clear_delivery_mode_cache()
+
+	def on_trash(self):
+		from confidential_app.confidential_app.utils.notifications import clear_delivery_mode_cache
+		clear_delivery_mode_cache()
@@ -0,0 +1,11 @@
+import frappe
+from frappe.model.document import Document
+
+
+class ConfidentialPropagationJob(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Confidential Propagation Job", ["bom", "status"], "bom_status_index")
+	frappe.db.add_index("Confidential Propagation Job", ["status", "modified"], "status_modified_index")
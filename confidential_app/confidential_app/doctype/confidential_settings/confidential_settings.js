@@ -0,0 +1,16 @@
+frappe.ui.form.on("Confidential Settings", {
+  refresh: function (frm) {
+    if (frm.doc.debug_mode && frappe.user_roles.includes("System Manager")) {
+      frm.add_custom_button(__("Clear Debug Log"), function () {
+        frappe.call({
+          method:
+            "confidential_app.confidential_app.doctype.confidential_settings.confidential_settings.clear_debug_log",
+          callback: function () {
+            frappe.show_alert({ message: __("Debug log cleared"), indicator: "green" });
+            frm.reload_doc();
+          },
+        });
+      });
+    }
+  },
+});
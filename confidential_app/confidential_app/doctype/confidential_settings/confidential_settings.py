@@ -2,52 +2,100 @@ import frappe
 import json
 from frappe.model.document import Document
 from frappe.utils import now
+from redis.exceptions import RedisError
+
+from confidential_app.config.settings import CASCADE_MODE_CLOSURE, DEBUG_LOG_MAX_ENTRIES
 
 CONFIDENTIAL_SETTINGS_CACHE_KEY = "confidential_settings_v2"
+DEBUG_LOG_KEY = "confidential_debug_log"
+
+# Read-only fields written by background jobs (set_single_value); a form
+# opened before the job ran must not save its stale copy back.
+JOB_MANAGED_FIELDS = ("bom_closure_ready", "access_rollup_watermark")
 
 
 class ConfidentialSettings(Document):
+	def onload(self):
+		# Shown read-only on the form; the entries live in Redis (see add_debug_log).
+		if self.debug_mode:
+			self.debug_logs = "\n---\n".join(get_debug_log_entries())
+
 	def validate(self):
-		if not self.debug_mode and self.debug_logs:
-			self.debug_logs = ""
+		self.debug_logs = ""
+		for fieldname in JOB_MANAGED_FIELDS:
+			self.set(fieldname, frappe.db.get_single_value("Confidential Settings", fieldname))
+		if not self.debug_mode:
+			clear_debug_log_entries()
+		if self.has_value_changed("sub_bom_cascade_mode"):
+			self.bom_closure_ready = 0
 
 	def on_update(self):
 		frappe.cache().delete_key(CONFIDENTIAL_SETTINGS_CACHE_KEY)
 		add_debug_log("Confidential Settings updated")
 
+		if self.sub_bom_cascade_mode == CASCADE_MODE_CLOSURE and not self.bom_closure_ready:
+			frappe.enqueue(
+				"confidential_app.confidential_app.utils.bom_closure.rebuild_bom_closure",
+				queue="long",
+				enqueue_after_commit=True,
+			)
+
+
+def _debug_log_key():
+	return frappe.cache().make_key(DEBUG_LOG_KEY)
+
 
 def add_debug_log(message, details=None):
-	"""Adds a log entry to Confidential Settings if debug mode is enabled."""
+	"""Append an entry to the debug ring buffer if debug mode is enabled.
+
+	Entries are kept in a Redis list capped at DEBUG_LOG_MAX_ENTRIES (newest
+	first); pushing and trimming is one pipelined round trip, and concurrent
+	writers never overwrite each other.
+	"""
 	try:
 		settings = get_settings()
 		if not settings or not settings.get("debug_mode"):
 			return
 
-		settings_doc = frappe.get_single("Confidential Settings")
-		if not settings_doc.debug_mode:
-			return
-
 		log_entry = f"{now()}: {message}"
 		if details:
 			try:
 				log_entry += f"\nDetails: {json.dumps(details, indent=2, default=str)}"
-			except Exception:
+			except (TypeError, ValueError):
 				log_entry += f"\nDetails: {details}"
 
-		new_logs = f"{log_entry}\n---\n{settings_doc.debug_logs or ''}"
+		pipe = frappe.cache().pipeline()
+		pipe.lpush(_debug_log_key(), log_entry)
+		pipe.ltrim(_debug_log_key(), 0, DEBUG_LOG_MAX_ENTRIES - 1)
+		pipe.execute()
+	except RedisError:
+		# Debug logging must never break the caller.
+		pass
+
+
+def get_debug_log_entries(limit=DEBUG_LOG_MAX_ENTRIES):
+	"""Return the newest *limit* debug entries, newest first."""
+	try:
+		# RedisWrapper.lrange prefixes the key itself (the pipeline in add_debug_log does not).
+		return [frappe.safe_decode(entry) for entry in frappe.cache().lrange(DEBUG_LOG_KEY, 0, limit - 1)]
+	except Exception:
+		return []
 
-		max_log_size = 50 * 1024
-		if len(new_logs) > max_log_size:
-			new_logs = new_logs[:max_log_size] + "\n... (truncated)"
 
-		frappe.db.set_value(
-			"Confidential Settings", "Confidential Settings",
-			"debug_logs", new_logs, update_modified=False,
-		)
-	except Exception as e:
+def clear_debug_log_entries():
+	try:
+		frappe.cache().delete(_debug_log_key())
+	except Exception:
 		pass
 
 
+@frappe.whitelist()
+def clear_debug_log():
+	"""Empty the debug ring buffer."""
+	frappe.only_for("System Manager")
+	clear_debug_log_entries()
+
+
 def get_settings():
 	"""Get the current Confidential Settings with caching and fallback."""
 	settings = frappe.cache().get_value(CONFIDENTIAL_SETTINGS_CACHE_KEY)
@@ -67,6 +115,12 @@ def get_settings():
 			"enable_audit_trail": int(db_settings.get("enable_audit_trail", 1)),
 			"enable_access_notifications": int(db_settings.get("enable_access_notifications", 1)),
 			"debug_mode": int(db_settings.get("debug_mode", 0)),
+			"sub_bom_cascade_mode": db_settings.get("sub_bom_cascade_mode") or CASCADE_MODE_CLOSURE,
+			"bom_closure_ready": int(db_settings.get("bom_closure_ready") or 0),
+			"view_dedup_minutes": int(db_settings.get("view_dedup_minutes", 10) or 0),
+			"audit_retention_days": int(db_settings.get("audit_retention_days", 365) or 0),
+			"denial_burst_threshold": int(db_settings.get("denial_burst_threshold", 20) or 0),
+			"denial_burst_window_minutes": int(db_settings.get("denial_burst_window_minutes", 10) or 0),
 		}
 
 		frappe.cache().set_value(CONFIDENTIAL_SETTINGS_CACHE_KEY, settings)
@@ -83,6 +137,12 @@ def get_settings():
 			"enable_audit_trail": 0,
 			"enable_access_notifications": 0,
 			"debug_mode": 0,
+			"sub_bom_cascade_mode": CASCADE_MODE_CLOSURE,
+			"bom_closure_ready": 0,
+			"view_dedup_minutes": 0,
+			"audit_retention_days": 0,
+			"denial_burst_threshold": 0,
+			"denial_burst_window_minutes": 0,
 		}
 
 
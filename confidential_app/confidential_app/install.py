@@ -33,6 +33,34 @@ def create_required_custom_fields():
                 "insert_after": "allowed_roles",
                 "depends_on": "eval:doc.is_confidential==1",
                 "description": "Individual users granted access to this confidential BOM (supports time-bound access)"
+            },
+            {
+                "fieldname": "acl_hash",
+                "label": "ACL Hash",
+                "fieldtype": "Data",
+                "insert_after": "allowed_users",
+                "hidden": 1,
+                "read_only": 1,
+                "no_copy": 1,
+                "print_hide": 1,
+                "report_hide": 1,
+                "allow_on_submit": 1,
+                "description": "Digest of is_confidential, allowed roles and allowed users (maintained on save)"
+            },
+            {
+                "fieldname": "acl_profile",
+                "label": "ACL Profile",
+                "fieldtype": "Link",
+                "options": "Confidential ACL Profile",
+                "insert_after": "acl_hash",
+                "depends_on": "eval:doc.acl_profile",
+                "read_only": 1,
+                "permlevel": 2,
+                "search_index": 1,
+                "no_copy": 1,
+                "print_hide": 1,
+                "allow_on_submit": 1,
+                "description": "Shared allowed roles and users (from the BOM) that apply to this document"
             }
         ],
         "Stock Entry": [
@@ -63,6 +91,34 @@ def create_required_custom_fields():
                 "depends_on": "eval:doc.is_confidential==1",
                 "read_only": 1,
                 "description": "Individual users granted access to this confidential Stock Entry"
+            },
+            {
+                "fieldname": "acl_hash",
+                "label": "ACL Hash",
+                "fieldtype": "Data",
+                "insert_after": "allowed_users",
+                "hidden": 1,
+                "read_only": 1,
+                "no_copy": 1,
+                "print_hide": 1,
+                "report_hide": 1,
+                "allow_on_submit": 1,
+                "description": "Digest of is_confidential, allowed roles and allowed users (maintained on save)"
+            },
+            {
+                "fieldname": "acl_profile",
+                "label": "ACL Profile",
+                "fieldtype": "Link",
+                "options": "Confidential ACL Profile",
+                "insert_after": "acl_hash",
+                "depends_on": "eval:doc.acl_profile",
+                "read_only": 1,
+                "permlevel": 2,
+                "search_index": 1,
+                "no_copy": 1,
+                "print_hide": 1,
+                "allow_on_submit": 1,
+                "description": "Shared allowed roles and users (from the BOM) that apply to this document"
             }
         ],
         "Work Order": [
@@ -93,6 +149,34 @@ def create_required_custom_fields():
                 "depends_on": "eval:doc.is_confidential==1",
                 "read_only": 1,
                 "description": "Individual users granted access to this confidential Work Order"
+            },
+            {
+                "fieldname": "acl_hash",
+                "label": "ACL Hash",
+                "fieldtype": "Data",
+                "insert_after": "allowed_users",
+                "hidden": 1,
+                "read_only": 1,
+                "no_copy": 1,
+                "print_hide": 1,
+                "report_hide": 1,
+                "allow_on_submit": 1,
+                "description": "Digest of is_confidential, allowed roles and allowed users (maintained on save)"
+            },
+            {
+                "fieldname": "acl_profile",
+                "label": "ACL Profile",
+                "fieldtype": "Link",
+                "options": "Confidential ACL Profile",
+                "insert_after": "acl_hash",
+                "depends_on": "eval:doc.acl_profile",
+                "read_only": 1,
+                "permlevel": 2,
+                "search_index": 1,
+                "no_copy": 1,
+                "print_hide": 1,
+                "allow_on_submit": 1,
+                "description": "Shared allowed roles and users (from the BOM) that apply to this document"
             }
         ]
     }
@@ -14,6 +14,7 @@ import frappe
 from frappe import _
 
 from confidential_app.confidential_app.utils.permissions import (
+    ACL_CANDIDATE_LIMIT,
     _is_admin,
     _is_app_installed_on_site,
     _is_protection_enabled,
@@ -22,7 +23,9 @@ from confidential_app.confidential_app.utils.permissions import (
     has_bom_permission,
     has_stock_entry_submit_permission,
     has_work_order_permission,
+    register_acl_candidates,
 )
+from confidential_app.confidential_app.utils.trace import traced
 
 _CONFIDENTIAL_HOOKS = {
     "BOM": has_bom_permission,
@@ -60,8 +63,8 @@ def _assert_bom_access(bom_name, action_label="access"):
 
     if not _user_has_doc_access("BOM", bom_name, user):
         debug_log(
-            f"BLOCKED: {user} tried to {action_label} "
-            f"confidential BOM {bom_name}"
+            "BLOCKED: %s tried to %s confidential BOM %s",
+            user, action_label, bom_name,
         )
         frappe.throw(
             _("You don't have permission to {0} confidential BOM {1}.").format(
@@ -151,6 +154,7 @@ from confidential_app.config.settings import MANAGED_DOCTYPES
 _original_build_conditions = None
 
 
+@traced("build_conditions")
 def _patched_build_conditions(self):
     """Wraps DatabaseQuery.build_conditions to always inject confidential
     SQL conditions for BOM / Stock Entry / Work Order, even when
@@ -178,6 +182,27 @@ def _patched_build_conditions(self):
                 self.conditions.append(f"({condition})")
 
 
+_original_execute = None
+
+
+def _patched_execute(self, *args, **kwargs):
+    """Wraps DatabaseQuery.execute to register the returned names as ACL candidates.
+
+    Lists, reports and get_all-then-get_doc loops check the documents they
+    just queried; registering the names lets the first check prefetch the
+    ACL of the whole result instead of one document at a time.
+    """
+    result = _original_execute(self, *args, **kwargs)
+    if (
+        self.doctype in MANAGED_DOCTYPES
+        and result
+        and len(result) <= ACL_CANDIDATE_LIMIT
+        and isinstance(result[0], dict)
+    ):
+        register_acl_candidates(self.doctype, [row.get("name") for row in result])
+    return result
+
+
 # ---------------------------------------------------------------------------
 # Guard: enforce has_permission on frappe.get_doc for confidential DocTypes
 # ---------------------------------------------------------------------------
@@ -185,6 +210,7 @@ def _patched_build_conditions(self):
 _original_get_doc = None
 
 
+@traced("check_confidential_doc_access")
 def _check_confidential_doc_access(doc):
     """Run the confidential has_permission hook for *doc*.
 
@@ -301,12 +327,14 @@ def apply_patches(app_name=None):
     Additionally patches:
     - ``DatabaseQuery.build_conditions`` so ``frappe.get_all`` cannot
       bypass confidential query filters.
+    - ``DatabaseQuery.execute`` so queried names are prefetched as one
+      batch when their permissions are checked.
     - ``frappe.get_doc`` so loading a confidential document from Python
       triggers the same access check as the web API.
 
     Safe to call multiple times (idempotent via _patches_applied flag).
     """
-    global _patches_applied, _original_build_conditions, _original_get_doc
+    global _patches_applied, _original_build_conditions, _original_execute, _original_get_doc
     if _patches_applied:
         return
     _patches_applied = True
@@ -321,6 +349,8 @@ def apply_patches(app_name=None):
     from frappe.model.db_query import DatabaseQuery
     _original_build_conditions = DatabaseQuery.build_conditions
     DatabaseQuery.build_conditions = _patched_build_conditions
+    _original_execute = DatabaseQuery.execute
+    DatabaseQuery.execute = _patched_execute
 
     _original_get_doc = frappe.get_doc
     frappe.get_doc = _patched_get_doc
@@ -331,5 +361,6 @@ def apply_patches(app_name=None):
     debug_log(
         "Confidential patches applied "
         "(get_bom_items + get_bom_items_as_dict + make_work_order "
-        "+ DatabaseQuery.build_conditions + frappe.get_doc + frappe.get_cached_doc)"
+        "+ DatabaseQuery.build_conditions + DatabaseQuery.execute "
+        "+ frappe.get_doc + frappe.get_cached_doc)"
     )
@@ -0,0 +1,60 @@
+frappe.query_reports["Confidential Access Audit"] = {
+  filters: [
+    {
+      fieldname: "reference_doctype",
+      label: __("Document Type"),
+      fieldtype: "Select",
+      options: "\nBOM\nStock Entry\nWork Order",
+    },
+    {
+      fieldname: "reference_name",
+      label: __("Document"),
+      fieldtype: "Dynamic Link",
+      options: "reference_doctype",
+    },
+    {
+      fieldname: "user",
+      label: __("User"),
+      fieldtype: "Link",
+      options: "User",
+    },
+    {
+      fieldname: "access_type",
+      label: __("Access Type"),
+      fieldtype: "Select",
+      options: "\nView\nPrint\nExport\nDenied\nModified",
+    },
+    {
+      fieldname: "from_date",
+      label: __("From Date"),
+      fieldtype: "Date",
+    },
+    {
+      fieldname: "to_date",
+      label: __("To Date"),
+      fieldtype: "Date",
+    },
+    {
+      fieldname: "cursor",
+      label: __("Cursor"),
+      fieldtype: "Data",
+      hidden: 1,
+    },
+  ],
+
+  onload: function (report) {
+    report.page.add_inner_button(__("Older Entries"), function () {
+      var data = report.data || [];
+      var last = data[data.length - 1];
+      if (!last || !last.next_cursor) {
+        frappe.show_alert({ message: __("No older entries"), indicator: "blue" });
+        return;
+      }
+      report.set_filter_value("cursor", last.next_cursor);
+    });
+
+    report.page.add_inner_button(__("Latest Entries"), function () {
+      report.set_filter_value("cursor", "");
+    });
+  },
+};
@@ -0,0 +1,53 @@
+import frappe
+from frappe import _
+
+from confidential_app.confidential_app.utils.audit_query import query_access_log
+
+
+PAGE_LENGTH = 500
+
+
+def execute(filters=None):
+	filters = frappe._dict(filters or {})
+	if not ((filters.reference_doctype and filters.reference_name) or filters.user):
+		return get_columns(), [], _("Select a document or a user.")
+
+	result = query_access_log(
+		reference_doctype=filters.reference_doctype,
+		reference_name=filters.reference_name,
+		user=filters.user,
+		access_type=filters.access_type,
+		from_date=filters.from_date,
+		to_date=filters.to_date,
+		cursor=filters.cursor,
+		page_length=PAGE_LENGTH,
+	)
+
+	data = result["rows"]
+	if data:
+		# Read by the "Older Entries" button in confidential_access_audit.js
+		data[-1]["next_cursor"] = result["next_cursor"]
+
+	message = None
+	if result["next_cursor"]:
+		message = _("Showing the latest {0} entries. Use Older Entries to continue.").format(PAGE_LENGTH)
+	return get_columns(), data, message
+
+
+def get_columns():
+	return [
+		{"fieldname": "timestamp", "label": _("Timestamp"), "fieldtype": "Datetime", "width": 160},
+		{"fieldname": "user", "label": _("User"), "fieldtype": "Link", "options": "User", "width": 180},
+		{"fieldname": "access_type", "label": _("Access Type"), "fieldtype": "Data", "width": 100},
+		{"fieldname": "reference_doctype", "label": _("Document Type"), "fieldtype": "Link", "options": "DocType", "width": 120},
+		{
+			"fieldname": "reference_name",
+			"label": _("Document"),
+			"fieldtype": "Dynamic Link",
+			"options": "reference_doctype",
+			"width": 160,
+		},
+		{"fieldname": "repeat_count", "label": _("Repeats"), "fieldtype": "Int", "width": 80},
+		{"fieldname": "ip_address", "label": _("IP Address"), "fieldtype": "Data", "width": 120},
+		{"fieldname": "details", "label": _("Details"), "fieldtype": "Data", "width": 240},
+	]
@@ -0,0 +1,49 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, now_datetime
+from confidential_app.confidential_app.utils.audit_archive import (
+	archive_access_log,
+	iter_archived_access_log,
+	read_manifest,
+	verify_segment,
+)
+
+
+class TestAuditArchive(FrappeTestCase):
+	"""Old access log rows move to checksummed JSONL segments and stream back."""
+
+	def _insert_log(self, days_ago):
+		timestamp = add_days(now_datetime(), -days_ago)
+		log = frappe.get_doc({
+			"doctype": "Confidential Access Log",
+			"user": "Administrator",
+			"access_type": "View",
+			"reference_doctype": "BOM",
+			"reference_name": f"ARCHIVE-TEST-{frappe.generate_hash(length=6)}",
+			"timestamp": timestamp,
+		}).insert(ignore_permissions=True)
+		frappe.db.set_value("Confidential Access Log", log.name, "creation", timestamp, update_modified=False)
+		frappe.db.commit()
+		return log
+
+	def test_old_rows_are_archived_and_readable(self):
+		old = self._insert_log(days_ago=400)
+		recent = self._insert_log(days_ago=1)
+
+		self.assertGreaterEqual(archive_access_log(retention_days=365), 1)
+
+		self.assertFalse(frappe.db.exists("Confidential Access Log", old.name))
+		self.assertTrue(frappe.db.exists("Confidential Access Log", recent.name))
+
+		segments = read_manifest()
+		self.assertTrue(segments)
+		self.assertTrue(all(entry["deleted"] for entry in segments))
+		self.assertTrue(all(verify_segment(entry) for entry in segments))
+
+		archived = list(iter_archived_access_log(filters={"reference_name": old.reference_name}, verify=True))
+		self.assertEqual([event["name"] for event in archived], [old.name])
+
+	def test_zero_retention_keeps_everything(self):
+		old = self._insert_log(days_ago=400)
+		self.assertEqual(archive_access_log(retention_days=0), 0)
+		self.assertTrue(frappe.db.exists("Confidential Access Log", old.name))
@@ -0,0 +1,103 @@
+import json
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime, today
+from confidential_app.confidential_app.utils.audit_export import export_access_log, iter_access_log_export
+from confidential_app.confidential_app.utils.audit_query import query_access_log
+
+
+class TestAuditQuery(FrappeTestCase):
+	"""Keyset pagination over the access log and its composite indexes."""
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		cls.reference_name = f"AUDIT-QUERY-{frappe.generate_hash(length=6)}"
+		start = now_datetime()
+		for minutes in range(5):
+			frappe.get_doc({
+				"doctype": "Confidential Access Log",
+				"user": "Administrator",
+				"access_type": "View",
+				"reference_doctype": "BOM",
+				"reference_name": cls.reference_name,
+				"timestamp": add_to_date(start, minutes=-minutes),
+			}).insert(ignore_permissions=True)
+		frappe.db.commit()
+
+	def test_indexes_present(self):
+		for index_name in ("reference_timestamp_index", "user_timestamp_index"):
+			self.assertTrue(frappe.db.has_index("tabConfidential Access Log", index_name), index_name)
+
+	def test_keyset_pages_cover_all_rows_newest_first(self):
+		seen = []
+		cursor = None
+		while True:
+			page = query_access_log(
+				reference_doctype="BOM", reference_name=self.reference_name, cursor=cursor, page_length=2,
+			)
+			seen.extend(page["rows"])
+			cursor = page["next_cursor"]
+			if not cursor:
+				break
+
+		self.assertEqual(len(seen), 5)
+		self.assertEqual(len({row.name for row in seen}), 5)
+		timestamps = [row.timestamp for row in seen]
+		self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+	def test_cursor_from_other_filters_is_ignored(self):
+		first = query_access_log(reference_doctype="BOM", reference_name=self.reference_name, page_length=2)
+		self.assertTrue(first["next_cursor"])
+
+		# Same document, new date range: the old position must not carry over.
+		page = query_access_log(
+			reference_doctype="BOM",
+			reference_name=self.reference_name,
+			from_date=add_to_date(today(), days=-1),
+			cursor=first["next_cursor"],
+			page_length=2,
+		)
+		self.assertEqual([row.name for row in page["rows"]], [row.name for row in first["rows"]])
+
+	def test_unfiltered_query_rejected(self):
+		self.assertRaises(frappe.ValidationError, query_access_log)
+
+	def test_export_streams_in_chunks(self):
+		filters = {"reference_doctype": "BOM", "reference_name": self.reference_name}
+		from_date = add_to_date(today(), days=-1)
+
+		chunks = list(iter_access_log_export(from_date, today(), filters, fmt="jsonl", chunk_size=2))
+		self.assertEqual(len(chunks), 3)
+		events = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+		self.assertEqual({event["reference_name"] for event in events}, {self.reference_name})
+		self.assertEqual(len(events), 5)
+
+		csv_lines = "".join(iter_access_log_export(from_date, today(), filters, fmt="csv")).splitlines()
+		self.assertEqual(csv_lines[0].split(",")[0], "name")
+		self.assertEqual(len(csv_lines), 6)
+
+	def test_http_export_keeps_request_context(self):
+		site, db = frappe.local.site, frappe.db
+		frappe.set_user("Administrator")
+		response = export_access_log(
+			add_to_date(today(), days=-1), today(), fmt="jsonl",
+			reference_doctype="BOM", reference_name=self.reference_name,
+		)
+
+		body = b"".join(response.response).decode()
+		self.assertEqual(len(body.splitlines()), 5)
+		self.assertEqual(frappe.local.site, site)
+		self.assertIs(frappe.db, db)
+		self.assertEqual(frappe.session.user, "Administrator")
+
+	def test_http_export_rejects_guest(self):
+		frappe.set_user("Guest")
+		try:
+			self.assertRaises(
+				frappe.PermissionError, export_access_log, add_to_date(today(), days=-1), today(),
+				reference_doctype="BOM", reference_name=self.reference_name,
+			)
+		finally:
+			frappe.set_user("Administrator")
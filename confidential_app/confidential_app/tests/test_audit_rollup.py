@@ -0,0 +1,63 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+from confidential_app.confidential_app.utils.audit_rollup import (
+	_set_rollup_watermark,
+	get_rollup_watermark,
+	refresh_access_rollups,
+)
+
+
+class TestAuditRollup(FrappeTestCase):
+	"""Daily rollups fold each access log row in exactly once."""
+
+	def _insert_logs(self, reference_name, access_type, count, creation):
+		for _ in range(count):
+			log = frappe.get_doc({
+				"doctype": "Confidential Access Log",
+				"user": "Administrator",
+				"access_type": access_type,
+				"reference_doctype": "BOM",
+				"reference_name": reference_name,
+				"timestamp": creation,
+			}).insert(ignore_permissions=True)
+			frappe.db.set_value("Confidential Access Log", log.name, "creation", creation, update_modified=False)
+
+	def _rollup_count(self, reference_name, access_type):
+		return frappe.db.get_value(
+			"Confidential Access Rollup",
+			{"reference_name": reference_name, "access_type": access_type},
+			"access_count",
+		)
+
+	def test_rollup_counts_once_per_watermark(self):
+		reference_name = f"ROLLUP-TEST-{frappe.generate_hash(length=6)}"
+		creation = add_to_date(now_datetime(), hours=-1)
+		_set_rollup_watermark(add_to_date(creation, minutes=-1))
+		self._insert_logs(reference_name, "View", 3, creation)
+		self._insert_logs(reference_name, "Denied", 1, creation)
+
+		refresh_access_rollups()
+		self.assertEqual(self._rollup_count(reference_name, "View"), 3)
+		self.assertEqual(self._rollup_count(reference_name, "Denied"), 1)
+		self.assertGreater(get_rollup_watermark(), creation)
+
+		refresh_access_rollups()
+		self.assertEqual(self._rollup_count(reference_name, "View"), 3)
+
+	def test_recent_rows_wait_for_lag(self):
+		reference_name = f"ROLLUP-TEST-{frappe.generate_hash(length=6)}"
+		_set_rollup_watermark(add_to_date(now_datetime(), hours=-1))
+		self._insert_logs(reference_name, "View", 1, now_datetime())
+
+		refresh_access_rollups()
+		self.assertIsNone(self._rollup_count(reference_name, "View"))
+
+	def test_stale_settings_form_keeps_watermark(self):
+		_set_rollup_watermark(add_to_date(now_datetime(), hours=-2))
+		settings = frappe.get_doc("Confidential Settings")
+		watermark = add_to_date(now_datetime(), hours=-1).replace(microsecond=0)
+		_set_rollup_watermark(watermark)
+
+		settings.save(ignore_permissions=True)
+		self.assertEqual(get_rollup_watermark(), watermark)
@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from confidential_app.confidential_app.doctype.confidential_settings.confidential_settings import (
+	add_debug_log,
+	clear_debug_log_entries,
+	get_debug_log_entries,
+)
+from confidential_app.config.settings import DEBUG_LOG_MAX_ENTRIES
+from confidential_app.confidential_app.utils.permissions import debug_log
+
+SETTINGS_PATH = "confidential_app.confidential_app.doctype.confidential_settings.confidential_settings.get_settings"
+
+
+class TestDebugLog(FrappeTestCase):
+	"""Debug entries go to a bounded Redis list, never to the database."""
+
+	def setUp(self):
+		clear_debug_log_entries()
+
+	def test_ring_buffer_is_bounded_newest_first(self):
+		with patch(SETTINGS_PATH, return_value={"debug_mode": 1}):
+			for i in range(DEBUG_LOG_MAX_ENTRIES + 5):
+				add_debug_log(f"entry {i}")
+
+		entries = get_debug_log_entries()
+		self.assertEqual(len(entries), DEBUG_LOG_MAX_ENTRIES)
+		self.assertTrue(entries[0].endswith(f"entry {DEBUG_LOG_MAX_ENTRIES + 4}"))
+		self.assertFalse(frappe.db.get_single_value("Confidential Settings", "debug_logs"))
+
+	def test_message_not_formatted_when_disabled(self):
+		# debug_log swallows exceptions, so record formatting with a flag
+		# rather than raising from __str__.
+		formatted = []
+
+		class Probe:
+			def __str__(self):
+				formatted.append(True)
+				return "probe"
+
+		with patch(SETTINGS_PATH, return_value={"debug_mode": 0}), patch(
+			"confidential_app.confidential_app.doctype.confidential_settings.confidential_settings.add_debug_log",
+		) as add:
+			debug_log("ALLOW: %s", Probe())
+		self.assertEqual(formatted, [])
+		add.assert_not_called()
+
+		with patch(SETTINGS_PATH, return_value={"debug_mode": 1}):
+			debug_log("ALLOW: %s", Probe())
+		self.assertEqual(formatted, [True])
+		self.assertTrue(get_debug_log_entries()[0].endswith("ALLOW: probe"))
@@ -0,0 +1,52 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from confidential_app.confidential_app.utils.denials import check_denial_burst, record_denial
+
+
+class TestDenialBurst(FrappeTestCase):
+	"""Sliding-window denial counters and the consolidated burst alert."""
+
+	def setUp(self):
+		self.user = f"burst-{frappe.generate_hash(length=6)}@example.com"
+
+	def test_counter_sums_window(self):
+		for expected in range(1, 4):
+			self.assertEqual(record_denial(self.user, "BOM", f"BOM-{expected}", threshold=10, window=600), expected)
+
+	def test_counter_counts_each_document_once(self):
+		for _ in range(5):
+			self.assertEqual(record_denial(self.user, "BOM", "BOM-1", threshold=10, window=600), 1)
+		self.assertEqual(record_denial(self.user, "BOM", "BOM-2", threshold=10, window=600), 2)
+
+	def test_burst_alerts_once_and_suppresses_per_doc(self):
+		with patch(
+			"confidential_app.confidential_app.utils.denials._get_burst_settings",
+			return_value=(3, 600),
+		), patch(
+			"confidential_app.confidential_app.utils.notifications.notify_denial_burst",
+		) as notify:
+			in_burst = [check_denial_burst(self.user, "BOM", f"BOM-{i}") for i in range(6)]
+
+		self.assertEqual(in_burst, [False, False, True, True, True, True])
+		self.assertEqual(notify.call_count, 1)
+
+	def test_reopening_one_document_is_not_a_burst(self):
+		with patch(
+			"confidential_app.confidential_app.utils.denials._get_burst_settings",
+			return_value=(3, 600),
+		), patch(
+			"confidential_app.confidential_app.utils.notifications.notify_denial_burst",
+		) as notify:
+			in_burst = [check_denial_burst(self.user, "BOM", "BOM-1") for _ in range(6)]
+
+		self.assertEqual(in_burst, [False] * 6)
+		notify.assert_not_called()
+
+	def test_disabled_when_threshold_zero(self):
+		with patch(
+			"confidential_app.confidential_app.utils.denials._get_burst_settings",
+			return_value=(0, 600),
+		):
+			self.assertFalse(check_denial_burst(self.user, "BOM", "BOM-1"))
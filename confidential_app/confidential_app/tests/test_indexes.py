@@ -0,0 +1,93 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from confidential_app.confidential_app.utils.indexes import (
+	EFFECTIVE_ACCESS_INDEXES,
+	ensure_confidential_indexes,
+	get_missing_indexes,
+	verify_permission_query_plan,
+)
+
+
+class TestConfidentialIndexes(FrappeTestCase):
+	"""Composite ACL indexes exist on the tables the permission queries read."""
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		ensure_confidential_indexes()
+
+	def test_composite_indexes_present(self):
+		self.assertEqual(get_missing_indexes(), [])
+
+	def test_effective_access_indexes_present(self):
+		# Index existence, not the EXPLAIN plan: on small test tables the
+		# optimizer may prefer a full scan.
+		for index_name in EFFECTIVE_ACCESS_INDEXES:
+			self.assertTrue(frappe.db.has_index("tabConfidential Effective Access", index_name), index_name)
+
+
+class TestPermissionQueryPlans(FrappeTestCase):
+	"""The permission queries use their indexes once the tables hold realistic data."""
+
+	SEED_PREFIX = "EXPLAIN-SEED-"
+	SEED_DOCTYPES = ("BOM", "Stock Entry", "Work Order")
+	SEED_PARENTS = 1000
+
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		ensure_confidential_indexes()
+		cls._seed()
+
+	@classmethod
+	def tearDownClass(cls):
+		for table in ("Confidential Role Mapping", "Confidential User Mapping"):
+			frappe.db.delete(table, {"parent": ("like", f"{cls.SEED_PREFIX}%")})
+		frappe.db.delete("Confidential Effective Access", {"reference_name": ("like", f"{cls.SEED_PREFIX}%")})
+		frappe.db.commit()
+		super().tearDownClass()
+
+	@classmethod
+	def _seed(cls):
+		"""Insert enough mapping / effective-access rows for the optimizer to prefer the indexes."""
+		timestamp = frappe.utils.now()
+		role_rows, user_rows, access_rows = [], [], []
+		for doctype in cls.SEED_DOCTYPES:
+			for i in range(cls.SEED_PARENTS):
+				parent = f"{cls.SEED_PREFIX}{doctype}-{i}"
+				role = f"Seed Role {i % 50}"
+				user = f"seed{i % 200}@example.com"
+				role_rows.append((frappe.generate_hash(length=12), parent, doctype, "allowed_roles", role,
+								  1, "Administrator", "Administrator", timestamp, timestamp))
+				user_rows.append((frappe.generate_hash(length=12), parent, doctype, "allowed_users", user,
+								  None, None, 1, "Administrator", "Administrator", timestamp, timestamp))
+				for principal_type, principal in (("Role", role), ("User", user)):
+					access_rows.append((frappe.generate_hash(length=12), doctype, parent, principal_type,
+										principal, None, None, "Administrator", "Administrator",
+										timestamp, timestamp))
+
+		frappe.db.bulk_insert(
+			"Confidential Role Mapping",
+			["name", "parent", "parenttype", "parentfield", "role",
+			 "idx", "owner", "modified_by", "creation", "modified"],
+			role_rows,
+		)
+		frappe.db.bulk_insert(
+			"Confidential User Mapping",
+			["name", "parent", "parenttype", "parentfield", "user", "valid_from", "valid_until",
+			 "idx", "owner", "modified_by", "creation", "modified"],
+			user_rows,
+		)
+		frappe.db.bulk_insert(
+			"Confidential Effective Access",
+			["name", "reference_doctype", "reference_name", "principal_type", "principal",
+			 "valid_from", "valid_until", "owner", "modified_by", "creation", "modified"],
+			access_rows,
+		)
+		frappe.db.commit()
+		for table in ("Confidential Role Mapping", "Confidential User Mapping", "Confidential Effective Access"):
+			frappe.db.sql(f"ANALYZE TABLE `tab{table}`")
+
+	def test_permission_queries_use_indexes(self):
+		for doctype in self.SEED_DOCTYPES:
+			self.assertEqual(verify_permission_query_plan(doctype), [], doctype)
@@ -0,0 +1,106 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from confidential_app.confidential_app.utils.notifications import (
+	_deliver,
+	_get_confidential_managers,
+	clear_manager_cache,
+	send_notification_digests,
+)
+
+
+class TestNotificationRecipients(FrappeTestCase):
+	"""The manager recipient list is cached and follows User / role changes."""
+
+	def _make_manager(self):
+		email = f"conf-notify-{frappe.generate_hash(length=6)}@example.com"
+		user = frappe.get_doc({
+			"doctype": "User",
+			"email": email,
+			"first_name": "Notify",
+			"send_welcome_email": 0,
+		})
+		user.append("roles", {"role": "Confidential Manager"})
+		user.insert(ignore_permissions=True)
+		return user
+
+	def test_managers_cached(self):
+		clear_manager_cache()
+		first = _get_confidential_managers()
+		with patch.object(frappe.db, "sql_list", side_effect=AssertionError("unexpected query")):
+			self.assertEqual(_get_confidential_managers(), first)
+
+	def test_cache_follows_user_changes(self):
+		_get_confidential_managers()
+		user = self._make_manager()
+		self.assertIn(user.name, _get_confidential_managers())
+
+		user.enabled = 0
+		user.save(ignore_permissions=True)
+		self.assertNotIn(user.name, _get_confidential_managers())
+
+
+class TestNotificationDelivery(FrappeTestCase):
+	"""Immediate recipients get a Notification Log; Digest recipients one summary per run."""
+
+	def _deliver_and_drain(self, *args, **kwargs):
+		"""Call _deliver, then run the jobs it enqueued (the queue is not drained in tests)."""
+		with patch("frappe.enqueue") as enqueue:
+			_deliver(*args, **kwargs)
+		for call in enqueue.call_args_list:
+			job_kwargs = {k: v for k, v in call.kwargs.items() if k not in ("queue", "enqueue_after_commit")}
+			frappe.get_attr(call.args[0])(**job_kwargs)
+		return enqueue
+
+	def _make_user(self, delivery_mode=None):
+		user = frappe.get_doc({
+			"doctype": "User",
+			"email": f"conf-digest-{frappe.generate_hash(length=6)}@example.com",
+			"first_name": "Digest",
+			"send_welcome_email": 0,
+		}).insert(ignore_permissions=True)
+		if delivery_mode:
+			frappe.get_doc({
+				"doctype": "Confidential Notification Preference",
+				"user": user.name,
+				"delivery_mode": delivery_mode,
+			}).insert(ignore_permissions=True)
+		return user.name
+
+	def _count_logs(self, user):
+		return frappe.db.count("Notification Log", {"for_user": user})
+
+	def test_immediate_delivery(self):
+		user = self._make_user()
+		enqueue = self._deliver_and_drain([user], "Immediate subject", "Body", "User", user)
+		self.assertEqual(enqueue.call_count, 1)
+		self.assertEqual(self._count_logs(user), 1)
+
+	def test_digest_delivery(self):
+		user = self._make_user("Digest")
+		for i in range(3):
+			self._deliver_and_drain([user], f"Digest subject {i}", "Body", "User", user)
+		self.assertEqual(self._count_logs(user), 0)
+
+		send_notification_digests()
+		logs = frappe.get_all("Notification Log", filters={"for_user": user}, fields=["subject", "email_content"])
+		self.assertEqual(len(logs), 1)
+		self.assertIn("Digest subject 2", logs[0].email_content)
+
+		# The queue was drained.
+		send_notification_digests()
+		self.assertEqual(self._count_logs(user), 1)
+
+	def test_failed_digest_keeps_events(self):
+		user = self._make_user("Digest")
+		self._deliver_and_drain([user], "Kept subject", "Body", "User", user)
+
+		with patch.object(frappe.db, "bulk_insert", side_effect=frappe.ValidationError):
+			self.assertRaises(frappe.ValidationError, send_notification_digests)
+		self.assertEqual(self._count_logs(user), 0)
+
+		send_notification_digests()
+		logs = frappe.get_all("Notification Log", filters={"for_user": user}, fields=["email_content"])
+		self.assertEqual(len(logs), 1)
+		self.assertIn("Kept subject", logs[0].email_content)
@@ -3,12 +3,25 @@ from frappe.tests.utils import FrappeTestCase
 from confidential_app.confidential_app.utils.permissions import (
 	_user_has_doc_access,
 	_check_sub_bom_confidentiality,
+	_find_inaccessible_sub_bom_closure,
+	_find_inaccessible_sub_bom_cte,
+	_walk_sub_boms,
 	has_bom_permission,
 	has_stock_entry_permission,
 	has_work_order_permission,
 	check_bom_permission,
+	check_bom_permissions,
 	get_bom_permission_query_conditions,
+	get_security_context,
+	invalidate_acl,
+	invalidate_bom_cache,
+	prefetch_acl,
+	register_acl_candidates,
+	reset_security_context,
+	role_mask,
+	_get_doc_acl,
 )
+from confidential_app.confidential_app.utils.audit import flush_access_log, get_pending_count
 
 
 class TestConfidentialPermissions(FrappeTestCase):
@@ -80,6 +93,7 @@ class TestConfidentialPermissions(FrappeTestCase):
 		settings.protect_work_order = 1
 		settings.enable_audit_trail = 1
 		settings.enable_access_notifications = 0
+		settings.view_dedup_minutes = 10
 		settings.save(ignore_permissions=True)
 		frappe.db.commit()
 
@@ -137,6 +151,86 @@ class TestConfidentialPermissions(FrappeTestCase):
 		result = has_bom_permission(bom, user=self.regular_user)
 		self.assertIsNone(result)
 
+	# -----------------------------------------------------------------------
+	# Request-scoped ACL loader
+	# -----------------------------------------------------------------------
+
+	def test_prefetch_acl_loads_batch(self):
+		conf_bom = self._create_confidential_bom(roles=["Confidential Manager"])
+		plain_bom = self._create_non_confidential_bom()
+		invalidate_acl("BOM")
+
+		prefetch_acl("BOM", [conf_bom.name, plain_bom.name])
+
+		self.assertEqual(_get_doc_acl("BOM", conf_bom.name).is_confidential, 1)
+		self.assertIn("Confidential Manager", _get_doc_acl("BOM", conf_bom.name).roles)
+		self.assertFalse(_get_doc_acl("BOM", plain_bom.name).is_confidential)
+
+	def test_prefetched_acl_answers_from_memory(self):
+		from unittest.mock import patch
+
+		bom = self._create_confidential_bom(roles=["Confidential Manager"])
+		invalidate_acl("BOM")
+		prefetch_acl("BOM", [bom.name])
+
+		with patch.object(frappe.db, "sql", side_effect=AssertionError("unexpected query")):
+			self.assertTrue(_user_has_doc_access("BOM", bom.name, self.manager_user))
+			self.assertFalse(_user_has_doc_access("BOM", bom.name, self.regular_user))
+
+	def test_identical_acls_share_one_entry(self):
+		first = self._create_confidential_bom(roles=["Confidential Manager"])
+		second = self._create_confidential_bom(roles=["Confidential Manager"])
+		invalidate_acl("BOM")
+		prefetch_acl("BOM", [first.name, second.name])
+
+		acl = _get_doc_acl("BOM", first.name)
+		self.assertIs(acl, _get_doc_acl("BOM", second.name))
+		self.assertEqual(acl.role_mask, role_mask(["Confidential Manager"]))
+		self.assertTrue(acl.role_mask & get_security_context(self.manager_user).role_mask)
+		self.assertFalse(acl.role_mask & get_security_context(self.regular_user).role_mask)
+
+	def _count_permission_queries(self, count):
+		"""Return the frappe.db.sql calls made by *count* has_permission checks of a registered list."""
+		from unittest.mock import patch
+
+		names = [self._create_confidential_bom(roles=["Confidential Manager"]).name for _ in range(count)]
+		invalidate_acl("BOM")
+		has_bom_permission(self._create_non_confidential_bom().name, user=self.manager_user)
+		register_acl_candidates("BOM", names)
+
+		with patch.object(frappe.db, "sql", wraps=frappe.db.sql) as sql:
+			for name in names:
+				self.assertTrue(has_bom_permission(name, user=self.manager_user))
+		return sql.call_count
+
+	def test_candidate_list_checked_in_constant_queries(self):
+		self.assertEqual(self._count_permission_queries(2), self._count_permission_queries(10))
+
+	def test_oversized_candidate_list_is_dropped(self):
+		from confidential_app.confidential_app.utils.permissions import (
+			ACL_CANDIDATE_LIMIT,
+			_pop_acl_candidates,
+		)
+
+		_pop_acl_candidates("BOM")
+		register_acl_candidates("BOM", [f"BOM-CAP-{i}" for i in range(ACL_CANDIDATE_LIMIT + 1)])
+		self.assertFalse(_pop_acl_candidates("BOM"))
+
+		register_acl_candidates("BOM", [f"BOM-CAP-{i}" for i in range(ACL_CANDIDATE_LIMIT)])
+		register_acl_candidates("BOM", ["BOM-CAP-EXTRA"])
+		self.assertEqual(len(_pop_acl_candidates("BOM")), ACL_CANDIDATE_LIMIT)
+
+	def test_security_context_built_once_per_user(self):
+		from unittest.mock import patch
+
+		reset_security_context()
+		with patch("frappe.get_roles", wraps=frappe.get_roles) as get_roles:
+			for _ in range(3):
+				get_security_context(self.regular_user)
+				get_bom_permission_query_conditions(self.regular_user)
+		self.assertEqual(get_roles.call_count, 1)
+		self.assertFalse(get_security_context(self.regular_user).is_admin)
+
 	# -----------------------------------------------------------------------
 	# User-level access
 	# -----------------------------------------------------------------------
@@ -257,6 +351,116 @@ class TestConfidentialPermissions(FrappeTestCase):
 		result = _check_sub_bom_confidentiality(parent_bom.name, self.regular_user)
 		self.assertFalse(result)
 
+	def _create_parent_bom(self, sub_bom, confidential=False):
+		parent_bom = frappe.get_doc({
+			"doctype": "BOM",
+			"item": "CONF_TEST_ITEM_A",
+			"quantity": 1,
+			"is_active": 1,
+			"is_confidential": 1 if confidential else 0,
+			"items": [{
+				"item_code": "CONF_TEST_ITEM_B",
+				"qty": 1,
+				"uom": "Nos",
+				"rate": 100,
+				"bom_no": sub_bom.name,
+			}],
+		})
+		if confidential:
+			parent_bom.append("allowed_roles", {"role": "Confidential Manager"})
+		parent_bom.insert(ignore_permissions=True)
+		frappe.db.commit()
+		return parent_bom
+
+	def test_sub_bom_closure_matches_walker(self):
+		"""The closure-table query agrees with the reference Python walker."""
+		from confidential_app.confidential_app.utils.bom_closure import refresh_bom_closure
+
+		sub_bom = self._create_confidential_bom(
+			item="CONF_TEST_ITEM_B", sub_item="CONF_TEST_ITEM_C",
+			roles=["Confidential Manager"],
+		)
+		parent_bom = self._create_parent_bom(sub_bom)
+		refresh_bom_closure(parent_bom.name)
+
+		self.assertEqual(
+			_find_inaccessible_sub_bom_closure(parent_bom.name, self.regular_user), sub_bom.name
+		)
+		self.assertFalse(_walk_sub_boms(parent_bom.name, self.regular_user))
+
+		self.assertIsNone(_find_inaccessible_sub_bom_closure(parent_bom.name, self.manager_user))
+		self.assertTrue(_walk_sub_boms(parent_bom.name, self.manager_user))
+
+	def test_stale_closure_falls_back_to_walker(self):
+		"""A bom_no rewritten with plain SQL (BOM Update Tool) is not missed via a stale closure."""
+		from unittest.mock import patch
+		from confidential_app.config.settings import CASCADE_MODE_CLOSURE
+		from confidential_app.confidential_app.utils.bom_closure import refresh_bom_closure
+		from confidential_app.confidential_app.utils.permissions import _is_bom_closure_stale
+
+		plain_sub_bom = self._create_non_confidential_bom(item="CONF_TEST_ITEM_B", sub_item="CONF_TEST_ITEM_C")
+		conf_sub_bom = self._create_confidential_bom(
+			item="CONF_TEST_ITEM_B", sub_item="CONF_TEST_ITEM_C",
+			roles=["Confidential Manager"],
+		)
+		parent_bom = self._create_parent_bom(plain_sub_bom)
+		refresh_bom_closure(parent_bom.name)
+		self.assertFalse(_is_bom_closure_stale(parent_bom.name))
+
+		frappe.db.sql(
+			"UPDATE `tabBOM Item` SET bom_no=%s WHERE parent=%s AND bom_no=%s",
+			(conf_sub_bom.name, parent_bom.name, plain_sub_bom.name),
+		)
+		self.assertTrue(_is_bom_closure_stale(parent_bom.name))
+
+		prefix = "confidential_app.confidential_app.utils.permissions"
+		with patch(f"{prefix}._get_cascade_mode", return_value=CASCADE_MODE_CLOSURE), \
+				patch(f"{prefix}._is_bom_closure_ready", return_value=True), \
+				patch(f"{prefix}._enqueue_closure_refresh") as enqueue:
+			self.assertFalse(_check_sub_bom_confidentiality(parent_bom.name, self.regular_user))
+		enqueue.assert_called_once_with(parent_bom.name)
+
+		refresh_bom_closure(parent_bom.name)
+		self.assertFalse(_is_bom_closure_stale(parent_bom.name))
+
+	def test_sub_bom_cte_matches_walker(self):
+		"""The recursive CTE agrees with the reference Python walker across levels."""
+		leaf_bom = self._create_confidential_bom(
+			item="CONF_TEST_ITEM_C", sub_item="CONF_TEST_ITEM_B",
+			roles=["Confidential Manager"],
+		)
+		mid_bom = frappe.get_doc({
+			"doctype": "BOM",
+			"item": "CONF_TEST_ITEM_B",
+			"quantity": 1,
+			"is_active": 1,
+			"is_confidential": 0,
+			"items": [{
+				"item_code": "CONF_TEST_ITEM_C",
+				"qty": 1,
+				"uom": "Nos",
+				"rate": 100,
+				"bom_no": leaf_bom.name,
+			}],
+		})
+		mid_bom.insert(ignore_permissions=True)
+		frappe.db.commit()
+		top_bom = self._create_parent_bom(mid_bom)
+
+		for user in (self.regular_user, self.manager_user, self.conf_user):
+			denied = _find_inaccessible_sub_bom_cte(top_bom.name, user)
+			self.assertEqual(denied is None, _walk_sub_boms(top_bom.name, user))
+
+		self.assertEqual(_find_inaccessible_sub_bom_cte(top_bom.name, self.regular_user), leaf_bom.name)
+
+		# Both paths stop at the same depth: the leaf is two levels down.
+		from unittest.mock import patch
+
+		with patch("confidential_app.confidential_app.utils.permissions.SUB_BOM_MAX_DEPTH", 1), \
+				patch("frappe.log_error"):
+			self.assertIsNone(_find_inaccessible_sub_bom_cte(top_bom.name, self.regular_user))
+			self.assertTrue(_walk_sub_boms(top_bom.name, self.regular_user))
+
 	# -----------------------------------------------------------------------
 	# List-view query conditions
 	# -----------------------------------------------------------------------
@@ -268,7 +472,36 @@ class TestConfidentialPermissions(FrappeTestCase):
 	def test_query_conditions_non_empty_for_regular(self):
 		conditions = get_bom_permission_query_conditions(self.regular_user)
 		self.assertIn("is_confidential", conditions)
-		self.assertIn("Confidential User Mapping", conditions)
+		self.assertIn("Confidential Effective Access", conditions)
+
+	def test_query_conditions_cached(self):
+		from confidential_app.confidential_app.utils.permissions import _query_condition_stats
+
+		first = get_bom_permission_query_conditions(self.regular_user)
+		hits = _query_condition_stats["hits"]
+		second = get_bom_permission_query_conditions(self.regular_user)
+		self.assertEqual(first, second)
+		self.assertEqual(_query_condition_stats["hits"], hits + 1)
+
+	def test_effective_access_rows_follow_acl(self):
+		bom = self._create_confidential_bom(
+			roles=["Confidential Manager"], users=[self.regular_user]
+		)
+		rows = frappe.get_all(
+			"Confidential Effective Access",
+			filters={"reference_doctype": "BOM", "reference_name": bom.name},
+			fields=["principal_type", "principal"],
+		)
+		principals = {(r.principal_type, r.principal) for r in rows}
+		self.assertIn(("Role", "Confidential Manager"), principals)
+		self.assertIn(("User", self.regular_user), principals)
+
+	def test_list_filter_hides_inaccessible_bom(self):
+		bom = self._create_confidential_bom(roles=["Confidential Manager"])
+		visible = frappe.get_list("BOM", filters={"name": bom.name}, user=self.manager_user, pluck="name")
+		hidden = frappe.get_list("BOM", filters={"name": bom.name}, user=self.regular_user, pluck="name")
+		self.assertEqual(visible, [bom.name])
+		self.assertEqual(hidden, [])
 
 	# -----------------------------------------------------------------------
 	# Whitelisted check_bom_permission
@@ -292,6 +525,50 @@ class TestConfidentialPermissions(FrappeTestCase):
 		finally:
 			frappe.set_user("Administrator")
 
+	def test_check_bom_permissions_bulk(self):
+		conf_bom = self._create_confidential_bom(roles=["Confidential Manager"])
+		plain_bom = self._create_non_confidential_bom()
+		frappe.set_user(self.regular_user)
+		try:
+			result = check_bom_permissions([conf_bom.name, plain_bom.name])
+			self.assertEqual(result, {conf_bom.name: False, plain_bom.name: True})
+			# Second call is answered from the decision cache
+			self.assertEqual(check_bom_permissions(frappe.as_json([conf_bom.name])), {conf_bom.name: False})
+		finally:
+			frappe.set_user("Administrator")
+
+	def test_check_bom_permission_cache_invalidated_on_save(self):
+		bom = self._create_confidential_bom(roles=["Confidential Manager"])
+		frappe.set_user(self.regular_user)
+		try:
+			self.assertFalse(check_bom_permission(bom.name))
+		finally:
+			frappe.set_user("Administrator")
+
+		bom.append("allowed_users", {"user": self.regular_user})
+		bom.flags.ignore_permissions = True
+		bom.save()
+		frappe.db.commit()
+
+		frappe.set_user(self.regular_user)
+		try:
+			self.assertTrue(check_bom_permission(bom.name))
+		finally:
+			frappe.set_user("Administrator")
+
+	def test_invalidation_bumps_generation_again_after_commit(self):
+		from confidential_app.confidential_app.utils.permissions import _decision_keys
+
+		bom = self._create_confidential_bom(roles=["Confidential Manager"])
+		before = _decision_keys("BOM", [bom.name], self.regular_user)
+		invalidate_bom_cache(bom.name)
+		pending = _decision_keys("BOM", [bom.name], self.regular_user)
+		frappe.db.commit()
+		committed = _decision_keys("BOM", [bom.name], self.regular_user)
+
+		self.assertNotEqual(before, pending)
+		self.assertNotEqual(pending, committed)
+
 	# -----------------------------------------------------------------------
 	# Audit trail
 	# -----------------------------------------------------------------------
@@ -299,6 +576,7 @@ class TestConfidentialPermissions(FrappeTestCase):
 	def test_access_log_created_on_view(self):
 		bom = self._create_confidential_bom(roles=["Confidential Manager"])
 		has_bom_permission(bom, user=self.manager_user)
+		flush_access_log()
 
 		logs = frappe.get_all(
 			"Confidential Access Log",
@@ -311,9 +589,48 @@ class TestConfidentialPermissions(FrappeTestCase):
 		)
 		self.assertGreaterEqual(len(logs), 1)
 
+	def test_flush_stops_after_max_batches(self):
+		from confidential_app.confidential_app.utils.audit import enqueue_access_event
+
+		flush_access_log()
+		for _i in range(3):
+			enqueue_access_event(self.manager_user, "Print", "BOM", "BOM-MAX-BATCHES")
+
+		self.assertEqual(flush_access_log(batch_size=1, max_batches=1), 1)
+		self.assertEqual(get_pending_count(), 2)
+		self.assertEqual(flush_access_log(), 2)
+
+	def test_access_log_is_journaled_until_flush(self):
+		bom = self._create_confidential_bom(roles=["Confidential Manager"])
+		flush_access_log()
+		has_bom_permission(bom, user=self.manager_user)
+
+		filters = {"reference_doctype": "BOM", "reference_name": bom.name, "access_type": "View"}
+		self.assertFalse(frappe.db.exists("Confidential Access Log", filters))
+		self.assertGreaterEqual(get_pending_count(), 1)
+
+		flush_access_log()
+		self.assertEqual(get_pending_count(), 0)
+		self.assertTrue(frappe.db.exists("Confidential Access Log", filters))
+
+	def test_repeated_views_are_counted_not_logged(self):
+		bom = self._create_confidential_bom(roles=["Confidential Manager"])
+		for _ in range(3):
+			has_bom_permission(bom, user=self.manager_user)
+		flush_access_log()
+
+		logs = frappe.get_all(
+			"Confidential Access Log",
+			filters={"reference_doctype": "BOM", "reference_name": bom.name, "access_type": "View"},
+			fields=["repeat_count"],
+		)
+		self.assertEqual(len(logs), 1)
+		self.assertEqual(logs[0].repeat_count, 2)
+
 	def test_access_log_created_on_deny(self):
 		bom = self._create_confidential_bom(roles=["Confidential Manager"])
 		has_bom_permission(bom, user=self.regular_user)
+		flush_access_log()
 
 		logs = frappe.get_all(
 			"Confidential Access Log",
@@ -1,9 +1,13 @@
 import frappe
 from frappe.tests.utils import FrappeTestCase
+from confidential_app.confidential_app.utils.propagation import (
+	apply_acl_to_chunk,
+	get_bom_acl,
+	propagate_bom_acl,
+)
 from confidential_app.confidential_app.utils.validations import (
 	set_stock_entry_confidentiality,
 	set_work_order_confidentiality,
-	_copy_access_lists,
 )
 
 
@@ -70,12 +74,34 @@ class TestConfidentialPropagation(FrappeTestCase):
 		frappe.db.commit()
 		return bom
 
+	def _insert_stock_entry(self, bom, **fields):
+		"""Insert a draft Stock Entry for *bom* directly, avoiding ERPNext stock validation; return its name."""
+		values = {
+			"name": frappe.generate_hash(length=10),
+			"docstatus": 0,
+			"purpose": "Manufacture",
+			"bom_no": bom.name,
+			"company": self.company,
+			"is_confidential": 0,
+			"owner": "Administrator",
+			"modified_by": "Administrator",
+		}
+		values.update(fields)
+		columns = ", ".join(f"`{column}`" for column in values)
+		placeholders = ", ".join(f"%({column})s" for column in values)
+		frappe.db.sql(
+			f"""INSERT INTO `tabStock Entry` ({columns}, creation, modified)
+				VALUES ({placeholders}, NOW(), NOW())""",
+			values,
+		)
+		return values["name"]
+
 	# -----------------------------------------------------------------------
 	# set_stock_entry_confidentiality (before_insert hook)
 	# -----------------------------------------------------------------------
 
 	def test_se_inherits_confidentiality(self):
-		"""Stock Entry inherits is_confidential and allowed_roles from BOM."""
+		"""Stock Entry inherits is_confidential and shares the BOM's ACL profile."""
 		bom = self._create_bom(confidential=True, roles=["Confidential Manager"])
 
 		se = frappe.new_doc("Stock Entry")
@@ -85,8 +111,10 @@ class TestConfidentialPropagation(FrappeTestCase):
 		set_stock_entry_confidentiality(se)
 
 		self.assertEqual(se.is_confidential, 1)
-		se_roles = {d.role for d in se.get("allowed_roles", [])}
-		self.assertIn("Confidential Manager", se_roles)
+		self.assertFalse(se.get("allowed_roles"))
+		profile = frappe.get_doc("Confidential ACL Profile", se.acl_profile)
+		self.assertEqual(profile.bom, bom.name)
+		self.assertIn("Confidential Manager", {d.role for d in profile.allowed_roles})
 
 	def test_se_inherits_allowed_users(self):
 		"""Stock Entry inherits allowed_users from BOM."""
@@ -108,8 +136,8 @@ class TestConfidentialPropagation(FrappeTestCase):
 
 		set_stock_entry_confidentiality(se)
 
-		se_users = {d.user for d in se.get("allowed_users", [])}
-		self.assertIn(user_email, se_users)
+		profile = frappe.get_doc("Confidential ACL Profile", se.acl_profile)
+		self.assertIn(user_email, {d.user for d in profile.allowed_users})
 
 	def test_se_non_confidential_bom(self):
 		"""Stock Entry is not marked confidential when BOM isn't."""
@@ -122,6 +150,8 @@ class TestConfidentialPropagation(FrappeTestCase):
 		set_stock_entry_confidentiality(se)
 
 		self.assertEqual(se.is_confidential, 0)
+		self.assertFalse(se.acl_profile)
+		self.assertFalse(frappe.db.exists("Confidential ACL Profile", {"bom": bom.name}))
 
 	# -----------------------------------------------------------------------
 	# set_work_order_confidentiality (before_insert hook)
@@ -140,17 +170,18 @@ class TestConfidentialPropagation(FrappeTestCase):
 		set_work_order_confidentiality(wo)
 
 		self.assertEqual(wo.is_confidential, 1)
-		wo_roles = {d.role for d in wo.get("allowed_roles", [])}
+		profile = frappe.get_doc("Confidential ACL Profile", wo.acl_profile)
+		wo_roles = {d.role for d in profile.allowed_roles}
 		self.assertIn("Confidential Manager", wo_roles)
 		self.assertIn("Confidential User", wo_roles)
 
 	# -----------------------------------------------------------------------
-	# _copy_access_lists helper
+	# apply_acl_to_chunk
 	# -----------------------------------------------------------------------
 
-	def test_copy_access_lists(self):
-		"""_copy_access_lists copies both roles and users."""
-		from frappe.utils import today, add_days
+	def test_apply_acl_copies_roles_and_users(self):
+		"""apply_acl_to_chunk copies roles and users (with their validity) to the chunk."""
+		from frappe.utils import today, add_days, getdate
 
 		bom = self._create_bom(confidential=True, roles=["Confidential Manager"])
 		bom.append("allowed_users", {
@@ -158,36 +189,28 @@ class TestConfidentialPropagation(FrappeTestCase):
 			"valid_from": today(),
 			"valid_until": add_days(today(), 30),
 		})
-		bom.flags.ignore_permissions = True
-		bom.save()
-		frappe.db.commit()
 
-		target = frappe.new_doc("Stock Entry")
-		_copy_access_lists(bom, target)
+		se_name = self._insert_stock_entry(bom)
 
-		target_roles = {d.role for d in target.get("allowed_roles", [])}
-		self.assertIn("Confidential Manager", target_roles)
+		apply_acl_to_chunk("Stock Entry", [(se_name, 0)], get_bom_acl(bom), bom.name)
 
-		target_users = {d.user for d in target.get("allowed_users", [])}
-		self.assertIn("Administrator", target_users)
+		se = frappe.get_doc("Stock Entry", se_name)
+		self.assertEqual(se.is_confidential, 1)
+		self.assertEqual({d.role for d in se.allowed_roles}, {"Confidential Manager"})
+		self.assertEqual(
+			[(d.user, getdate(d.valid_until)) for d in se.allowed_users],
+			[("Administrator", getdate(add_days(today(), 30)))],
+		)
 
 	# -----------------------------------------------------------------------
 	# BOM change cascading
 	# -----------------------------------------------------------------------
 
 	def test_bom_role_change_cascades_to_linked_stock_entries(self):
-		"""When BOM roles change, _update_linked_documents propagates to draft Stock Entries."""
-		from confidential_app.confidential_app.utils.validations import _update_linked_documents
-
+		"""When BOM roles change, propagate_bom_acl updates draft Stock Entries."""
 		bom = self._create_bom(confidential=True, roles=["Confidential Manager"])
 
-		# Create a Stock Entry directly via DB to avoid ERPNext stock validation
-		se_name = frappe.generate_hash(length=10)
-		frappe.db.sql("""
-			INSERT INTO `tabStock Entry`
-			(name, docstatus, purpose, bom_no, company, is_confidential, owner, modified_by, creation, modified)
-			VALUES (%s, 0, 'Manufacture', %s, %s, 1, 'Administrator', 'Administrator', NOW(), NOW())
-		""", (se_name, bom.name, self.company))
+		se_name = self._insert_stock_entry(bom, is_confidential=1)
 		frappe.db.sql("""
 			INSERT INTO `tabConfidential Role Mapping`
 			(name, parent, parenttype, parentfield, role, owner, modified_by, creation, modified)
@@ -203,9 +226,200 @@ class TestConfidentialPropagation(FrappeTestCase):
 		bom.save()
 		frappe.db.commit()
 
-		_update_linked_documents(bom, "Stock Entry")
+		propagate_bom_acl(bom, "Stock Entry")
 		frappe.db.commit()
 
 		se = frappe.get_doc("Stock Entry", se_name)
 		se_roles = {d.role for d in se.get("allowed_roles", [])}
 		self.assertIn("Confidential User", se_roles)
+
+	def test_set_based_propagation_rewrites_every_chunk(self):
+		"""propagate_bom_acl rewrites flags, child rows and effective access across chunks."""
+		bom = self._create_bom(confidential=True, roles=["Confidential Manager"])
+		se_names = [self._insert_stock_entry(bom) for _i in range(3)]
+
+		bom.reload()
+		bom.append("allowed_roles", {"role": "Confidential User"})
+		bom.append("allowed_users", {"user": "Administrator"})
+
+		self.assertEqual(propagate_bom_acl(bom, "Stock Entry", chunk_size=2), 3)
+
+		for se_name in se_names:
+			se = frappe.get_doc("Stock Entry", se_name)
+			self.assertEqual(se.is_confidential, 1)
+			self.assertEqual({d.role for d in se.allowed_roles}, {"Confidential Manager", "Confidential User"})
+			self.assertEqual([d.user for d in se.allowed_users], ["Administrator"])
+			self.assertEqual(
+				frappe.db.count("Confidential Effective Access", {
+					"reference_doctype": "Stock Entry", "reference_name": se_name,
+				}),
+				3,
+			)
+
+	def test_propagation_job_resumes_from_checkpoint(self):
+		"""A job restarted mid-way skips the documents before its checkpoint."""
+		from confidential_app.confidential_app.utils.propagation import run_propagation_job
+
+		bom = self._create_bom(confidential=True, roles=["Confidential Manager"])
+		se_names = [self._insert_stock_entry(bom) for _i in range(3)]
+		se_names.sort()
+
+		job = frappe.get_doc({
+			"doctype": "Confidential Propagation Job",
+			"bom": bom.name,
+			"status": "Running",
+			"current_doctype": "Stock Entry",
+			"last_processed": se_names[0],
+			"processed_count": 1,
+			"total_count": 3,
+		}).insert(ignore_permissions=True)
+		frappe.db.commit()
+
+		run_propagation_job(job.name, chunk_size=1)
+
+		job.reload()
+		self.assertEqual(job.status, "Completed")
+		self.assertEqual(job.processed_count, 3)
+		self.assertEqual(job.last_processed, se_names[-1])
+		self.assertEqual(frappe.db.get_value("Stock Entry", se_names[0], "is_confidential"), 0)
+		for se_name in se_names[1:]:
+			self.assertEqual(frappe.db.get_value("Stock Entry", se_name, "is_confidential"), 1)
+
+	def test_acl_change_after_last_check_reruns_job(self):
+		"""A version bump the job's last check missed sends it round again instead of completing."""
+		from unittest.mock import patch
+		from confidential_app.confidential_app.utils import propagation
+
+		bom = self._create_bom(confidential=True, roles=["Confidential Manager"])
+		se_name = self._insert_stock_entry(bom)
+		job = frappe.get_doc({
+			"doctype": "Confidential Propagation Job",
+			"bom": bom.name,
+			"status": "Queued",
+		}).insert(ignore_permissions=True)
+		frappe.db.commit()
+
+		original_process = propagation._process
+		def process_then_bump(job, acl, chunk_size, heartbeat):
+			done = original_process(job, acl, chunk_size, heartbeat)
+			if process.call_count == 1:
+				frappe.db.set_value("Confidential Propagation Job", job.name, "acl_version", job.acl_version + 1)
+				frappe.db.commit()
+			return done
+
+		with patch.object(propagation, "_process", side_effect=process_then_bump) as process:
+			propagation.run_propagation_job(job.name)
+
+		self.assertEqual(process.call_count, 2)
+		job.reload()
+		self.assertEqual(job.status, "Completed")
+		self.assertEqual(job.acl_version, 1)
+
+	def test_acl_hash_ignores_row_order(self):
+		from confidential_app.confidential_app.utils.acl_hash import compute_acl_hash
+
+		users = [("a@example.com", "2026-01-01", None), ("b@example.com", None, None)]
+		self.assertEqual(
+			compute_acl_hash(1, ["Confidential User", "Confidential Manager"], users),
+			compute_acl_hash(1, ["Confidential Manager", "Confidential User"], list(reversed(users))),
+		)
+		self.assertNotEqual(
+			compute_acl_hash(1, ["Confidential Manager"], users),
+			compute_acl_hash(0, ["Confidential Manager"], users),
+		)
+
+	def test_propagation_skips_documents_in_sync(self):
+		"""Linked documents whose acl_hash matches the BOM's are not rewritten again."""
+		bom = self._create_bom(confidential=True, roles=["Confidential Manager"])
+		se_name = self._insert_stock_entry(bom)
+
+		self.assertEqual(propagate_bom_acl(bom, "Stock Entry"), 1)
+		self.assertEqual(frappe.db.get_value("Stock Entry", se_name, "acl_hash"), bom.acl_hash)
+		self.assertEqual(propagate_bom_acl(bom, "Stock Entry"), 0)
+
+	def test_bom_acl_change_is_one_profile_write(self):
+		"""Derived documents follow the BOM's profile without being rewritten."""
+		from confidential_app.confidential_app.utils.permissions import (
+			_get_doc_acl,
+			invalidate_acl,
+		)
+
+		bom = self._create_bom(confidential=True, roles=["Confidential Manager"])
+		se_name = self._insert_stock_entry(bom, is_confidential=1, acl_profile=bom.acl_profile)
+		invalidate_acl("Stock Entry", se_name)
+		self.assertEqual(set(_get_doc_acl("Stock Entry", se_name).roles), {"Confidential Manager"})
+
+		bom.append("allowed_roles", {"role": "Confidential User"})
+		bom.flags.ignore_permissions = True
+		bom.save()
+
+		# The profile change dropped the derived document's cached ACL.
+		self.assertFalse(frappe.db.exists("Confidential Role Mapping", {"parent": se_name}))
+		self.assertEqual(
+			set(_get_doc_acl("Stock Entry", se_name).roles),
+			{"Confidential Manager", "Confidential User"},
+		)
+
+		bom.is_confidential = 0
+		bom.set("allowed_roles", [])
+		bom.save()
+		self.assertEqual(frappe.db.get_value("Stock Entry", se_name, "is_confidential"), 0)
+
+	def test_non_manager_cannot_change_acl_profile(self):
+		"""acl_profile is not part of acl_hash; the save guard still rejects a non-manager changing it."""
+		from confidential_app.confidential_app.utils.validations import (
+			set_acl_hash,
+			validate_stock_entry_permissions_on_save,
+		)
+
+		user_email = "prop_profile_user@test.local"
+		if not frappe.db.exists("User", user_email):
+			frappe.get_doc({
+				"doctype": "User",
+				"email": user_email,
+				"first_name": "PropProfile",
+				"send_welcome_email": 0,
+				"roles": [{"role": "Manufacturing User"}, {"role": "Stock User"}],
+			}).insert(ignore_permissions=True)
+
+		# The user may use the BOM, which lets them edit its Stock Entries,
+		# but not repoint or clear their shared profile.
+		bom = self._create_bom(confidential=True, users=[user_email])
+		other_bom = self._create_bom(confidential=True)
+		se_name = self._insert_stock_entry(bom, is_confidential=1, acl_profile=bom.acl_profile)
+
+		def load():
+			se = frappe.get_doc("Stock Entry", se_name)
+			se._doc_before_save = frappe.get_doc("Stock Entry", se_name)
+			return se
+
+		frappe.set_user(user_email)
+		try:
+			for acl_profile in (other_bom.acl_profile, None, ""):
+				se = load()
+				se.acl_profile = acl_profile
+				self.assertRaises(frappe.PermissionError, validate_stock_entry_permissions_on_save, se)
+
+			# Detaching through detach_overridden_profile is allowed.
+			se = load()
+			se.append("allowed_users", {"user": user_email})
+			set_acl_hash(se)
+			self.assertIsNone(se.acl_profile)
+			validate_stock_entry_permissions_on_save(se)
+		finally:
+			frappe.set_user("Administrator")
+
+	def test_empty_acl_profile_is_stored_as_null(self):
+		"""'' and NULL both mean "no profile"; saves and the migration write NULL."""
+		from confidential_app.confidential_app.utils.acl_profile import migrate_to_acl_profiles
+		from confidential_app.confidential_app.utils.validations import set_acl_hash
+
+		bom = self._create_bom(confidential=True)
+		se_name = self._insert_stock_entry(bom, is_confidential=1, acl_profile="")
+
+		se = frappe.get_doc("Stock Entry", se_name)
+		set_acl_hash(se)
+		self.assertIsNone(se.acl_profile)
+
+		migrate_to_acl_profiles()
+		self.assertIsNone(frappe.db.get_value("Stock Entry", se_name, "acl_profile"))
@@ -0,0 +1,32 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from confidential_app.confidential_app.utils import trace
+from confidential_app.confidential_app.utils.permissions import has_bom_permission
+
+
+class TestPermissionTrace(FrappeTestCase):
+	"""Spans are recorded only when confidential_permission_trace is set."""
+
+	def setUp(self):
+		frappe.local.confidential_trace = trace._UNSET
+
+	def tearDown(self):
+		frappe.local.confidential_trace = trace._UNSET
+
+	def test_disabled_trace_is_noop(self):
+		with patch.dict(frappe.conf, {trace.TRACE_CONFIG_KEY: 0}):
+			self.assertIs(trace.span("anything"), trace._NOOP_SPAN)
+			has_bom_permission("CONF-TRACE-MISSING", user="Guest")
+		self.assertIsNone(frappe.local.confidential_trace)
+
+	def test_enabled_trace_records_stages(self):
+		with patch.dict(frappe.conf, {trace.TRACE_CONFIG_KEY: 1}):
+			has_bom_permission("CONF-TRACE-MISSING", user="Guest")
+			recorded = {row["span"]: row for row in trace.get_trace().as_list()}
+
+		self.assertIn("has_doctype_permission", recorded)
+		self.assertIn("app_enabled", recorded)
+		self.assertEqual(recorded["has_doctype_permission"]["calls"], 1)
+		self.assertIn("has_doctype_permission;n=1", trace.get_trace().header_value())
@@ -0,0 +1,96 @@
+"""
+ACL fingerprint of BOM / Stock Entry / Work Order.
+
+``acl_hash`` is a SHA-1 digest of is_confidential, the sorted allowed roles
+and the sorted allowed users with their validity windows.  It is set on
+every save (validate / before_update_after_submit), so "did the ACL change"
+and "which linked documents already carry the BOM's ACL" are single column
+comparisons instead of rebuilding and diffing the child-table sets.
+"""
+
+import hashlib
+import json
+
+import frappe
+from frappe.utils import cint
+
+from confidential_app.config.settings import MANAGED_DOCTYPES
+
+
+ACL_HASH_FIELD = "acl_hash"
+
+
+def compute_acl_hash(is_confidential, roles, users):
+    """Digest of an ACL; *users* is an iterable of (user, valid_from, valid_until)."""
+    payload = [
+        cint(is_confidential),
+        sorted(set(roles)),
+        sorted({(user, str(valid_from or ""), str(valid_until or "")) for user, valid_from, valid_until in users}),
+    ]
+    return hashlib.sha1(json.dumps(payload, separators=(",", ":")).encode()).hexdigest()
+
+
+def get_acl_hash(doc):
+    """Digest of the ACL currently held by *doc* (ignores the stored acl_hash)."""
+    return compute_acl_hash(
+        doc.get("is_confidential"),
+        (d.role for d in doc.get("allowed_roles", [])),
+        ((d.user, d.valid_from, d.valid_until) for d in doc.get("allowed_users", [])),
+    )
+
+
+def get_stored_acl_hash(doc):
+    """The saved acl_hash of *doc*, computed when it predates the column."""
+    return doc.get(ACL_HASH_FIELD) or get_acl_hash(doc)
+
+
+def load_acl_hashes(doctype, names):
+    """{name: digest} computed from the database rows of *names*."""
+    names = tuple(names)
+    if not names:
+        return {}
+    flags = dict(frappe.db.sql(
+        f"SELECT name, is_confidential FROM `tab{doctype}` WHERE name IN %(names)s",
+        {"names": names},
+    ))
+    roles = {name: [] for name in flags}
+    users = {name: [] for name in flags}
+    for parent, role in frappe.db.sql(
+        """SELECT parent, role FROM `tabConfidential Role Mapping`
+           WHERE parenttype=%(doctype)s AND parentfield='allowed_roles' AND parent IN %(names)s""",
+        {"doctype": doctype, "names": names},
+    ):
+        roles[parent].append(role)
+    for parent, user, valid_from, valid_until in frappe.db.sql(
+        """SELECT parent, user, valid_from, valid_until FROM `tabConfidential User Mapping`
+           WHERE parenttype=%(doctype)s AND parentfield='allowed_users' AND parent IN %(names)s""",
+        {"doctype": doctype, "names": names},
+    ):
+        users[parent].append((user, valid_from, valid_until))
+    return {
+        name: compute_acl_hash(is_confidential, roles[name], users[name])
+        for name, is_confidential in flags.items()
+    }
+
+
+def backfill_acl_hashes(doctype=None, chunk_size=1000):
+    """Compute acl_hash for every document of the managed doctypes; one UPDATE per distinct digest per chunk."""
+    for dt in ([doctype] if doctype else MANAGED_DOCTYPES):
+        after = ""
+        while True:
+            names = frappe.db.sql_list(
+                f"SELECT name FROM `tab{dt}` WHERE name > %s ORDER BY name LIMIT %s",
+                (after, chunk_size),
+            )
+            if not names:
+                break
+            by_hash = {}
+            for name, digest in load_acl_hashes(dt, names).items():
+                by_hash.setdefault(digest, []).append(name)
+            for digest, chunk in by_hash.items():
+                frappe.db.sql(
+                    f"UPDATE `tab{dt}` SET {ACL_HASH_FIELD}=%(digest)s WHERE name IN %(names)s",
+                    {"digest": digest, "names": tuple(chunk)},
+                )
+            frappe.db.commit()
+            after = names[-1]
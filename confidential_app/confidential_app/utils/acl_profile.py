@@ -0,0 +1,241 @@
+"""
+Shared ACL profiles.
+
+Every BOM owns one `Confidential ACL Profile` holding is_confidential and
+the allowed roles / users once.  Stock Entries and Work Orders made from
+the BOM reference that profile through their ``acl_profile`` field instead
+of carrying copies of the child rows, so changing a BOM's ACL rewrites one
+profile rather than every derived document.
+
+``is_confidential`` stays denormalized on the derived documents (list
+views, print and the form read it directly); a flag change is one UPDATE
+per doctype, keyed by acl_profile.  A derived document given its own
+allowed roles / users is detached from the profile and checked against its
+own rows, as before (the profile's entries are merged into them).
+
+BOMs that were never confidential and have no ACL rows get no profile, and
+neither do the documents made from them.
+"""
+
+import frappe
+from frappe.utils import cint
+
+from .acl_hash import compute_acl_hash, get_stored_acl_hash
+from .permissions import ACL_PROFILE_DOCTYPE, debug_log, invalidate_docs_permissions
+
+
+DERIVED_DOCTYPES = ("Stock Entry", "Work Order")
+
+
+def get_bom_profile(bom_name):
+    """Name of the profile owned by *bom_name*, or None."""
+    return frappe.db.get_value(ACL_PROFILE_DOCTYPE, {"bom": bom_name}, "name")
+
+
+def _has_bom_acl(bom_doc):
+    """True if *bom_doc* is confidential or carries allowed roles / users."""
+    return bool(
+        cint(bom_doc.is_confidential) or bom_doc.get("allowed_roles") or bom_doc.get("allowed_users")
+    )
+
+
+def sync_bom_profile(bom_doc):
+    """Make *bom_doc*'s profile hold its current ACL; return the profile name (or None).
+
+    Creates the profile once the BOM is confidential or has ACL rows.  When
+    the ACL changed, cached decisions of every document referencing the
+    profile are invalidated, and a changed is_confidential is also set on
+    those documents.
+    """
+    acl_hash = get_stored_acl_hash(bom_doc)
+    name = bom_doc.get("acl_profile") or get_bom_profile(bom_doc.name)
+    if not name and not _has_bom_acl(bom_doc):
+        return None
+    profile = frappe.get_doc(ACL_PROFILE_DOCTYPE, name) if name else frappe.new_doc(ACL_PROFILE_DOCTYPE)
+
+    if profile.is_new() or profile.acl_hash != acl_hash:
+        flag_changed = not profile.is_new() and cint(profile.is_confidential) != cint(bom_doc.is_confidential)
+        profile.bom = bom_doc.name
+        profile.is_confidential = cint(bom_doc.is_confidential)
+        profile.acl_hash = acl_hash
+        profile.set("allowed_roles", [{"role": d.role} for d in bom_doc.get("allowed_roles", [])])
+        profile.set("allowed_users", [
+            {"user": d.user, "valid_from": d.valid_from, "valid_until": d.valid_until}
+            for d in bom_doc.get("allowed_users", [])
+        ])
+        is_new = profile.is_new()
+        profile.flags.ignore_permissions = True
+        profile.save()
+        if flag_changed:
+            _set_derived_flag(profile.name, profile.is_confidential)
+        if not is_new:
+            _invalidate_derived_permissions(profile.name)
+        debug_log("ACL profile %s synced from BOM %s", profile.name, bom_doc.name)
+
+    if bom_doc.get("acl_profile") != profile.name:
+        bom_doc.db_set("acl_profile", profile.name, update_modified=False)
+    return profile.name
+
+
+def _set_derived_flag(profile_name, is_confidential):
+    """Set is_confidential on every derived document referencing the profile (one UPDATE per doctype)."""
+    # Profiled documents have no ACL rows of their own, so their acl_hash
+    # only depends on the flag.
+    acl_hash = compute_acl_hash(is_confidential, (), ())
+    for doctype in DERIVED_DOCTYPES:
+        frappe.db.sql(
+            f"""UPDATE `tab{doctype}` SET is_confidential=%(flag)s, acl_hash=%(acl_hash)s
+                WHERE acl_profile=%(profile)s""",
+            {"flag": is_confidential, "acl_hash": acl_hash, "profile": profile_name},
+        )
+
+
+def _invalidate_derived_permissions(profile_name):
+    """Drop cached decisions / ACL entries of every derived document referencing the profile."""
+    for doctype in DERIVED_DOCTYPES:
+        # Raw SQL: get_all would apply the saving user's confidential filter.
+        names = frappe.db.sql_list(
+            f"SELECT name FROM `tab{doctype}` WHERE acl_profile=%s", profile_name,
+        )
+        if names:
+            invalidate_docs_permissions(doctype, names)
+
+
+def _allow_profile_change(doc, *fieldnames):
+    """Let this module's own change of *doc*'s acl_profile through the save.
+
+    ``acl_profile`` sits at permlevel 2 and any other change of it is
+    rejected by validations._block_confidentiality_modification; Frappe's
+    permlevel reset also leaves *fieldnames* alone for users without
+    permlevel 2, since their values come from the BOM, not the user.
+    """
+    doc.flags.acl_profile_change_allowed = True
+    doc.flags.has_permlevel_access_to = list(
+        set(doc.flags.get("has_permlevel_access_to") or []) | {"acl_profile", *fieldnames}
+    )
+
+
+def link_bom_profile(bom_doc, doc):
+    """Point a new Stock Entry / Work Order at its BOM's profile instead of copying the ACL.
+
+    A BOM without a profile and without an ACL leaves the document
+    non-confidential and unlinked.
+    """
+    doc.is_confidential = cint(bom_doc.is_confidential)
+    if not (bom_doc.get("acl_profile") or _has_bom_acl(bom_doc)):
+        return
+    doc.acl_profile = bom_doc.get("acl_profile") or sync_bom_profile(bom_doc)
+    _allow_profile_change(doc, "is_confidential")
+    doc.set("allowed_roles", [])
+    doc.set("allowed_users", [])
+
+
+def detach_overridden_profile(doc):
+    """A derived document given its own roles / users stops following the profile.
+
+    The profile's roles and users are merged into the document's rows first,
+    so e.g. granting one user access keeps everyone else's.  An empty
+    acl_profile is stored as NULL, which is what the list filter and
+    propagation look for.
+    """
+    if doc.doctype not in DERIVED_DOCTYPES:
+        return
+    if not doc.get("acl_profile"):
+        doc.acl_profile = None
+        return
+    if not (doc.get("allowed_roles") or doc.get("allowed_users")):
+        return
+
+    profile = frappe.get_doc(ACL_PROFILE_DOCTYPE, doc.acl_profile)
+    roles = {d.role for d in doc.get("allowed_roles", [])}
+    for row in profile.get("allowed_roles", []):
+        if row.role not in roles:
+            doc.append("allowed_roles", {"role": row.role})
+    users = {d.user for d in doc.get("allowed_users", [])}
+    for row in profile.get("allowed_users", []):
+        if row.user not in users:
+            doc.append("allowed_users", {
+                "user": row.user,
+                "valid_from": row.valid_from,
+                "valid_until": row.valid_until,
+            })
+    doc.acl_profile = None
+    _allow_profile_change(doc)
+    debug_log("%s %s detached from ACL profile %s", doc.doctype, doc.name, profile.name)
+
+
+# ---------------------------------------------------------------------------
+# doc_events (registered in hooks.py)
+# ---------------------------------------------------------------------------
+
+def on_bom_update(doc, method=None):
+    """BOM on_update / on_update_after_submit hook."""
+    sync_bom_profile(doc)
+
+
+def on_bom_trash(doc, method=None):
+    """BOM on_trash hook – drop the profile once nothing references it."""
+    name = doc.get("acl_profile") or get_bom_profile(doc.name)
+    if not name:
+        return
+    for doctype in DERIVED_DOCTYPES:
+        if frappe.db.exists(doctype, {"acl_profile": name}):
+            return
+    frappe.delete_doc(ACL_PROFILE_DOCTYPE, name, ignore_permissions=True, force=True)
+
+
+# ---------------------------------------------------------------------------
+# Migration
+# ---------------------------------------------------------------------------
+
+def migrate_to_acl_profiles():
+    """Give every BOM a profile and attach derived documents whose ACL matches their BOM's.
+
+    Attached documents lose their copied child rows and effective-access
+    rows; documents whose ACL was customized keep them and stay detached.
+    """
+    for doctype in ("BOM", *DERIVED_DOCTYPES):
+        frappe.db.sql(f"UPDATE `tab{doctype}` SET acl_profile = NULL WHERE acl_profile = ''")
+
+    for bom in frappe.get_all("BOM", filters={"acl_profile": ("is", "not set")}, pluck="name"):
+        # sync_bom_profile skips BOMs without an ACL
+        sync_bom_profile(frappe.get_doc("BOM", bom))
+        frappe.db.commit()
+
+    for doctype in DERIVED_DOCTYPES:
+        # Correlated subqueries instead of UPDATE / DELETE ... JOIN, which
+        # MariaDB and Postgres spell differently.
+        frappe.db.sql(
+            f"""UPDATE `tab{doctype}`
+                SET acl_profile = (
+                    SELECT b.acl_profile FROM `tabBOM` b WHERE b.name = `tab{doctype}`.bom_no
+                )
+                WHERE acl_profile IS NULL AND bom_no IN (
+                    SELECT b.name FROM `tabBOM` b
+                    WHERE b.acl_profile IS NOT NULL AND b.acl_hash = `tab{doctype}`.acl_hash
+                )""",
+        )
+        for mapping, parentfield in (
+            ("Confidential Role Mapping", "allowed_roles"),
+            ("Confidential User Mapping", "allowed_users"),
+        ):
+            frappe.db.sql(
+                f"""DELETE FROM `tab{mapping}`
+                    WHERE parenttype = %(doctype)s AND parentfield = %(parentfield)s
+                    AND parent IN (SELECT name FROM `tab{doctype}` WHERE acl_profile IS NOT NULL)""",
+                {"doctype": doctype, "parentfield": parentfield},
+            )
+        frappe.db.sql(
+            f"""DELETE FROM `tabConfidential Effective Access`
+                WHERE reference_doctype = %(doctype)s
+                AND reference_name IN (SELECT name FROM `tab{doctype}` WHERE acl_profile IS NOT NULL)""",
+            {"doctype": doctype},
+        )
+        for flag in (0, 1):
+            frappe.db.sql(
+                f"""UPDATE `tab{doctype}` SET acl_hash = %(acl_hash)s
+                    WHERE acl_profile IS NOT NULL AND IFNULL(is_confidential, 0) = %(flag)s""",
+                {"acl_hash": compute_acl_hash(flag, (), ()), "flag": flag},
+            )
+        frappe.db.commit()
+        debug_log("Attached %s documents to their BOM's ACL profile", doctype)
@@ -0,0 +1,322 @@
+"""
+Batched writer for `Confidential Access Log`.
+
+log_access() used to insert one document per audit event from inside the
+permission hooks.  Events are now appended to a Redis list (the journal) as
+soon as they happen, so they outlive the worker that produced them, and are
+written to the database in multi-row INSERTs.  The journal lives on the
+queue Redis (redis_queue), which persists to disk and never evicts keys,
+not on the LRU cache instance.  Events are written:
+
+* at the end of the request / background job that produced them
+  (after_request / after_job hooks), and
+* by the scheduler, which picks up whatever a crashed worker left behind.
+
+Each event carries its final document name, and rows are inserted with
+ignore_duplicates, so replaying a batch after a crash between INSERT and
+trim does not create duplicate log entries.
+
+"View" events are deduplicated: within Confidential Settings'
+view_dedup_minutes only the first View of a document by a user is logged,
+and later ones are added to that entry's repeat_count.
+"""
+
+import json
+from collections import Counter
+
+import frappe
+from frappe.utils import now_datetime
+from frappe.utils.background_jobs import get_redis_conn
+from redis.exceptions import LockError
+
+from confidential_app.config.settings import ACCESS_LOG_FLUSH_BATCH
+
+
+ACCESS_LOG_DOCTYPE = "Confidential Access Log"
+ACCESS_LOG_FIELDS = [
+    "name", "user", "access_type", "reference_doctype", "reference_name", "details",
+    "timestamp", "ip_address", "owner", "modified_by", "creation", "modified",
+]
+JOURNAL_KEY = "confidential_access_log_journal"
+FLUSH_LOCK_KEY = "confidential_access_log_flush"
+FLUSH_LOCK_TIMEOUT = 300
+FLUSH_JOB_ID = "confidential_access_log_flush"
+VIEW_KEY = "confidential_access_log_view"
+REPEATS_KEY = "confidential_access_log_repeats"
+
+
+def _journal_key():
+    return frappe.cache().make_key(JOURNAL_KEY)
+
+
+def _journal():
+    """Connection holding the journal: the persistent queue Redis."""
+    return get_redis_conn()
+
+
+def _make_event(name, user, access_type, reference_doctype, reference_name, details=None):
+    return {
+        "name": name,
+        "user": user,
+        "access_type": access_type,
+        "reference_doctype": reference_doctype,
+        "reference_name": reference_name,
+        "details": details,
+        "timestamp": str(now_datetime()),
+        "ip_address": getattr(frappe.local, "request_ip", None) or "",
+    }
+
+
+def _event_row(event, inserted_at):
+    # creation is the insert time, not the event time: the rollup watermark
+    # (audit_rollup.py) relies on it growing with every flush.
+    return tuple(event.get(field) for field in ACCESS_LOG_FIELDS[:8]) + (
+        event["user"] or "Administrator", event["user"] or "Administrator", inserted_at, inserted_at,
+    )
+
+
+def _insert_events(events):
+    inserted_at = now_datetime()
+    frappe.db.bulk_insert(
+        ACCESS_LOG_DOCTYPE, ACCESS_LOG_FIELDS, [_event_row(e, inserted_at) for e in events],
+        ignore_duplicates=True,
+    )
+
+
+# ---------------------------------------------------------------------------
+# View deduplication
+#
+# One form open runs has_permission several times (get_doc, get_cached_doc,
+# the has_permission hook, print preview).  The first View of a document by
+# a user claims a Redis key for the dedup window; later Views in the window
+# are counted against the claiming entry instead of journaled.  A
+# request-local map answers repeats within the same request without Redis.
+# ---------------------------------------------------------------------------
+
+def _get_view_dedup_seconds():
+    try:
+        from confidential_app.confidential_app.doctype.confidential_settings.confidential_settings import (
+            get_settings,
+        )
+        return int(get_settings().get("view_dedup_minutes") or 0) * 60
+    except Exception:
+        return 0
+
+
+def _request_views():
+    views = getattr(frappe.local, "confidential_audit_views", None)
+    if views is None:
+        views = frappe.local.confidential_audit_views = {}
+    return views
+
+
+def _request_repeats():
+    repeats = getattr(frappe.local, "confidential_audit_repeats", None)
+    if repeats is None:
+        repeats = frappe.local.confidential_audit_repeats = Counter()
+    return repeats
+
+
+def _count_repeat(event_name):
+    _request_repeats()[event_name] += 1
+    frappe.local.confidential_audit_pending = True
+
+
+def _claim_view(name, user, reference_doctype, reference_name):
+    """Return True if this View should be logged as *name*, False if it is a repeat."""
+    window = _get_view_dedup_seconds()
+    if not window:
+        return True
+
+    views = _request_views()
+    view = (user, reference_doctype, reference_name)
+    if view in views:
+        _count_repeat(views[view])
+        return False
+
+    cache = frappe.cache()
+    key = cache.make_key(f"{VIEW_KEY}:{user}:{reference_doctype}:{reference_name}")
+    if cache.set(key, name, nx=True, ex=window):
+        views[view] = name
+        return True
+
+    claimed = frappe.safe_decode(cache.get(key) or "")
+    if not claimed:
+        # The claim expired between SET NX and GET.
+        cache.set(key, name, ex=window)
+        views[view] = name
+        return True
+
+    views[view] = claimed
+    _count_repeat(claimed)
+    return False
+
+
+def _push_repeats(repeats):
+    """Add *repeats* ({event name: count}) to the shared Redis hash."""
+    pipe = frappe.cache().pipeline()
+    key = frappe.cache().make_key(REPEATS_KEY)
+    for event_name, count in repeats.items():
+        pipe.hincrby(key, event_name, count)
+    pipe.execute()
+
+
+def _push_request_repeats():
+    """Move this request's repeat counts into the shared Redis hash."""
+    repeats = getattr(frappe.local, "confidential_audit_repeats", None)
+    if not repeats:
+        return
+    _push_repeats(repeats)
+    repeats.clear()
+
+
+def _take_repeats():
+    """Atomically read and clear the shared repeat counts."""
+    key = frappe.cache().make_key(REPEATS_KEY)
+    pipe = frappe.cache().pipeline()
+    pipe.hgetall(key)
+    pipe.delete(key)
+    repeats, _deleted = pipe.execute()
+    return {frappe.safe_decode(name): int(count) for name, count in (repeats or {}).items()}
+
+
+def _apply_repeats(repeats, batch_size):
+    """Add repeat counts to their log entries, one UPDATE per distinct increment."""
+    by_count = {}
+    for event_name, count in repeats.items():
+        by_count.setdefault(count, []).append(event_name)
+
+    for count, names in by_count.items():
+        for start in range(0, len(names), batch_size):
+            frappe.db.sql(
+                f"""UPDATE `tab{ACCESS_LOG_DOCTYPE}`
+                    SET repeat_count = repeat_count + %(count)s
+                    WHERE name IN %(names)s""",
+                {"count": count, "names": tuple(names[start:start + batch_size])},
+            )
+
+
+def enqueue_access_event(user, access_type, reference_doctype, reference_name, details=None):
+    """Append one audit event to the journal.
+
+    Repeated Views within the dedup window are only counted.  Falls back to
+    a direct insert when Redis is unavailable, so an event is never dropped.
+    """
+    event = _make_event(
+        frappe.generate_hash(length=10), user, access_type, reference_doctype, reference_name, details,
+    )
+    try:
+        if access_type == "View" and not _claim_view(event["name"], user, reference_doctype, reference_name):
+            return
+        _journal().rpush(_journal_key(), json.dumps(event, default=str))
+    except Exception:
+        _insert_events([event])
+        return
+    frappe.local.confidential_audit_pending = True
+
+
+def get_pending_count():
+    """Number of audit events waiting in the journal."""
+    return _journal().llen(_journal_key())
+
+
+def flush_access_log(batch_size=ACCESS_LOG_FLUSH_BATCH, max_batches=None):
+    """Write journaled events to `tabConfidential Access Log`; return the count written.
+
+    Batches are read with LRANGE, inserted and committed, and only then
+    trimmed from the journal.  Repeat counts of deduplicated Views are
+    applied after the journal is drained, so their entries exist.  A lock
+    keeps concurrent flushers from writing the same batch twice; if another
+    worker holds it, this call returns 0.  The lock is refreshed after every
+    batch; if it was lost (expired and taken by another flusher) the flush
+    stops and hands the repeat counts back.  With *max_batches*, the flush
+    also stops after that many batches and leaves the rest of the journal
+    (and the repeat counts) for the next flush.
+    """
+    _push_request_repeats()
+
+    cache = frappe.cache()
+    journal = _journal()
+    key = _journal_key()
+    lock = cache.lock(cache.make_key(FLUSH_LOCK_KEY), timeout=FLUSH_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+
+    written = 0
+    batches = 0
+    try:
+        repeats = _take_repeats()
+        while True:
+            if max_batches is not None and batches >= max_batches and journal.llen(key):
+                if repeats:
+                    _push_repeats(repeats)
+                return written
+            raw = journal.lrange(key, 0, batch_size - 1)
+            if not raw:
+                break
+            events = []
+            for item in raw:
+                try:
+                    events.append(json.loads(item))
+                except ValueError:
+                    frappe.log_error("Discarded malformed Confidential Access Log event", frappe.safe_decode(item))
+            if events:
+                _insert_events(events)
+                frappe.db.commit()
+            journal.ltrim(key, len(raw), -1)
+            written += len(events)
+            batches += 1
+            if not _refresh_lock(lock):
+                if repeats:
+                    _push_repeats(repeats)
+                return written
+
+        if repeats:
+            _apply_repeats(repeats, batch_size)
+            frappe.db.commit()
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            pass
+    return written
+
+
+def _refresh_lock(lock):
+    """Reset the flush lock's TTL; return False if another worker now owns it."""
+    try:
+        return bool(lock.reacquire())
+    except LockError:
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Hooks (registered in hooks.py)
+# ---------------------------------------------------------------------------
+
+def flush_after_request(*args, **kwargs):
+    """after_request / after_job hook – flush if this request journaled events.
+
+    Writes at most one batch, so a request never pays for other workers'
+    backlog; anything left is drained by an enqueued flush_pending job (and
+    by the scheduler).
+    """
+    if not getattr(frappe.local, "confidential_audit_pending", False):
+        return
+    frappe.local.confidential_audit_pending = False
+    try:
+        flush_access_log(max_batches=1)
+        if get_pending_count():
+            frappe.enqueue(
+                "confidential_app.confidential_app.utils.audit.flush_pending",
+                queue="short",
+                job_id=FLUSH_JOB_ID,
+                deduplicate=True,
+            )
+    except Exception:
+        frappe.log_error("Failed to flush Confidential Access Log", frappe.get_traceback())
+
+
+def flush_pending():
+    """Scheduler job – write events left in the journal by crashed workers."""
+    flush_access_log()
@@ -0,0 +1,278 @@
+"""
+Archival of old `Confidential Access Log` rows.
+
+A daily job moves entries older than Confidential Settings'
+audit_retention_days out of the database into gzip-compressed JSONL
+segments, one per calendar day, under
+``<site>/private/files/confidential_audit_archive/<YYYY>/<MM>/``.
+
+``manifest.json`` in the archive root lists every segment with its day, row
+count, last archived row name and SHA-256.  A segment is written and
+recorded in the manifest before any row is deleted; rows are then deleted in
+AUDIT_ARCHIVE_BATCH-sized transactions.  A segment whose deletion was
+interrupted is finished on the next run before anything new is archived, so
+rows are never archived twice.
+
+iter_archived_access_log() streams archived events back for audits.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+
+import frappe
+from frappe.utils import add_days, getdate, now, today
+
+from confidential_app.config.settings import AUDIT_ARCHIVE_BATCH, AUDIT_ARCHIVE_DIR
+from .audit import ACCESS_LOG_DOCTYPE
+from .audit_rollup import get_rollup_watermark
+from .permissions import debug_log
+
+
+ARCHIVE_FIELDS = [
+    "name", "user", "access_type", "reference_doctype", "reference_name", "details",
+    "timestamp", "ip_address", "repeat_count", "owner", "creation",
+]
+MANIFEST_FILE = "manifest.json"
+ARCHIVE_LOCK_KEY = "confidential_audit_archive"
+ARCHIVE_LOCK_TIMEOUT = 6 * 60 * 60
+
+
+def get_archive_path(*parts):
+    return frappe.get_site_path("private", "files", AUDIT_ARCHIVE_DIR, *parts)
+
+
+def _get_retention_days():
+    try:
+        from confidential_app.confidential_app.doctype.confidential_settings.confidential_settings import (
+            get_settings,
+        )
+        return int(get_settings().get("audit_retention_days") or 0)
+    except Exception:
+        return 0
+
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+
+def read_manifest():
+    """Return the list of segment entries (oldest first)."""
+    path = get_archive_path(MANIFEST_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f).get("segments", [])
+
+
+def _write_manifest(segments):
+    path = get_archive_path(MANIFEST_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"segments": segments}, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_segment(entry):
+    """True if the segment file exists and matches its manifest checksum."""
+    path = get_archive_path(entry["file"])
+    return os.path.exists(path) and _sha256(path) == entry["sha256"]
+
+
+# ---------------------------------------------------------------------------
+# Archival
+# ---------------------------------------------------------------------------
+
+def _day_bounds(day):
+    return str(day), str(add_days(day, 1))
+
+
+def _write_segment(day):
+    """Write every row created on *day* to a new segment; return its manifest entry or None."""
+    start, end = _day_bounds(day)
+    relative = os.path.join(
+        f"{day:%Y}", f"{day:%m}", f"access_log-{day:%Y-%m-%d}-{frappe.generate_hash(length=6)}.jsonl.gz",
+    )
+    path = get_archive_path(relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    rows = 0
+    last_name = ""
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        while True:
+            chunk = frappe.db.sql(
+                f"""SELECT {", ".join(f"`{field}`" for field in ARCHIVE_FIELDS)}
+                    FROM `tab{ACCESS_LOG_DOCTYPE}`
+                    WHERE creation >= %(start)s AND creation < %(end)s AND name > %(after)s
+                    ORDER BY name LIMIT %(limit)s""",
+                {"start": start, "end": end, "after": last_name, "limit": AUDIT_ARCHIVE_BATCH},
+                as_dict=True,
+            )
+            if not chunk:
+                break
+            for row in chunk:
+                f.write(json.dumps(row, default=str, separators=(",", ":")))
+                f.write("\n")
+            rows += len(chunk)
+            last_name = chunk[-1].name
+
+    if not rows:
+        os.remove(tmp)
+        return None
+
+    os.replace(tmp, path)
+    return {
+        "file": relative,
+        "date": str(day),
+        "rows": rows,
+        "last_name": last_name,
+        "sha256": _sha256(path),
+        "created": now(),
+        "deleted": 0,
+    }
+
+
+def _delete_archived_rows(entry):
+    """Delete the rows of a recorded segment, AUDIT_ARCHIVE_BATCH per transaction."""
+    start, end = _day_bounds(getdate(entry["date"]))
+    while True:
+        names = frappe.db.sql_list(
+            f"""SELECT name FROM `tab{ACCESS_LOG_DOCTYPE}`
+                WHERE creation >= %(start)s AND creation < %(end)s AND name <= %(last)s
+                LIMIT %(limit)s""",
+            {"start": start, "end": end, "last": entry["last_name"], "limit": AUDIT_ARCHIVE_BATCH},
+        )
+        if not names:
+            break
+        frappe.db.delete(ACCESS_LOG_DOCTYPE, {"name": ("in", names)})
+        frappe.db.commit()
+
+
+def archive_access_log(retention_days=None):
+    """Move access log rows older than *retention_days* into archive segments.
+
+    Returns the number of rows archived.  Runs under a Redis lock so only
+    one worker archives at a time.
+    """
+    retention_days = _get_retention_days() if retention_days is None else retention_days
+    if not retention_days:
+        return 0
+
+    cache = frappe.cache()
+    lock = cache.lock(cache.make_key(ARCHIVE_LOCK_KEY), timeout=ARCHIVE_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+
+    archived = 0
+    try:
+        os.makedirs(get_archive_path(), exist_ok=True)
+        segments = read_manifest()
+
+        for entry in segments:
+            if not entry.get("deleted"):
+                _delete_archived_rows(entry)
+                entry["deleted"] = 1
+                _write_manifest(segments)
+
+        cutoff = add_days(today(), -retention_days)
+        # Never archive rows the daily rollups have not counted yet.
+        watermark = get_rollup_watermark()
+        if watermark is not None:
+            cutoff = min(getdate(cutoff), getdate(watermark))
+        days = frappe.db.sql_list(
+            f"""SELECT DISTINCT DATE(creation) FROM `tab{ACCESS_LOG_DOCTYPE}`
+                WHERE creation < %s ORDER BY 1""",
+            cutoff,
+        )
+        for day in days:
+            entry = _write_segment(getdate(day))
+            if not entry:
+                continue
+            segments.append(entry)
+            _write_manifest(segments)
+
+            _delete_archived_rows(entry)
+            entry["deleted"] = 1
+            _write_manifest(segments)
+            archived += entry["rows"]
+    finally:
+        lock.release()
+
+    if archived:
+        debug_log("Archived %s Confidential Access Log rows older than %s", archived, cutoff)
+    return archived
+
+
+def archive_access_log_job():
+    """Scheduler job (daily_long)."""
+    archive_access_log()
+
+
+# ---------------------------------------------------------------------------
+# Reader
+# ---------------------------------------------------------------------------
+
+def iter_archived_access_log(from_date=None, to_date=None, filters=None, verify=False):
+    """Yield archived access log events as dicts, oldest day first.
+
+    *filters* is a dict of field → value matched exactly (e.g.
+    ``{"reference_doctype": "BOM", "reference_name": "BOM-0001"}``).
+    Segments are decompressed one line at a time, so memory use does not
+    depend on archive size.  With *verify*, segments that fail their
+    checksum raise frappe.ValidationError before any of their rows are read.
+    """
+    from_date = getdate(from_date) if from_date else None
+    to_date = getdate(to_date) if to_date else None
+    filters = filters or {}
+
+    for entry in sorted(read_manifest(), key=lambda e: (e["date"], e["created"])):
+        day = getdate(entry["date"])
+        if (from_date and day < from_date) or (to_date and day > to_date):
+            continue
+        if verify and not verify_segment(entry):
+            frappe.throw(
+                frappe._("Archived segment {0} failed its checksum").format(entry["file"]),
+                frappe.ValidationError,
+            )
+
+        with gzip.open(get_archive_path(entry["file"]), "rt", encoding="utf-8") as f:
+            for line in f:
+                event = json.loads(line)
+                if all(event.get(field) == value for field, value in filters.items()):
+                    yield event
+
+
+@frappe.whitelist()
+def get_archived_access_log(from_date=None, to_date=None, reference_doctype=None,
+                            reference_name=None, user=None, limit=500):
+    """Return up to *limit* archived events matching the filters (System Manager only)."""
+    frappe.only_for("System Manager")
+    limit = min(int(limit or 500), AUDIT_ARCHIVE_BATCH)
+    filters = {
+        field: value
+        for field, value in (
+            ("reference_doctype", reference_doctype),
+            ("reference_name", reference_name),
+            ("user", user),
+        )
+        if value
+    }
+
+    events = []
+    for event in iter_archived_access_log(from_date, to_date, filters):
+        events.append(event)
+        if len(events) >= limit:
+            break
+    return events
@@ -0,0 +1,161 @@
+"""
+Streaming export of `Confidential Access Log` as CSV or JSONL.
+
+Rows are read through an unbuffered (server-side) cursor and encoded in
+chunks of EXPORT_CHUNK_SIZE rows, so memory use stays flat however many
+rows the range holds.  iter_access_log_export() is the single generator
+behind both the whitelisted HTTP endpoint and the
+``bench export-confidential-access-log`` command.
+"""
+
+import csv
+import io
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, getdate
+
+from .audit import ACCESS_LOG_DOCTYPE
+
+
+EXPORT_FIELDS = [
+    "name", "timestamp", "user", "access_type", "reference_doctype", "reference_name",
+    "ip_address", "repeat_count", "details",
+]
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FILTER_FIELDS = ("user", "access_type", "reference_doctype", "reference_name")
+
+
+def _build_query(from_date, to_date, filters):
+    if not (from_date and to_date):
+        frappe.throw(_("From Date and To Date are required"), frappe.ValidationError)
+
+    conditions = ["timestamp >= %(from_date)s", "timestamp < %(to_date)s"]
+    values = {
+        "from_date": str(getdate(from_date)),
+        "to_date": str(add_days(getdate(to_date), 1)),
+    }
+    for field in EXPORT_FILTER_FIELDS:
+        if (filters or {}).get(field):
+            conditions.append(f"`{field}` = %({field})s")
+            values[field] = filters[field]
+
+    query = f"""SELECT {", ".join(f"`{field}`" for field in EXPORT_FIELDS)}
+                FROM `tab{ACCESS_LOG_DOCTYPE}`
+                WHERE {" AND ".join(conditions)}
+                ORDER BY timestamp, name"""
+    return query, values
+
+
+def _encode_chunk(rows, fmt):
+    buffer = io.StringIO()
+    if fmt == "csv":
+        writer = csv.writer(buffer)
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), default=str))
+            buffer.write("\n")
+    return buffer.getvalue()
+
+
+def iter_access_log_export(from_date, to_date, filters=None, fmt="csv", chunk_size=EXPORT_CHUNK_SIZE, db=None):
+    """Yield the export as text chunks of up to *chunk_size* rows each.
+
+    CSV output starts with a header row.  Reads through *db* (default
+    ``frappe.db``); no other query may run on that connection until the
+    generator is exhausted or closed.
+    """
+    if fmt not in EXPORT_FORMATS:
+        frappe.throw(_("Unsupported export format: {0}").format(fmt), frappe.ValidationError)
+
+    db = db or frappe.db
+    query, values = _build_query(from_date, to_date, filters)
+    if fmt == "csv":
+        yield _encode_chunk([EXPORT_FIELDS], fmt)
+
+    with db.unbuffered_cursor():
+        chunk = []
+        for row in db.sql(query, values, as_list=True, as_iterator=True):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield _encode_chunk(chunk, fmt)
+                chunk = []
+        if chunk:
+            yield _encode_chunk(chunk, fmt)
+
+
+def _export_db_settings():
+    """Connection arguments for a dedicated export connection, read from the
+    request's site config while it is still bound."""
+    conf = frappe.local.conf
+    return {
+        "socket": conf.db_socket,
+        "host": conf.db_host,
+        "port": conf.db_port,
+        "user": conf.db_user or conf.db_name,
+        "password": conf.db_password,
+        "cur_db_name": conf.db_name,
+    }
+
+
+def _stream_export(db_settings, from_date, to_date, filters, fmt):
+    """Run the export generator on its own DB connection.
+
+    The HTTP response body is consumed after Frappe has released the
+    request's DB connection, so the generator opens a separate one.  It
+    leaves ``frappe.local`` (site, session user, ``frappe.db``) untouched.
+    """
+    from frappe.database import get_db
+
+    db = get_db(**db_settings)
+    try:
+        for chunk in iter_access_log_export(from_date, to_date, filters, fmt, db=db):
+            yield chunk.encode("utf-8")
+    finally:
+        db.close()
+
+
+@frappe.whitelist()
+def export_access_log(from_date, to_date, fmt="csv", user=None, access_type=None,
+                      reference_doctype=None, reference_name=None):
+    """Stream the access log for a date range as a CSV or JSONL download."""
+    from werkzeug.wrappers import Response
+
+    # Everything that depends on the session is settled here, before the
+    # response starts streaming; the body generator does not see the session.
+    session_user = frappe.session.user
+    if session_user == "Guest":
+        frappe.throw(_("Log in to export the access log."), frappe.PermissionError)
+    frappe.has_permission(ACCESS_LOG_DOCTYPE, "read", user=session_user, throw=True)
+    if fmt not in EXPORT_FORMATS:
+        frappe.throw(_("Unsupported export format: {0}").format(fmt), frappe.ValidationError)
+    # Validate the range before the response starts streaming.
+    _build_query(from_date, to_date, None)
+
+    filters = {
+        "user": user,
+        "access_type": access_type,
+        "reference_doctype": reference_doctype,
+        "reference_name": reference_name,
+    }
+    filename = f"confidential_access_log_{getdate(from_date)}_{getdate(to_date)}.{fmt}"
+    response = Response(
+        _stream_export(_export_db_settings(), from_date, to_date, filters, fmt),
+        content_type=EXPORT_FORMATS[fmt],
+        direct_passthrough=True,
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def export_access_log_to_file(path, from_date, to_date, filters=None, fmt="csv"):
+    """Write the export to *path* chunk by chunk."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in iter_access_log_export(from_date, to_date, filters, fmt):
+            f.write(chunk)
@@ -0,0 +1,148 @@
+"""
+Keyset-paginated queries over `Confidential Access Log`.
+
+Auditors look up the log by document ("who viewed BOM-X") or by user
+("what did Y touch last quarter").  Both lookups are served by the
+composite indexes created in the doctype's on_doctype_update():
+
+* reference_timestamp_index – (reference_doctype, reference_name, timestamp)
+* user_timestamp_index      – (user, timestamp)
+
+Rows are returned newest first, ordered by (timestamp, name).  Instead of
+OFFSET, each page ends with an opaque cursor holding the last row's
+(timestamp, name); the next page starts strictly after it, so paging back
+months costs the same as reading the first page.  The cursor also carries a
+hash of the filters it was issued for; a cursor presented with different
+filters is ignored and the query restarts from the newest row, instead of
+silently skipping rows that sort after the old position.
+"""
+
+import base64
+import hashlib
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, cint, getdate
+
+from .audit import ACCESS_LOG_DOCTYPE
+
+
+AUDIT_QUERY_FIELDS = [
+    "name", "timestamp", "user", "access_type", "reference_doctype", "reference_name",
+    "ip_address", "repeat_count", "details",
+]
+DEFAULT_PAGE_LENGTH = 100
+MAX_PAGE_LENGTH = 1000
+
+
+def filters_hash(reference_doctype=None, reference_name=None, user=None, access_type=None,
+                 from_date=None, to_date=None):
+    """Short digest of the normalised filters a cursor belongs to."""
+    key = [
+        reference_doctype or None,
+        reference_name or None,
+        user or None,
+        access_type or None,
+        str(getdate(from_date)) if from_date else None,
+        str(getdate(to_date)) if to_date else None,
+    ]
+    return hashlib.sha1(json.dumps(key).encode()).hexdigest()[:12]
+
+
+def encode_cursor(timestamp, name, filters_digest=None):
+    return base64.urlsafe_b64encode(
+        json.dumps([str(timestamp), name, filters_digest]).encode()
+    ).decode()
+
+
+def decode_cursor(cursor):
+    """Return ``(timestamp, name, filters_digest)``; cursors issued before the
+    digest was added decode with a digest of None."""
+    try:
+        parts = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        timestamp, name = parts[0], parts[1]
+        filters_digest = parts[2] if len(parts) > 2 else None
+    except Exception:
+        frappe.throw(_("Invalid cursor"), frappe.ValidationError)
+    return timestamp, name, filters_digest
+
+
+def query_access_log(reference_doctype=None, reference_name=None, user=None, access_type=None,
+                     from_date=None, to_date=None, cursor=None, page_length=DEFAULT_PAGE_LENGTH):
+    """Return ``{"rows": [...], "next_cursor": str | None}`` (no permission check).
+
+    Requires a document (reference_doctype + reference_name) or a user so
+    the query always runs on one of the composite indexes.  A *cursor* issued
+    for different filters is ignored and the first page is returned.
+    """
+    if not ((reference_doctype and reference_name) or user):
+        frappe.throw(_("Filter the access log by document or by user"), frappe.ValidationError)
+
+    page_length = min(max(cint(page_length) or DEFAULT_PAGE_LENGTH, 1), MAX_PAGE_LENGTH)
+    filters_digest = filters_hash(reference_doctype, reference_name, user, access_type, from_date, to_date)
+    conditions = []
+    values = {"limit": page_length + 1}
+
+    if reference_doctype and reference_name:
+        conditions.append("reference_doctype = %(reference_doctype)s AND reference_name = %(reference_name)s")
+        values.update(reference_doctype=reference_doctype, reference_name=reference_name)
+    if user:
+        conditions.append("user = %(user)s")
+        values["user"] = user
+    if access_type:
+        conditions.append("access_type = %(access_type)s")
+        values["access_type"] = access_type
+    if from_date:
+        conditions.append("timestamp >= %(from_date)s")
+        values["from_date"] = str(getdate(from_date))
+    if to_date:
+        conditions.append("timestamp < %(to_date)s")
+        values["to_date"] = str(add_days(getdate(to_date), 1))
+    if cursor:
+        cursor_timestamp, cursor_name, cursor_digest = decode_cursor(cursor)
+        if cursor_digest != filters_digest:
+            cursor = None
+    if cursor:
+        values.update(cursor_timestamp=cursor_timestamp, cursor_name=cursor_name)
+        conditions.append(
+            "(timestamp < %(cursor_timestamp)s"
+            " OR (timestamp = %(cursor_timestamp)s AND name < %(cursor_name)s))"
+        )
+
+    rows = frappe.db.sql(
+        f"""SELECT {", ".join(f"`{field}`" for field in AUDIT_QUERY_FIELDS)}
+            FROM `tab{ACCESS_LOG_DOCTYPE}`
+            WHERE {" AND ".join(conditions)}
+            ORDER BY timestamp DESC, name DESC
+            LIMIT %(limit)s""",
+        values,
+        as_dict=True,
+    )
+
+    next_cursor = None
+    if len(rows) > page_length:
+        rows = rows[:page_length]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].name, filters_digest)
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
+@frappe.whitelist()
+def get_access_log(reference_doctype=None, reference_name=None, user=None, access_type=None,
+                   from_date=None, to_date=None, cursor=None, page_length=DEFAULT_PAGE_LENGTH):
+    """Whitelisted keyset-paginated audit query.
+
+    Pass the returned ``next_cursor`` back as *cursor* to fetch the next
+    (older) page; ``next_cursor`` is None on the last page.
+    """
+    frappe.has_permission(ACCESS_LOG_DOCTYPE, "read", throw=True)
+    return query_access_log(
+        reference_doctype=reference_doctype,
+        reference_name=reference_name,
+        user=user,
+        access_type=access_type,
+        from_date=from_date,
+        to_date=to_date,
+        cursor=cursor,
+        page_length=page_length,
+    )
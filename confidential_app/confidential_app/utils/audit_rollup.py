@@ -0,0 +1,124 @@
+"""
+Daily rollups of `Confidential Access Log` for dashboards.
+
+`tabConfidential Access Rollup` holds one row per (day, reference_doctype,
+reference_name, user, access_type) with the number of log entries.  Rows
+are named by a hash of that key, so each refresh is a single
+``INSERT ... SELECT ... GROUP BY`` upsert (``ON DUPLICATE KEY UPDATE`` on
+MariaDB, ``ON CONFLICT`` on Postgres) that adds the new counts to existing
+rows.
+
+Progress is tracked by a watermark on the log's ``creation`` column (the
+time the batched writer inserted the row), kept in Confidential Settings'
+access_rollup_watermark (the form re-reads it on save, see
+ConfidentialSettings.validate).  Each run aggregates rows with
+watermark < creation <= now - ROLLUP_LAG_MINUTES, at most one day per
+statement, and advances the watermark in the same transaction, so a row is
+never counted twice.  The lag leaves room for transactions that commit out
+of order.
+
+Counts are log entries: Views folded into an entry's repeat_count by the
+View dedup window are not added.
+"""
+
+import frappe
+from frappe.utils import add_days, add_to_date, get_datetime, now, now_datetime
+
+from confidential_app.config.settings import ROLLUP_LAG_MINUTES
+from .audit import ACCESS_LOG_DOCTYPE
+from .permissions import debug_log
+
+
+ROLLUP_DOCTYPE = "Confidential Access Rollup"
+
+
+def get_rollup_watermark():
+    """Return the creation time up to which the log has been rolled up (or None)."""
+    value = frappe.db.get_single_value("Confidential Settings", "access_rollup_watermark")
+    return get_datetime(value) if value else None
+
+
+def _set_rollup_watermark(value):
+    frappe.db.set_single_value(
+        "Confidential Settings", "access_rollup_watermark", value, update_modified=False,
+    )
+
+
+def _first_log_creation():
+    value = frappe.db.sql(f"SELECT MIN(creation) FROM `tab{ACCESS_LOG_DOCTYPE}`")[0][0]
+    return get_datetime(value) if value else None
+
+
+def _rollup_name_sql():
+    key = "CONCAT_WS('|', DATE(timestamp), reference_doctype, reference_name, `user`, access_type)"
+    if frappe.db.db_type == "postgres":
+        return f"MD5({key})"
+    return f"SHA1({key})"
+
+
+def _rollup_upsert_sql():
+    if frappe.db.db_type == "postgres":
+        return f"""ON CONFLICT (name) DO UPDATE SET
+                access_count = `tab{ROLLUP_DOCTYPE}`.access_count + EXCLUDED.access_count,
+                modified = EXCLUDED.modified"""
+    return """ON DUPLICATE KEY UPDATE
+                access_count = access_count + VALUES(access_count),
+                modified = VALUES(modified)"""
+
+
+def _rollup_window(start, end):
+    frappe.db.sql(
+        f"""INSERT INTO `tab{ROLLUP_DOCTYPE}`
+                (name, date, reference_doctype, reference_name, `user`, access_type, access_count,
+                 owner, modified_by, creation, modified, docstatus, idx)
+            SELECT
+                {_rollup_name_sql()},
+                DATE(timestamp), reference_doctype, reference_name, `user`, access_type, COUNT(*),
+                'Administrator', 'Administrator', %(now)s, %(now)s, 0, 0
+            FROM `tab{ACCESS_LOG_DOCTYPE}`
+            WHERE creation > %(start)s AND creation <= %(end)s AND timestamp IS NOT NULL
+            GROUP BY DATE(timestamp), reference_doctype, reference_name, `user`, access_type
+            {_rollup_upsert_sql()}""",
+        {"start": start, "end": end, "now": now()},
+    )
+
+
+def refresh_access_rollups():
+    """Fold log rows inserted since the watermark into the rollup table.
+
+    Returns the new watermark.  Each window (at most one day) is committed
+    together with its watermark.
+    """
+    watermark = get_rollup_watermark()
+    if watermark is None:
+        first = _first_log_creation()
+        if first is None:
+            return None
+        watermark = add_to_date(first, seconds=-1)
+
+    limit = add_to_date(now_datetime(), minutes=-ROLLUP_LAG_MINUTES)
+    windows = 0
+    while watermark < limit:
+        end = min(add_days(watermark, 1), limit)
+        _rollup_window(watermark, end)
+        _set_rollup_watermark(end)
+        frappe.db.commit()
+        watermark = end
+        windows += 1
+
+    if windows:
+        debug_log("Access rollups refreshed up to %s", watermark)
+    return watermark
+
+
+def rebuild_access_rollups():
+    """Drop all rollups and aggregate the whole log again."""
+    frappe.db.delete(ROLLUP_DOCTYPE)
+    _set_rollup_watermark(None)
+    frappe.db.commit()
+    return refresh_access_rollups()
+
+
+def refresh_access_rollups_job():
+    """Scheduler job (every 15 minutes)."""
+    refresh_access_rollups()
@@ -0,0 +1,139 @@
+"""
+Transitive closure of BOM → sub-BOM edges for the sub-assembly cascade.
+
+`tabConfidential BOM Closure` holds one (ancestor, descendant, depth) row
+for every sub-BOM reachable from a BOM, depth being the shortest path.
+It is refreshed from `tabBOM Item` whenever a BOM is saved or deleted so
+that _check_sub_bom_confidentiality can answer with one indexed query
+instead of walking the tree.
+
+The BOM Update Tool rewrites `tabBOM Item`.bom_no without saving the
+parent BOMs; the permission layer detects the missing edges on lookup
+(_is_bom_closure_stale), uses the walker and queues refresh_bom_closure.
+
+Maintenance only runs while Confidential Settings uses the "Closure Table"
+cascade mode.  The `bom_closure_ready` flag is set once a full rebuild has
+completed; until then the permission layer falls back to the Python walker.
+"""
+
+import frappe
+from frappe.utils import now
+
+from confidential_app.config.settings import CASCADE_MODE_CLOSURE
+from .permissions import _get_cascade_mode, debug_log
+
+
+CLOSURE_DOCTYPE = "Confidential BOM Closure"
+CLOSURE_FIELDS = ["name", "ancestor", "descendant", "depth", "owner", "modified_by", "creation", "modified"]
+
+
+def _closure_rows(ancestor, descendants):
+    timestamp = now()
+    return [
+        (frappe.generate_hash(length=12), ancestor, descendant, depth,
+         "Administrator", "Administrator", timestamp, timestamp)
+        for descendant, depth in descendants.items()
+    ]
+
+
+def _walk_descendants(bom_name, children_of):
+    """Breadth-first walk returning {descendant: shortest depth}.
+
+    *children_of* maps a list of parent BOMs to their (parent, bom_no) edges.
+    A BOM only reaches itself through a cycle.
+    """
+    depths = {}
+    frontier = [bom_name]
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for _parent, child in children_of(frontier):
+            if child not in depths:
+                depths[child] = depth
+                next_frontier.append(child)
+        frontier = next_frontier
+    return depths
+
+
+def _query_children(parents):
+    return frappe.db.sql(
+        """SELECT DISTINCT parent, bom_no FROM `tabBOM Item`
+           WHERE parent IN %(parents)s AND bom_no IS NOT NULL AND bom_no != ''""",
+        {"parents": tuple(parents)},
+    )
+
+
+def _rebuild_for(ancestor):
+    frappe.db.delete(CLOSURE_DOCTYPE, {"ancestor": ancestor})
+    descendants = _walk_descendants(ancestor, _query_children)
+    if descendants:
+        frappe.db.bulk_insert(CLOSURE_DOCTYPE, CLOSURE_FIELDS, _closure_rows(ancestor, descendants))
+
+
+def refresh_bom_closure(bom_name):
+    """Recompute the closure rows of *bom_name* and of every BOM above it."""
+    ancestors = frappe.db.sql_list(
+        f"""SELECT DISTINCT ancestor FROM `tab{CLOSURE_DOCTYPE}`
+            WHERE descendant=%s AND ancestor != %s""",
+        (bom_name, bom_name),
+    )
+    for ancestor in [bom_name] + ancestors:
+        _rebuild_for(ancestor)
+
+
+def rebuild_bom_closure():
+    """Regenerate the whole closure table from `tabBOM Item`.
+
+    Loads the edge list once and walks it in memory, so the cost is one
+    read plus bulk inserts regardless of tree depth.
+    """
+    frappe.db.set_single_value("Confidential Settings", "bom_closure_ready", 0)
+    _clear_settings_cache()
+
+    adjacency = {}
+    for parent, child in frappe.db.sql(
+        """SELECT DISTINCT parent, bom_no FROM `tabBOM Item`
+           WHERE bom_no IS NOT NULL AND bom_no != ''"""
+    ):
+        adjacency.setdefault(parent, []).append(child)
+
+    def children_of(parents):
+        return [(p, c) for p in parents for c in adjacency.get(p, ())]
+
+    frappe.db.delete(CLOSURE_DOCTYPE)
+    for ancestor in adjacency:
+        frappe.db.bulk_insert(
+            CLOSURE_DOCTYPE, CLOSURE_FIELDS,
+            _closure_rows(ancestor, _walk_descendants(ancestor, children_of)),
+        )
+
+    frappe.db.set_single_value("Confidential Settings", "bom_closure_ready", 1)
+    _clear_settings_cache()
+    debug_log("BOM closure rebuilt for %s BOMs", len(adjacency))
+
+
+def _clear_settings_cache():
+    from confidential_app.confidential_app.doctype.confidential_settings.confidential_settings import (
+        CONFIDENTIAL_SETTINGS_CACHE_KEY,
+    )
+    frappe.cache().delete_key(CONFIDENTIAL_SETTINGS_CACHE_KEY)
+
+
+# ---------------------------------------------------------------------------
+# BOM doc_events (registered in hooks.py)
+# ---------------------------------------------------------------------------
+
+def on_bom_update(doc, method=None):
+    """BOM on_update hook – keep the closure in step with the saved items."""
+    if _get_cascade_mode() != CASCADE_MODE_CLOSURE:
+        return
+    refresh_bom_closure(doc.name)
+
+
+def on_bom_trash(doc, method=None):
+    """BOM on_trash hook – drop closure rows that mention the deleted BOM."""
+    if _get_cascade_mode() != CASCADE_MODE_CLOSURE:
+        return
+    frappe.db.delete(CLOSURE_DOCTYPE, {"ancestor": doc.name})
+    frappe.db.delete(CLOSURE_DOCTYPE, {"descendant": doc.name})
@@ -0,0 +1,84 @@
+"""
+Per-user denial rate tracking for burst detection.
+
+A burst is measured in distinct documents, not events: re-opening one
+denied document repeatedly is not a burst.  Each denial adds
+``<doctype>:<doc_name>`` to the HyperLogLog of the current
+DENIAL_BUCKET_SECONDS bucket (``confidential_denials:<user>:<bucket>``,
+expiring after the window).  The count over the sliding window is one
+PFCOUNT across the last window / bucket HyperLogLogs, which merges them,
+so a document denied in several buckets is still counted once.  PFADD
+and PFCOUNT share a pipeline, so every event costs one Redis round trip
+regardless of volume.
+
+When a user crosses Confidential Settings' denial_burst_threshold, one
+consolidated alert is sent per window and per-document denial
+notifications are suppressed while the burst lasts.
+"""
+
+from time import time
+
+import frappe
+
+from confidential_app.config.settings import DENIAL_BUCKET_SECONDS
+
+
+COUNTER_KEY = "confidential_denials"
+BURST_KEY = "confidential_denial_burst"
+
+
+def _get_burst_settings():
+    """Return (threshold, window_seconds); threshold 0 means disabled."""
+    try:
+        from confidential_app.confidential_app.doctype.confidential_settings.confidential_settings import (
+            get_settings,
+        )
+        settings = get_settings()
+        return (
+            int(settings.get("denial_burst_threshold") or 0),
+            int(settings.get("denial_burst_window_minutes") or 0) * 60,
+        )
+    except Exception:
+        return 0, 0
+
+
+def record_denial(user, doctype, doc_name, threshold=None, window=None):
+    """Record a denial of *doc_name* for *user*; return the number of distinct
+    documents denied to *user* in the window."""
+    if threshold is None or window is None:
+        threshold, window = _get_burst_settings()
+    if not threshold or not window:
+        return 0
+
+    cache = frappe.cache()
+    bucket = int(time()) // DENIAL_BUCKET_SECONDS
+    buckets = max(1, -(-window // DENIAL_BUCKET_SECONDS))
+    keys = [cache.make_key(f"{COUNTER_KEY}:{user}:{b}") for b in range(bucket - buckets + 1, bucket + 1)]
+
+    pipe = cache.pipeline()
+    pipe.pfadd(keys[-1], f"{doctype}:{doc_name}")
+    pipe.expire(keys[-1], window + DENIAL_BUCKET_SECONDS)
+    pipe.pfcount(*keys)
+    _added, _expire, count = pipe.execute()
+    return int(count or 0)
+
+
+def check_denial_burst(user, doctype, doc_name):
+    """Record a denial and raise the burst alert if needed.
+
+    Returns True while *user* is in a burst, in which case the caller should
+    skip the per-document notification.
+    """
+    threshold, window = _get_burst_settings()
+    if not threshold or not window:
+        return False
+
+    count = record_denial(user, doctype, doc_name, threshold, window)
+    if count < threshold:
+        return False
+
+    cache = frappe.cache()
+    if cache.set(cache.make_key(f"{BURST_KEY}:{user}"), doc_name, nx=True, ex=window):
+        from confidential_app.confidential_app.utils.notifications import notify_denial_burst
+        notify_denial_burst(user, count, window // 60, doctype, doc_name)
+    return True
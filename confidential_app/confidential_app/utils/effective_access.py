@@ -0,0 +1,100 @@
+"""
+Materialized effective-access table for list-view filtering.
+
+`tabConfidential Effective Access` holds one row per (document, principal)
+where the principal is an allowed Role or User of a BOM / Stock Entry /
+Work Order or of a `Confidential ACL Profile` (for documents sharing one).  get_permission_query_conditions filters confidential rows with
+a single semi-join on this table instead of two correlated EXISTS
+subqueries over the child-table mappings.
+
+The child tables (`Confidential Role Mapping`, `Confidential User Mapping`)
+remain the source of truth; rows here are rewritten by the doc_events
+registered in hooks.py and can be regenerated with
+``bench --site <site> rebuild-confidential-access``.
+"""
+
+import frappe
+from frappe.utils import now
+
+from confidential_app.config.settings import MANAGED_DOCTYPES
+from .permissions import ACL_PROFILE_DOCTYPE, debug_log
+
+
+EFFECTIVE_ACCESS_DOCTYPE = "Confidential Effective Access"
+EFFECTIVE_ACCESS_FIELDS = [
+    "name", "reference_doctype", "reference_name", "principal_type", "principal",
+    "valid_from", "valid_until", "owner", "modified_by", "creation", "modified",
+]
+SYNC_CHUNK = 500
+
+
+def _load_rows(doctype, names):
+    """Build effective-access rows for *names* from the child-table mappings."""
+    timestamp = now()
+    rows = []
+    for parent, role in frappe.db.sql(
+        """SELECT parent, role FROM `tabConfidential Role Mapping`
+           WHERE parenttype=%(doctype)s AND parentfield='allowed_roles'
+           AND parent IN %(names)s""",
+        {"doctype": doctype, "names": tuple(names)},
+    ):
+        rows.append((frappe.generate_hash(length=12), doctype, parent, "Role", role,
+                     None, None, "Administrator", "Administrator", timestamp, timestamp))
+
+    for parent, user, valid_from, valid_until in frappe.db.sql(
+        """SELECT parent, user, valid_from, valid_until FROM `tabConfidential User Mapping`
+           WHERE parenttype=%(doctype)s AND parentfield='allowed_users'
+           AND parent IN %(names)s""",
+        {"doctype": doctype, "names": tuple(names)},
+    ):
+        rows.append((frappe.generate_hash(length=12), doctype, parent, "User", user,
+                     valid_from, valid_until, "Administrator", "Administrator", timestamp, timestamp))
+    return rows
+
+
+def sync_effective_access(doctype, names):
+    """Rewrite the effective-access rows of *names* (delete + multi-row insert per chunk)."""
+    names = list(dict.fromkeys(n for n in names if n))
+    for start in range(0, len(names), SYNC_CHUNK):
+        chunk = names[start:start + SYNC_CHUNK]
+        frappe.db.delete(
+            EFFECTIVE_ACCESS_DOCTYPE,
+            {"reference_doctype": doctype, "reference_name": ("in", chunk)},
+        )
+        rows = _load_rows(doctype, chunk)
+        if rows:
+            frappe.db.bulk_insert(EFFECTIVE_ACCESS_DOCTYPE, EFFECTIVE_ACCESS_FIELDS, rows)
+
+
+def rebuild_effective_access(doctype=None):
+    """Regenerate the effective-access table from the existing child rows."""
+    for dt in ([doctype] if doctype else MANAGED_DOCTYPES + [ACL_PROFILE_DOCTYPE]):
+        frappe.db.delete(EFFECTIVE_ACCESS_DOCTYPE, {"reference_doctype": dt})
+
+        parents = frappe.db.sql_list(
+            """SELECT DISTINCT parent FROM `tabConfidential Role Mapping`
+               WHERE parenttype=%(doctype)s AND parentfield='allowed_roles'
+               UNION
+               SELECT DISTINCT parent FROM `tabConfidential User Mapping`
+               WHERE parenttype=%(doctype)s AND parentfield='allowed_users'""",
+            {"doctype": dt},
+        )
+        sync_effective_access(dt, parents)
+        debug_log("Effective access rebuilt for %s %s documents", len(parents), dt)
+
+
+# ---------------------------------------------------------------------------
+# doc_events (registered in hooks.py)
+# ---------------------------------------------------------------------------
+
+def on_doc_update(doc, method=None):
+    """on_update / on_update_after_submit hook – mirror the saved ACL."""
+    sync_effective_access(doc.doctype, [doc.name])
+
+
+def on_doc_trash(doc, method=None):
+    """on_trash hook – drop the rows of a deleted document."""
+    frappe.db.delete(
+        EFFECTIVE_ACCESS_DOCTYPE,
+        {"reference_doctype": doc.doctype, "reference_name": doc.name},
+    )
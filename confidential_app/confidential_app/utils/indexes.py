@@ -0,0 +1,126 @@
+"""
+Composite indexes for the Confidential ACL lookups.
+
+Every ACL query filters the mapping child tables on
+(parent, parenttype, parentfield) plus `role` or `user`; the user lookup
+also compares `valid_from` / `valid_until`.  Frappe only creates a
+single-column `parent` index for child tables, so the composite indexes are
+created here from after_migrate (together with the (bom_no, acl_hash)
+index propagation uses on Stock Entry and Work Order), and
+verify_permission_query_plan() runs
+EXPLAIN on the permission queries to confirm the optimizer still uses them.
+"""
+
+import frappe
+from frappe.utils import today
+
+
+CONFIDENTIAL_INDEXES = {
+    "Confidential Role Mapping": {
+        "confidential_acl_role_index": ["parent", "parenttype", "parentfield", "role"],
+    },
+    "Confidential User Mapping": {
+        "confidential_acl_user_index": [
+            "parent", "parenttype", "parentfield", "user", "valid_from", "valid_until",
+        ],
+    },
+    # Propagation looks up linked documents whose acl_hash differs from the BOM's
+    "Stock Entry": {
+        "confidential_bom_acl_hash_index": ["bom_no", "acl_hash"],
+    },
+    "Work Order": {
+        "confidential_bom_acl_hash_index": ["bom_no", "acl_hash"],
+    },
+}
+
+# Indexes created by on_doctype_update of the materialized tables; checked
+# here as well so one EXPLAIN pass covers every permission query.
+EFFECTIVE_ACCESS_INDEXES = {"principal_lookup_index", "reference_index"}
+
+
+def get_missing_indexes():
+    """Return [(doctype, index_name)] for composite indexes that don't exist."""
+    missing = []
+    for doctype, indexes in CONFIDENTIAL_INDEXES.items():
+        for index_name in indexes:
+            if not frappe.db.has_index(f"tab{doctype}", index_name):
+                missing.append((doctype, index_name))
+    return missing
+
+
+def ensure_confidential_indexes():
+    """Create any missing composite index on the mapping tables."""
+    for doctype, index_name in get_missing_indexes():
+        frappe.db.add_index(doctype, CONFIDENTIAL_INDEXES[doctype][index_name], index_name)
+
+
+def _explain(query, values):
+    return frappe.db.sql(f"EXPLAIN {query}", values, as_dict=True)
+
+
+def _check_plan(label, query, values, table, expected):
+    """Return a problem string if *table* is read without one of *expected*."""
+    for row in _explain(query, values):
+        if row.get("table") not in (table, f"tab{table}"):
+            continue
+        key = row.get("key")
+        if key not in expected:
+            return f"{label}: `tab{table}` read via {key or 'full scan'}, expected {', '.join(sorted(expected))}"
+    return None
+
+
+def verify_permission_query_plan(doctype="BOM"):
+    """EXPLAIN the ACL lookups and the list filter; return a list of problems.
+
+    An empty list means every permission query uses the expected index.
+    It never raises on a bad plan: on small tables the optimizer may
+    legitimately prefer a full scan, so after_migrate merely logs what it
+    returns.  tests/test_indexes.py seeds realistic row counts and asserts
+    an empty result, so a change in query shape fails CI.
+    """
+    from .permissions import get_permission_query_conditions
+
+    sample = frappe.db.sql(
+        """SELECT parent FROM `tabConfidential Role Mapping`
+           WHERE parenttype=%s LIMIT 1""",
+        doctype,
+    )
+    parent = sample[0][0] if sample else "__confidential_explain__"
+
+    checks = [
+        (
+            "role lookup",
+            """SELECT role FROM `tabConfidential Role Mapping`
+               WHERE parent=%(parent)s AND parenttype=%(doctype)s
+               AND parentfield='allowed_roles' AND role IN %(roles)s""",
+            {"parent": parent, "doctype": doctype, "roles": ("Confidential Manager",)},
+            "Confidential Role Mapping",
+            set(CONFIDENTIAL_INDEXES["Confidential Role Mapping"]),
+        ),
+        (
+            "user lookup",
+            """SELECT user FROM `tabConfidential User Mapping`
+               WHERE parent=%(parent)s AND parenttype=%(doctype)s
+               AND parentfield='allowed_users' AND user=%(user)s
+               AND (valid_from IS NULL OR valid_from <= %(today)s)
+               AND (valid_until IS NULL OR valid_until >= %(today)s)""",
+            {"parent": parent, "doctype": doctype, "user": "Guest", "today": today()},
+            "Confidential User Mapping",
+            set(CONFIDENTIAL_INDEXES["Confidential User Mapping"]),
+        ),
+        (
+            "list filter",
+            f"""SELECT `tab{doctype}`.name FROM `tab{doctype}`
+                WHERE {get_permission_query_conditions(doctype, "Guest") or "1=1"}""",
+            None,
+            "Confidential Effective Access",
+            EFFECTIVE_ACCESS_INDEXES,
+        ),
+    ]
+
+    problems = []
+    for label, query, values, table, expected in checks:
+        problem = _check_plan(label, query, values, table, expected)
+        if problem:
+            problems.append(problem)
+    return problems
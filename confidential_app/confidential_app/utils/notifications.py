@@ -1,5 +1,8 @@
+import json
+
 import frappe
 from frappe import _
+from frappe.utils import now_datetime
 
 
 def notify_confidentiality_change(doc, action="marked"):
@@ -20,11 +23,8 @@ def notify_confidentiality_change(doc, action="marked"):
 			doctype, doc_name, frappe.session.user
 		)
 
-	recipients = _get_confidential_managers()
-
-	for user in recipients:
-		if user != frappe.session.user:
-			_create_notification_log(user, subject, message, doctype, doc_name)
+	recipients = [u for u in _get_confidential_managers() if u != frappe.session.user]
+	_deliver(recipients, subject, message, doctype, doc_name, after_commit=True)
 
 
 def notify_access_denied(user, doctype, doc_name):
@@ -38,8 +38,25 @@ def notify_access_denied(user, doctype, doc_name):
 		user, doctype, doc_name
 	)
 
-	for manager in managers:
-		_create_notification_log(manager, subject, message, doctype, doc_name)
+	_deliver(managers, subject, message, doctype, doc_name)
+
+
+def notify_denial_burst(user, count, window_minutes, doctype=None, doc_name=None):
+	"""Send Confidential Managers one alert for a user denied many documents.
+
+	*count* is the number of distinct documents denied within the window.
+	"""
+	managers = _get_confidential_managers()
+	subject = _("Repeated access denials: {0} was denied {1} documents in {2} minutes").format(
+		user, count, window_minutes
+	)
+	message = _("User {0} was denied access to {1} confidential documents within {2} minutes. "
+		"The latest was {3} {4}. Further denials in this window are not notified individually; "
+		"see Confidential Access Log for the full list.").format(
+		user, count, window_minutes, doctype, doc_name
+	)
+
+	_deliver(managers, subject, message, "User", user)
 
 
 def notify_access_request_submitted(request_doc, method=None):
@@ -57,11 +74,10 @@ def notify_access_request_submitted(request_doc, method=None):
 		request_doc.reason,
 	)
 
-	for manager in managers:
-		_create_notification_log(
-			manager, subject, message,
-			"Confidential Access Request", request_doc.name,
-		)
+	_deliver(
+		managers, subject, message,
+		"Confidential Access Request", request_doc.name, after_commit=True,
+	)
 
 
 def notify_access_request_response(request_doc):
@@ -93,9 +109,9 @@ def notify_access_request_response(request_doc):
 			note,
 		)
 
-	_create_notification_log(
-		request_doc.user, subject, message,
-		"Confidential Access Request", request_doc.name,
+	_deliver(
+		[request_doc.user], subject, message,
+		"Confidential Access Request", request_doc.name, after_commit=True,
 	)
 
 
@@ -118,38 +134,211 @@ def notify_roles_changed(doc, old_roles, new_roles):
 		doc.doctype, doc.name, frappe.session.user, ". ".join(parts)
 	)
 
-	recipients = _get_confidential_managers()
-	for user in recipients:
-		if user != frappe.session.user:
-			_create_notification_log(user, subject, message, doc.doctype, doc.name)
+	recipients = [u for u in _get_confidential_managers() if u != frappe.session.user]
+	_deliver(recipients, subject, message, doc.doctype, doc.name, after_commit=True)
+
+
+MANAGER_ROLES = ("Confidential Manager", "System Manager")
+MANAGERS_CACHE_KEY = "confidential_notification_managers"
 
 
 def _get_confidential_managers():
-	"""Get all users with the Confidential Manager or System Manager role."""
-	users = set()
-	for role in ("Confidential Manager", "System Manager"):
-		role_users = frappe.get_all(
-			"Has Role",
-			filters={"role": role, "parenttype": "User"},
-			pluck="parent",
+	"""Get all enabled users with the Confidential Manager or System Manager role.
+
+	Cached site-wide; clear_manager_cache() drops the list when a User or
+	Has Role record changes.
+	"""
+	managers = frappe.cache().get_value(MANAGERS_CACHE_KEY)
+	if managers is not None:
+		return managers
+
+	managers = frappe.db.sql_list(
+		"""SELECT DISTINCT hr.parent
+		FROM `tabHas Role` hr
+		INNER JOIN `tabUser` u ON u.name = hr.parent
+		WHERE hr.parenttype = 'User' AND hr.role IN %(roles)s AND u.enabled = 1""",
+		{"roles": MANAGER_ROLES},
+	)
+	frappe.cache().set_value(MANAGERS_CACHE_KEY, managers)
+	return managers
+
+
+def clear_manager_cache(doc=None, method=None):
+	"""User / Has Role doc_events hook – forget the cached manager list."""
+	frappe.cache().delete_value(MANAGERS_CACHE_KEY)
+
+
+# ---------------------------------------------------------------------------
+# Delivery
+#
+# Notification Logs are written by a background job, never inside the
+# request that raised the event.  Recipients with a "Digest" Confidential
+# Notification Preference get their events appended to a Redis list instead;
+# send_notification_digests() turns each list into one summary per hour and
+# writes all summaries with a single bulk insert.
+# ---------------------------------------------------------------------------
+
+DELIVERY_MODES_CACHE_KEY = "confidential_notification_digest_users"
+DIGEST_QUEUE_KEY = "confidential_notification_digest"
+DIGEST_USERS_KEY = "confidential_notification_digest_pending"
+DIGEST_MAX_LINES = 50
+NOTIFICATION_LOG_FIELDS = [
+	"name", "for_user", "from_user", "subject", "type", "email_content",
+	"document_type", "document_name", "read", "owner", "modified_by", "creation", "modified",
+]
+
+
+def _get_digest_users():
+	"""Set of users who chose Digest delivery (cached site-wide)."""
+	users = frappe.cache().get_value(DELIVERY_MODES_CACHE_KEY)
+	if users is None:
+		users = frappe.get_all(
+			"Confidential Notification Preference",
+			filters={"delivery_mode": "Digest"},
+			pluck="user",
 		)
-		users.update(role_users)
+		frappe.cache().set_value(DELIVERY_MODES_CACHE_KEY, users)
+	return set(users)
+
+
+def clear_delivery_mode_cache():
+	frappe.cache().delete_value(DELIVERY_MODES_CACHE_KEY)
+
+
+def _digest_key(user):
+	return frappe.cache().make_key(f"{DIGEST_QUEUE_KEY}:{user}")
+
 
-	enabled_users = frappe.get_all(
-		"User",
-		filters={"name": ("in", list(users)), "enabled": 1},
-		pluck="name",
+def _queue_digest(users, event):
+	pipe = frappe.cache().pipeline()
+	for user in users:
+		pipe.rpush(_digest_key(user), event)
+		pipe.sadd(frappe.cache().make_key(DIGEST_USERS_KEY), user)
+	pipe.execute()
+
+
+def _deliver(recipients, subject, message, doctype=None, doc_name=None, after_commit=False):
+	"""Queue one notification for *recipients* (digest users get it in their next summary).
+
+	*after_commit* holds the job until the transaction commits; use it for
+	events caused by a save, so a rolled-back change notifies nobody.
+	Permission denials happen in read-only requests that never commit and
+	are queued at once.
+	"""
+	if not recipients:
+		return
+
+	digest_users = _get_digest_users()
+	immediate = [u for u in recipients if u not in digest_users]
+	digest = [u for u in recipients if u in digest_users]
+	from_user = frappe.session.user
+
+	if digest:
+		event = json.dumps({
+			"subject": subject,
+			"document_type": doctype,
+			"document_name": doc_name,
+			"from_user": from_user,
+			"timestamp": str(now_datetime()),
+		})
+		if after_commit:
+			frappe.db.after_commit.add(lambda: _queue_digest(digest, event))
+		else:
+			_queue_digest(digest, event)
+
+	if immediate:
+		frappe.enqueue(
+			"confidential_app.confidential_app.utils.notifications.deliver_notifications",
+			queue="short",
+			enqueue_after_commit=after_commit,
+			recipients=immediate,
+			subject=subject,
+			message=message,
+			doctype=doctype,
+			doc_name=doc_name,
+			from_user=from_user,
+		)
+
+
+def deliver_notifications(recipients, subject, message, doctype=None, doc_name=None, from_user=None):
+	"""Background job – one Notification Log per recipient (with the usual alerts and emails)."""
+	for user in recipients:
+		_create_notification_log(user, subject, message, doctype, doc_name, from_user)
+
+
+def _read_digest(user):
+	"""Return (number of queued entries, events) for *user* without removing them.
+
+	The entries are trimmed by _trim_digests() once the summary is
+	committed; events queued meanwhile are appended behind them and kept.
+	"""
+	# RedisWrapper list / set methods prefix the key themselves; pipelines
+	# (raw redis) take the made key.
+	raw = frappe.cache().lrange(f"{DIGEST_QUEUE_KEY}:{user}", 0, -1) or []
+	return len(raw), [json.loads(event) for event in raw]
+
+
+def _trim_digests(counts):
+	"""Drop the first *count* entries of each user's digest queue ({user: count})."""
+	pipe = frappe.cache().pipeline()
+	for user, count in counts.items():
+		pipe.ltrim(_digest_key(user), count, -1)
+	pipe.execute()
+
+
+def _digest_row(user, events, timestamp):
+	subject = _("{0} confidential notifications since your last digest").format(len(events))
+	lines = [
+		f"{event['timestamp']}: {event['subject']}" for event in events[:DIGEST_MAX_LINES]
+	]
+	if len(events) > DIGEST_MAX_LINES:
+		lines.append(_("... and {0} more").format(len(events) - DIGEST_MAX_LINES))
+	return (
+		frappe.generate_hash(length=10), user, "Administrator", subject, "Alert",
+		"<br>".join(frappe.utils.escape_html(line) for line in lines),
+		None, None, 0, "Administrator", "Administrator", timestamp, timestamp,
 	)
-	return enabled_users
 
 
-def _create_notification_log(user, subject, message, doctype=None, doc_name=None):
+def send_notification_digests():
+	"""Scheduler job (hourly) – one summary Notification Log per digest user."""
+	users = [frappe.safe_decode(u) for u in frappe.cache().smembers(DIGEST_USERS_KEY)]
+	if not users:
+		return 0
+
+	# Users are taken off the pending set first: an event queued while the
+	# digest is built adds its user back.  If building or committing the
+	# summaries fails, the queues are untouched and the users are re-added.
+	frappe.cache().srem(DIGEST_USERS_KEY, *users)
+	try:
+		timestamp = now_datetime()
+		rows = []
+		counts = {}
+		for user in users:
+			counts[user], events = _read_digest(user)
+			if events:
+				rows.append(_digest_row(user, events, timestamp))
+
+		if rows:
+			frappe.db.bulk_insert("Notification Log", NOTIFICATION_LOG_FIELDS, rows)
+		frappe.db.commit()
+	except Exception:
+		frappe.cache().sadd(DIGEST_USERS_KEY, *users)
+		raise
+
+	_trim_digests(counts)
+	for row in rows:
+		frappe.publish_realtime("notification", user=row[1])
+	return len(rows)
+
+
+def _create_notification_log(user, subject, message, doctype=None, doc_name=None, from_user=None):
 	"""Create a notification log entry."""
 	try:
 		notification = frappe.get_doc({
 			"doctype": "Notification Log",
 			"for_user": user,
-			"from_user": frappe.session.user,
+			"from_user": from_user or frappe.session.user,
 			"subject": subject,
 			"type": "Alert",
 			"email_content": message,
@@ -6,6 +6,9 @@ helpers, and audit logging used by hooks.py to restrict access to
 confidential documents.
 """
 
+import hashlib
+from collections import OrderedDict
+
 import frappe
 from frappe import _
 from frappe.utils import getdate, today
@@ -13,22 +16,36 @@ from time import time
 
 from confidential_app.config.settings import (
     ADMIN_ROLES,
+    CASCADE_MODE_CLOSURE,
+    CASCADE_MODE_CTE,
+    CASCADE_MODE_PYTHON,
     MANAGED_DOCTYPES,
+    MAX_BULK_PERMISSION_CHECK,
     PERMISSION_CACHE_TIMEOUT,
+    QUERY_CONDITION_CACHE_SIZE,
+    SUB_BOM_MAX_DEPTH,
 )
+from .trace import span, traced
 
 
 # ---------------------------------------------------------------------------
 # Debug logging
 # ---------------------------------------------------------------------------
 
-def debug_log(message):
-    """Write debug log if debug mode is enabled in Confidential Settings."""
+def debug_log(message, *args):
+    """Write debug log if debug mode is enabled in Confidential Settings.
+
+    With *args*, the message is %-formatted only when debug mode is on, so
+    hot paths can call ``debug_log("ALLOW: %s ...", user)`` for free.
+    """
     try:
         from confidential_app.confidential_app.doctype.confidential_settings.confidential_settings import (
             add_debug_log,
+            get_settings,
         )
-        add_debug_log(message)
+        if not get_settings().get("debug_mode"):
+            return
+        add_debug_log(message % args if args else message)
     except Exception:
         pass
 
@@ -90,64 +107,496 @@ def _is_protection_enabled_uncached():
         return True
 
 
+def _get_cascade_mode():
+    """Return the configured sub-BOM cascade mode (see Confidential Settings)."""
+    try:
+        from confidential_app.confidential_app.doctype.confidential_settings.confidential_settings import (
+            get_settings,
+        )
+        return get_settings().get("sub_bom_cascade_mode") or CASCADE_MODE_PYTHON
+    except Exception:
+        return CASCADE_MODE_PYTHON
+
+
+def _is_bom_closure_ready():
+    """True once a full closure rebuild has completed."""
+    try:
+        from confidential_app.confidential_app.doctype.confidential_settings.confidential_settings import (
+            get_settings,
+        )
+        return bool(get_settings().get("bom_closure_ready"))
+    except Exception:
+        return False
+
+
 # ---------------------------------------------------------------------------
-# Helpers
+# Role interning
+#
+# Role names are mapped to small per-site bit positions for the lifetime of
+# the worker process.  A document's allowed roles and a user's roles are
+# both held as int bitmasks, so "has any allowed role" is a single AND
+# instead of a frozenset intersection of role-name strings.
 # ---------------------------------------------------------------------------
 
-def _is_admin(user):
-    """Check if user has an admin role that bypasses confidential checks."""
-    user_roles = set(frappe.get_roles(user))
-    return bool(user_roles & set(ADMIN_ROLES))
+_role_bits = {}
 
 
-def _get_allowed_roles(doctype, doc_name):
-    """Get allowed roles for a confidential document from the child table."""
-    return frappe.db.sql(
-        """SELECT role FROM `tabConfidential Role Mapping`
-           WHERE parent=%s AND parenttype=%s AND parentfield='allowed_roles'""",
-        (doc_name, doctype),
-        as_dict=True,
-    )
+def _role_bit_table():
+    """Return the {role: bit} table of the current site."""
+    site = getattr(frappe.local, "site", None)
+    table = _role_bits.get(site)
+    if table is None:
+        table = _role_bits[site] = {}
+    return table
 
 
-def _get_allowed_users(doctype, doc_name):
-    """Get allowed users for a confidential document with time-bound filtering."""
-    users = frappe.db.sql(
-        """SELECT user, valid_from, valid_until
-           FROM `tabConfidential User Mapping`
-           WHERE parent=%s AND parenttype=%s AND parentfield='allowed_users'""",
-        (doc_name, doctype),
-        as_dict=True,
+def role_mask(roles):
+    """Return the bitmask of *roles*, assigning bits to unseen role names."""
+    table = _role_bit_table()
+    mask = 0
+    for role in roles:
+        bit = table.get(role)
+        if bit is None:
+            bit = table[role] = len(table)
+        mask |= 1 << bit
+    return mask
+
+
+# ---------------------------------------------------------------------------
+# Request-scoped security context
+#
+# One form load runs _is_admin, _user_has_doc_access and the query
+# condition builder many times.  The user's role set, admin flag, SQL-escaped
+# role list and today's date are computed once per (request, user) and kept
+# on frappe.local.
+# ---------------------------------------------------------------------------
+
+_ADMIN_ROLE_SET = frozenset(ADMIN_ROLES)
+
+
+class SecurityContext:
+    """Frozen view of one user's roles for the current request."""
+
+    __slots__ = (
+        "user", "roles", "role_mask", "is_admin", "role_hash", "escaped_user", "today",
+        "today_str", "_escaped_roles",
     )
-    current_date = getdate(today())
-    active_users = []
-    for u in users:
-        if u.valid_from and getdate(u.valid_from) > current_date:
-            continue
-        if u.valid_until and getdate(u.valid_until) < current_date:
-            continue
-        active_users.append(u.user)
-    return active_users
+
+    def __init__(self, user):
+        self.user = user
+        self.roles = frozenset(frappe.get_roles(user))
+        self.role_mask = role_mask(self.roles)
+        self.is_admin = bool(self.roles & _ADMIN_ROLE_SET)
+        self.role_hash = hashlib.sha1("\n".join(sorted(self.roles)).encode()).hexdigest()[:16]
+        self.escaped_user = frappe.db.escape(user)
+        self.today = getdate(today())
+        self.today_str = str(self.today)
+        self._escaped_roles = None
+
+    @property
+    def escaped_roles(self):
+        """Comma-separated, SQL-escaped role list (built on first use)."""
+        if self._escaped_roles is None:
+            self._escaped_roles = ", ".join(frappe.db.escape(r) for r in sorted(self.roles)) or "''"
+        return self._escaped_roles
+
+
+def get_security_context(user=None):
+    """Return the SecurityContext for *user* (default: session user)."""
+    user = user or frappe.session.user
+    contexts = getattr(frappe.local, "confidential_security_context", None)
+    if contexts is None:
+        contexts = frappe.local.confidential_security_context = {}
+    ctx = contexts.get(user)
+    if ctx is None:
+        ctx = contexts[user] = SecurityContext(user)
+    return ctx
+
+
+def reset_security_context(user=None):
+    """Drop cached contexts (one user, or all) for the current request."""
+    contexts = getattr(frappe.local, "confidential_security_context", None)
+    if not contexts:
+        return
+    if user is None:
+        contexts.clear()
+    else:
+        contexts.pop(user, None)
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _is_admin(user):
+    """Check if user has an admin role that bypasses confidential checks."""
+    return get_security_context(user).is_admin
 
 
 def _user_has_doc_access(doctype, doc_name, user):
     """Core access check: role-level or user-level access to a confidential doc."""
-    user_roles = set(frappe.get_roles(user))
-    allowed_roles = _get_allowed_roles(doctype, doc_name)
-    allowed_role_names = {r.role for r in allowed_roles}
+    acl = _get_doc_acl(doctype, doc_name)
+    ctx = get_security_context(user)
 
-    if allowed_role_names & user_roles:
+    if acl.role_mask & ctx.role_mask:
         return True
 
-    allowed_users = _get_allowed_users(doctype, doc_name)
-    if user in allowed_users:
+    if user in _active_users(acl.users, ctx.today):
         return True
 
     return False
 
 
-def _check_sub_bom_confidentiality(bom_name, user, checked=None):
-    """Recursively check if any sub-BOM is confidential and user lacks access."""
+# ---------------------------------------------------------------------------
+# Request-scoped ACL loader
+#
+# Lists, reports and print-all check hundreds of documents in one request.
+# Instead of one is_confidential lookup plus two child-table SELECTs per
+# document, the ACL of every candidate name is fetched with one query per
+# table and kept on frappe.local, which Frappe releases at the end of the
+# request.  Validation hooks drop entries for documents they save.
+# ---------------------------------------------------------------------------
+
+ACL_PREFETCH_CHUNK = 500
+# Larger result sets (get_all(limit=0) from reports, patches, other apps)
+# are not registered as candidates: prefetching them would cost more than
+# the checks it saves.
+ACL_CANDIDATE_LIMIT = 500
+ACL_PROFILE_DOCTYPE = "Confidential ACL Profile"
+
+
+def _get_acl_store():
+    """Return the per-request ACL store ({doctype: {name: acl}})."""
+    store = getattr(frappe.local, "confidential_acl", None)
+    if store is None:
+        store = frappe.local.confidential_acl = {}
+    return store
+
+
+def _get_acl_intern():
+    """Return the per-request table of shared ACL entries."""
+    intern = getattr(frappe.local, "confidential_acl_intern", None)
+    if intern is None:
+        intern = frappe.local.confidential_acl_intern = {}
+    return intern
+
+
+def _shared_acl(is_confidential, roles=(), users=()):
+    """Return the ACL entry for this exact (flag, roles, users) combination.
+
+    Stock Entries and Work Orders share (or carry copies of) their BOM's
+    ACL, so a batch of thousands of documents usually has only a handful
+    of distinct ACLs.  Identical ACLs resolve to one shared, read-only entry holding
+    the role bitmask, instead of one dict and frozenset per document.
+    """
+    roles = frozenset(roles)
+    users = tuple(sorted(users, key=lambda u: u[0]))
+    key = (is_confidential, roles, users)
+    intern = _get_acl_intern()
+    acl = intern.get(key)
+    if acl is None:
+        acl = intern[key] = frappe._dict(
+            is_confidential=is_confidential,
+            roles=roles,
+            role_mask=role_mask(roles),
+            users=users,
+        )
+    return acl
+
+
+def prefetch_acl(doctype, names):
+    """Load is_confidential, allowed roles and allowed users for *names*.
+
+    Runs one query per table (per chunk of ACL_PREFETCH_CHUNK names) and
+    stores the result in the request-scoped store.  Names already loaded
+    in this request are skipped.  Call this before checking a batch of
+    documents so the individual checks are answered from memory.
+
+    Documents that reference a Confidential ACL Profile take their roles
+    and users from the profile; a batch of derived documents usually
+    shares a handful of profiles, so those rows are read once per profile.
+    """
+    store = _get_acl_store().setdefault(doctype, {})
+    pending = list(dict.fromkeys(n for n in names if n and n not in store))
+
+    for start in range(0, len(pending), ACL_PREFETCH_CHUNK):
+        chunk = tuple(pending[start:start + ACL_PREFETCH_CHUNK])
+        flags = dict.fromkeys(chunk)
+        profiles = {}
+
+        for name, is_confidential, acl_profile in frappe.db.sql(
+            f"""SELECT name, is_confidential, acl_profile FROM `tab{doctype}`
+               WHERE name IN %(names)s""",
+            {"names": chunk},
+        ):
+            flags[name] = is_confidential or 0
+            if is_confidential and acl_profile:
+                profiles[name] = acl_profile
+
+        # Rows are read by ACL holder: the profile, or the document itself.
+        holders = {}
+        for name, flag in flags.items():
+            if flag:
+                holder = (ACL_PROFILE_DOCTYPE, profiles[name]) if name in profiles else (doctype, name)
+                holders[name] = holder
+        roles, users = _load_acl_rows(set(holders.values()))
+
+        for name, flag in flags.items():
+            holder = holders.get(name)
+            store[name] = _shared_acl(flag, roles.get(holder, ()), users.get(holder, ()))
+
+
+def _load_acl_rows(holders):
+    """Return ({holder: roles}, {holder: users}) for (parenttype, parent) *holders*."""
+    roles = {}
+    users = {}
+    by_type = {}
+    for parenttype, parent in holders:
+        by_type.setdefault(parenttype, []).append(parent)
+
+    for parenttype, parents in by_type.items():
+        values = {"doctype": parenttype, "names": tuple(parents)}
+        for parent, role in frappe.db.sql(
+            """SELECT parent, role FROM `tabConfidential Role Mapping`
+               WHERE parenttype=%(doctype)s AND parentfield='allowed_roles'
+               AND parent IN %(names)s""",
+            values,
+        ):
+            roles.setdefault((parenttype, parent), set()).add(role)
+
+        for parent, user, valid_from, valid_until in frappe.db.sql(
+            """SELECT parent, user, valid_from, valid_until
+               FROM `tabConfidential User Mapping`
+               WHERE parenttype=%(doctype)s AND parentfield='allowed_users'
+               AND parent IN %(names)s""",
+            values,
+        ):
+            users.setdefault((parenttype, parent), []).append((user, valid_from, valid_until))
+    return roles, users
+
+
+def _get_doc_acl(doctype, doc_name):
+    """Return the cached ACL for one document, loading it on first use.
+
+    A miss loads every candidate registered for the doctype along with
+    *doc_name*, so checking a whole list costs the same few queries as
+    checking one document.
+    """
+    store = _get_acl_store().setdefault(doctype, {})
+    if doc_name not in store:
+        prefetch_acl(doctype, [doc_name, *_pop_acl_candidates(doctype)])
+    return store[doc_name]
+
+
+def register_acl_candidates(doctype, names):
+    """Remember *names* as documents this request is about to check.
+
+    Fed from DatabaseQuery results (lists, reports, get_all) and from the
+    name lists of bulk endpoints (print-all, bulk actions); the next ACL
+    miss for *doctype* prefetches all of them at once.  Name lists longer
+    than ACL_CANDIDATE_LIMIT, or that would grow the doctype's candidates
+    past it, are dropped.
+    """
+    if doctype not in MANAGED_DOCTYPES or not names or len(names) > ACL_CANDIDATE_LIMIT:
+        return
+    candidates = getattr(frappe.local, "confidential_acl_candidates", None)
+    if candidates is None:
+        candidates = frappe.local.confidential_acl_candidates = {}
+    pending = candidates.setdefault(doctype, set())
+    names = {n for n in names if n and isinstance(n, str)}
+    if len(pending) + len(names) <= ACL_CANDIDATE_LIMIT:
+        pending.update(names)
+
+
+def _pop_acl_candidates(doctype):
+    """Take (and forget) the candidate names registered for *doctype*."""
+    candidates = getattr(frappe.local, "confidential_acl_candidates", None)
+    if not candidates:
+        return ()
+    return candidates.pop(doctype, ())
+
+
+BULK_NAME_PARAMS = ("name", "names", "docnames", "items")
+
+
+def register_request_candidates():
+    """before_request hook: register the document names a bulk request carries.
+
+    Print-all (download_multi_pdf) sends a JSON list in ``name``; bulk
+    submit / cancel / delete send ``docnames`` or ``items``.
+    """
+    form_dict = frappe.local.form_dict or {}
+    doctype = form_dict.get("doctype")
+    if not isinstance(doctype, str) or doctype not in MANAGED_DOCTYPES:
+        return
+    for param in BULK_NAME_PARAMS:
+        names = form_dict.get(param)
+        if isinstance(names, str) and names.startswith("["):
+            try:
+                names = frappe.parse_json(names)
+            except ValueError:
+                continue
+        if isinstance(names, (list, tuple)):
+            register_acl_candidates(doctype, names)
+
+
+def invalidate_acl(doctype, doc_name=None):
+    """Drop request-scoped ACL entries for one document (or a whole doctype)."""
+    store = _get_acl_store()
+    if doc_name is None:
+        store.pop(doctype, None)
+    else:
+        store.get(doctype, {}).pop(doc_name, None)
+
+
+def _active_users(users, current_date):
+    """Filter (user, valid_from, valid_until) tuples down to users active on *current_date*."""
+    active = set()
+    for user, valid_from, valid_until in users:
+        if valid_from and getdate(valid_from) > current_date:
+            continue
+        if valid_until and getdate(valid_until) < current_date:
+            continue
+        active.add(user)
+    return active
+
+
+def _no_access_condition(name_column):
+    """SQL predicate that is true when the user has neither an allowed role
+    nor an active allowed-user row on the document named by *name_column*.
+
+    Takes its values from ``_no_access_values()`` as named parameters.
+    """
+    return (
+        f"NOT EXISTS (SELECT 1 FROM `tabConfidential Role Mapping` crm "
+        f"WHERE crm.parent = {name_column} AND crm.parenttype = %(acl_doctype)s "
+        f"AND crm.parentfield = 'allowed_roles' AND crm.role IN %(acl_roles)s) "
+        f"AND NOT EXISTS (SELECT 1 FROM `tabConfidential User Mapping` cum "
+        f"WHERE cum.parent = {name_column} AND cum.parenttype = %(acl_doctype)s "
+        f"AND cum.parentfield = 'allowed_users' AND cum.user = %(acl_user)s "
+        f"AND (cum.valid_from IS NULL OR cum.valid_from <= %(acl_today)s) "
+        f"AND (cum.valid_until IS NULL OR cum.valid_until >= %(acl_today)s))"
+    )
+
+
+def _no_access_values(doctype, user):
+    ctx = get_security_context(user)
+    return {
+        "acl_doctype": doctype,
+        "acl_roles": tuple(ctx.roles) or ("",),
+        "acl_user": user,
+        "acl_today": ctx.today_str,
+    }
+
+
+def _find_inaccessible_sub_bom_closure(bom_name, user):
+    """Return the nearest confidential descendant of *bom_name* that *user*
+    cannot access, using the maintained closure table (one indexed query)."""
+    result = frappe.db.sql(
+        f"""SELECT c.descendant FROM `tabConfidential BOM Closure` c
+            INNER JOIN `tabBOM` b ON b.name = c.descendant AND b.is_confidential = 1
+            WHERE c.ancestor = %(bom)s AND {_no_access_condition("c.descendant")}
+            ORDER BY c.depth LIMIT 1""",
+        {"bom": bom_name, **_no_access_values("BOM", user)},
+    )
+    return result[0][0] if result else None
+
+
+def _is_bom_closure_stale(bom_name):
+    """True if `tabBOM Item` has a sub-BOM edge below *bom_name* the closure lacks.
+
+    The closure is refreshed from BOM on_update, but the BOM Update Tool
+    (replace_bom / update_cost) rewrites `tabBOM Item`.bom_no with plain SQL.
+    A descendant missing from the closure could hide a confidential
+    sub-BOM, so such a closure is not trusted.
+    """
+    return bool(frappe.db.sql(
+        """SELECT bi.bom_no FROM `tabBOM Item` bi
+           WHERE (bi.parent = %(bom)s OR bi.parent IN (
+               SELECT descendant FROM `tabConfidential BOM Closure` WHERE ancestor = %(bom)s
+           ))
+           AND bi.bom_no IS NOT NULL AND bi.bom_no != ''
+           AND bi.bom_no NOT IN (
+               SELECT descendant FROM `tabConfidential BOM Closure` WHERE ancestor = %(bom)s
+           )
+           LIMIT 1""",
+        {"bom": bom_name},
+    ))
+
+
+def _enqueue_closure_refresh(bom_name):
+    frappe.enqueue(
+        "confidential_app.confidential_app.utils.bom_closure.refresh_bom_closure",
+        queue="short",
+        job_id=f"confidential_closure::{bom_name}",
+        deduplicate=True,
+        bom_name=bom_name,
+    )
+
+
+def _find_inaccessible_sub_bom_cte(bom_name, user):
+    """Return the nearest confidential descendant of *bom_name* that *user*
+    cannot access, evaluated in one ``WITH RECURSIVE`` statement
+    (MariaDB 10.2+ / MySQL 8)."""
+    result = frappe.db.sql(
+        f"""WITH RECURSIVE sub_boms (bom_no, depth) AS (
+                SELECT bi.bom_no, 1 FROM `tabBOM Item` bi
+                WHERE bi.parent = %(bom)s AND bi.bom_no IS NOT NULL AND bi.bom_no != ''
+                UNION
+                SELECT bi.bom_no, s.depth + 1 FROM sub_boms s
+                INNER JOIN `tabBOM Item` bi ON bi.parent = s.bom_no
+                WHERE bi.bom_no IS NOT NULL AND bi.bom_no != '' AND s.depth < %(max_depth)s
+            )
+            SELECT s.bom_no FROM sub_boms s
+            INNER JOIN `tabBOM` b ON b.name = s.bom_no AND b.is_confidential = 1
+            WHERE {_no_access_condition("s.bom_no")}
+            ORDER BY s.depth LIMIT 1""",
+        {"bom": bom_name, "max_depth": SUB_BOM_MAX_DEPTH, **_no_access_values("BOM", user)},
+    )
+    return result[0][0] if result else None
+
+
+def _check_sub_bom_confidentiality(bom_name, user):
+    """Return False if any sub-BOM of *bom_name* is confidential and *user*
+    lacks access to it.
+
+    Uses the closure table or a recursive CTE depending on the configured
+    cascade mode.  The recursive Python walker is the reference
+    implementation and the fallback when the closure is not yet built, is
+    stale for *bom_name* (a refresh is then queued) or a set-based query
+    fails.
+    """
+    mode = _get_cascade_mode()
+    finder = None
+    if mode == CASCADE_MODE_CLOSURE and _is_bom_closure_ready():
+        if _is_bom_closure_stale(bom_name):
+            debug_log("BOM closure stale for %s, using walker", bom_name)
+            _enqueue_closure_refresh(bom_name)
+        else:
+            finder = _find_inaccessible_sub_bom_closure
+    elif mode == CASCADE_MODE_CTE:
+        finder = _find_inaccessible_sub_bom_cte
+
+    if finder:
+        try:
+            denied = finder(bom_name, user)
+        except Exception as e:
+            debug_log("%s cascade failed for %s, using walker: %s", mode, bom_name, e)
+        else:
+            if denied:
+                debug_log("Sub-BOM cascade DENY: user=%s lacks access to sub-BOM %s", user, denied)
+                return False
+            return True
+
+    return _walk_sub_boms(bom_name, user)
+
+
+def _walk_sub_boms(bom_name, user, checked=None, depth=1):
+    """Recursively check if any sub-BOM is confidential and user lacks access.
+
+    Like the recursive CTE, looks at most SUB_BOM_MAX_DEPTH levels down;
+    *depth* is the level of *bom_name*'s direct sub-BOMs.
+    """
     if checked is None:
         checked = set()
 
@@ -162,15 +611,22 @@ def _check_sub_bom_confidentiality(bom_name, user, checked=None):
         as_dict=True,
     )
 
+    prefetch_acl("BOM", [row.bom_no for row in sub_boms])
+
     for row in sub_boms:
         sub_bom = row.bom_no
-        is_confidential = frappe.db.get_value("BOM", sub_bom, "is_confidential")
-        if is_confidential:
+        if _get_doc_acl("BOM", sub_bom).is_confidential:
             if not _user_has_doc_access("BOM", sub_bom, user):
-                debug_log(f"Sub-BOM cascade DENY: user={user} lacks access to sub-BOM {sub_bom}")
+                debug_log("Sub-BOM cascade DENY: user=%s lacks access to sub-BOM %s", user, sub_bom)
                 return False
 
-        if not _check_sub_bom_confidentiality(sub_bom, user, checked):
+        if depth >= SUB_BOM_MAX_DEPTH:
+            frappe.log_error(
+                f"Sub-BOM cascade stopped at depth {SUB_BOM_MAX_DEPTH} below {sub_bom}",
+                "Confidential Sub-BOM Depth Limit",
+            )
+            continue
+        if not _walk_sub_boms(sub_bom, user, checked, depth + 1):
             return False
 
     return True
@@ -188,12 +644,25 @@ def _log_access(user, access_type, doctype, doc_name, details=None):
 
 
 def _notify_denied(user, doctype, doc_name):
-    """Fire a notification for access denial (rate-limited per session)."""
+    """Fire a notification for access denial (rate-limited per document).
+
+    Denied documents are also counted per user; during a burst (see
+    utils/denials.py) managers get one consolidated alert and this
+    per-document one is skipped.  Repeats of an already notified document
+    are dropped before they reach the burst counter.
+    """
     cache_key = f"conf_deny_notified:{user}:{doctype}:{doc_name}"
     if frappe.cache().get_value(cache_key):
         return
     frappe.cache().set_value(cache_key, 1, expires_in_sec=300)
 
+    try:
+        from confidential_app.confidential_app.utils.denials import check_denial_burst
+        if check_denial_burst(user, doctype, doc_name):
+            return
+    except Exception:
+        pass
+
     try:
         from confidential_app.confidential_app.utils.notifications import notify_access_denied
         notify_access_denied(user, doctype, doc_name)
@@ -205,6 +674,7 @@ def _notify_denied(user, doctype, doc_name):
 # Core permission check
 # ---------------------------------------------------------------------------
 
+@traced("has_doctype_permission")
 def has_doctype_permission(doctype, doc, user=None, ptype=None, **_kwargs):
     """Base permission check function for confidential doctypes.
 
@@ -219,11 +689,9 @@ def has_doctype_permission(doctype, doc, user=None, ptype=None, **_kwargs):
         False – explicitly deny (confidential & user lacks access)
         None  – abstain; Frappe falls through to standard DocPerm rules
     """
-    if not _is_app_installed_on_site():
-        return None
-
-    if not _is_enabled():
-        return None
+    with span("app_enabled"):
+        if not _is_app_installed_on_site() or not _is_enabled():
+            return None
 
     if ptype == "create":
         if isinstance(doc, str) or (hasattr(doc, "is_new") and doc.is_new()):
@@ -244,35 +712,46 @@ def has_doctype_permission(doctype, doc, user=None, ptype=None, **_kwargs):
         return None
 
     # Always read is_confidential from DB (the saved state) so that an
-    # in-flight save that toggles the flag doesn't block itself.
+    # in-flight save that toggles the flag doesn't block itself.  The
+    # request-scoped ACL store holds saved state only.
     try:
-        is_confidential = frappe.db.get_value(doctype, doc_name, "is_confidential")
+        with span("is_confidential"):
+            is_confidential = _get_doc_acl(doctype, doc_name).is_confidential
         if not is_confidential:
             return None
     except Exception as e:
-        debug_log(f"ERROR checking confidentiality for {doctype} {doc_name}: {e}")
+        debug_log("ERROR checking confidentiality for %s %s: %s", doctype, doc_name, e)
         frappe.log_error(
             f"Error checking confidentiality of {doctype} {doc_name}: {e}",
             f"Confidential {doctype} Permission Error",
         )
         return False
 
-    if _user_has_doc_access(doctype, doc_name, user):
-        debug_log(f"ALLOW: {user} has access to {doctype} {doc_name}")
-        _log_access(user, "View", doctype, doc_name)
+    with span("role_user_access"):
+        has_access = _user_has_doc_access(doctype, doc_name, user)
+    if has_access:
+        debug_log("ALLOW: %s has access to %s %s", user, doctype, doc_name)
+        with span("audit_log"):
+            _log_access(user, "View", doctype, doc_name)
         return True
 
     # Sub-assembly cascade: for BOM, also check sub-BOMs
     if doctype == "BOM":
-        if not _check_sub_bom_confidentiality(doc_name, user):
-            debug_log(f"DENY: {user} lacks sub-BOM access for {doc_name}")
-            _log_access(user, "Denied", doctype, doc_name, "Denied via sub-assembly cascade")
-            _notify_denied(user, doctype, doc_name)
+        with span("sub_bom_cascade"):
+            cascade_ok = _check_sub_bom_confidentiality(doc_name, user)
+        if not cascade_ok:
+            debug_log("DENY: %s lacks sub-BOM access for %s", user, doc_name)
+            with span("audit_log"):
+                _log_access(user, "Denied", doctype, doc_name, "Denied via sub-assembly cascade")
+            with span("notify_denied"):
+                _notify_denied(user, doctype, doc_name)
             return False
 
-    debug_log(f"DENY: {user} lacks access to {doctype} {doc_name}")
-    _log_access(user, "Denied", doctype, doc_name)
-    _notify_denied(user, doctype, doc_name)
+    debug_log("DENY: %s lacks access to %s %s", user, doctype, doc_name)
+    with span("audit_log"):
+        _log_access(user, "Denied", doctype, doc_name)
+    with span("notify_denied"):
+        _notify_denied(user, doctype, doc_name)
     return False
 
 
@@ -296,6 +775,7 @@ def has_work_order_permission(doc, user=None, ptype=None, **kwargs):
     return has_doctype_permission("Work Order", doc, user, ptype)
 
 
+@traced("has_stock_entry_submit_permission")
 def has_stock_entry_submit_permission(doc, user=None, ptype=None, **kwargs):
     """Enhanced has_permission hook for Stock Entry.
 
@@ -339,7 +819,7 @@ def has_stock_entry_submit_permission(doc, user=None, ptype=None, **kwargs):
         return has_stock_entry_permission(doc, user, ptype)
 
     except Exception as e:
-        debug_log(f"ERROR in Stock Entry permission: {e}")
+        debug_log("ERROR in Stock Entry permission: %s", e)
         frappe.log_error(
             f"Error checking permission for Stock Entry: {e}",
             "Stock Entry Permission Error",
@@ -351,6 +831,27 @@ def has_stock_entry_submit_permission(doc, user=None, ptype=None, **kwargs):
 # List view filtering (permission_query_conditions hooks)
 # ---------------------------------------------------------------------------
 
+# Compiled fragments, per worker process, keyed by
+# (site, doctype, role-set hash, user, date).
+_query_condition_cache = OrderedDict()
+_query_condition_stats = {"hits": 0, "misses": 0}
+
+
+@frappe.whitelist()
+def get_query_condition_cache_stats():
+    """Return hit / miss counts of this worker's query-condition cache."""
+    frappe.only_for("System Manager")
+    hits = _query_condition_stats["hits"]
+    misses = _query_condition_stats["misses"]
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "size": len(_query_condition_cache),
+        "hit_rate": round(hits / total, 4) if total else 0,
+    }
+
+
 def get_permission_query_conditions(doctype, user):
     """Return a SQL WHERE clause to hide confidential docs the user cannot see."""
     # Multi-tenant safety: the hook system should already filter by
@@ -362,33 +863,66 @@ def get_permission_query_conditions(doctype, user):
     if not _is_enabled():
         return ""
 
-    if "System Manager" in frappe.get_roles(user):
+    ctx = get_security_context(user)
+    if "System Manager" in ctx.roles:
         return ""
 
-    user_roles = frappe.get_roles(user)
+    # The fragment only depends on these inputs.  The key rotates when the
+    # user's roles change (role_hash) or at midnight (valid_from/valid_until).
+    key = (frappe.local.site, doctype, ctx.role_hash, user, ctx.today_str)
+    condition = _query_condition_cache.get(key)
+    if condition is not None:
+        _query_condition_stats["hits"] += 1
+        try:
+            _query_condition_cache.move_to_end(key)
+        except KeyError:
+            pass
+        return condition
+
+    _query_condition_stats["misses"] += 1
+    condition = _build_permission_query_condition(doctype, ctx)
+    _query_condition_cache[key] = condition
+    while len(_query_condition_cache) > QUERY_CONDITION_CACHE_SIZE:
+        try:
+            _query_condition_cache.popitem(last=False)
+        except KeyError:
+            break
+    return condition
 
-    escaped_roles = ", ".join(frappe.db.escape(r) for r in user_roles)
-    escaped_user = frappe.db.escape(user)
-    today_str = frappe.db.escape(today())
 
+def _effective_access_subquery(reference_doctype, ctx):
+    """SELECT of the reference names of *reference_doctype* that *ctx*'s user may see."""
+    escaped_roles = ctx.escaped_roles
+    escaped_user = ctx.escaped_user
+    escaped_doctype = frappe.db.escape(reference_doctype)
+    today_str = frappe.db.escape(ctx.today_str)
+    return (
+        f"SELECT `tabConfidential Effective Access`.`reference_name` "
+        f"FROM `tabConfidential Effective Access` "
+        f"WHERE `tabConfidential Effective Access`.`reference_doctype` = {escaped_doctype} "
+        f"AND ((`tabConfidential Effective Access`.`principal_type` = 'Role' "
+        f"AND `tabConfidential Effective Access`.`principal` IN ({escaped_roles})) "
+        f"OR (`tabConfidential Effective Access`.`principal_type` = 'User' "
+        f"AND `tabConfidential Effective Access`.`principal` = {escaped_user} "
+        f"AND (`tabConfidential Effective Access`.`valid_from` IS NULL OR `tabConfidential Effective Access`.`valid_from` <= {today_str}) "
+        f"AND (`tabConfidential Effective Access`.`valid_until` IS NULL OR `tabConfidential Effective Access`.`valid_until` >= {today_str})"
+        f"))"
+    )
+
+
+def _build_permission_query_condition(doctype, ctx):
+    """Compile the list-view WHERE fragment for *doctype* and one user."""
+    # Semi-joins against the materialized effective-access table (see
+    # utils/effective_access.py) instead of correlated EXISTS over the
+    # child-table mappings: by document for documents with their own ACL,
+    # by profile for documents sharing a Confidential ACL Profile.  An empty
+    # acl_profile means "no profile", as in prefetch_acl.
     condition = (
         f"(`tab{doctype}`.`is_confidential` = 0 "
         f"OR `tab{doctype}`.`is_confidential` IS NULL "
-        f"OR (`tab{doctype}`.`is_confidential` = 1 AND ("
-        f"EXISTS (SELECT 1 FROM `tabConfidential Role Mapping` "
-        f"WHERE `tabConfidential Role Mapping`.`parent` = `tab{doctype}`.`name` "
-        f"AND `tabConfidential Role Mapping`.`parenttype` = {frappe.db.escape(doctype)} "
-        f"AND `tabConfidential Role Mapping`.`parentfield` = 'allowed_roles' "
-        f"AND `tabConfidential Role Mapping`.`role` IN ({escaped_roles})) "
-        f"OR EXISTS (SELECT 1 FROM `tabConfidential User Mapping` "
-        f"WHERE `tabConfidential User Mapping`.`parent` = `tab{doctype}`.`name` "
-        f"AND `tabConfidential User Mapping`.`parenttype` = {frappe.db.escape(doctype)} "
-        f"AND `tabConfidential User Mapping`.`parentfield` = 'allowed_users' "
-        f"AND `tabConfidential User Mapping`.`user` = {escaped_user} "
-        f"AND (`tabConfidential User Mapping`.`valid_from` IS NULL OR `tabConfidential User Mapping`.`valid_from` <= {today_str}) "
-        f"AND (`tabConfidential User Mapping`.`valid_until` IS NULL OR `tabConfidential User Mapping`.`valid_until` >= {today_str})"
-        f")"
-        f")))"
+        f"OR (IFNULL(`tab{doctype}`.`acl_profile`, '') = '' "
+        f"AND `tab{doctype}`.`name` IN ({_effective_access_subquery(doctype, ctx)})) "
+        f"OR `tab{doctype}`.`acl_profile` IN ({_effective_access_subquery(ACL_PROFILE_DOCTYPE, ctx)}))"
     )
 
     return condition
@@ -408,33 +942,132 @@ def get_work_order_permission_query_conditions(user):
 
 # ---------------------------------------------------------------------------
 # Cached BOM permission check (used by bom_override & validations)
+#
+# Decisions are shared by every gunicorn / RQ worker through Redis.  Each
+# decision key embeds three generation counters – global, per document and
+# per user – so invalidation is a single INCR that makes older decisions
+# unreachable on all workers at once.  Orphaned keys expire after
+# PERMISSION_CACHE_TIMEOUT.
 # ---------------------------------------------------------------------------
 
-_permission_cache = {}
-_cache_timeout = PERMISSION_CACHE_TIMEOUT
+_CACHE_PREFIX = "confidential_perm"
+
+
+def _redis_key(*parts):
+    """Build a site-prefixed Redis key for the permission cache."""
+    return frappe.cache().make_key(":".join((_CACHE_PREFIX,) + parts))
+
+
+def _decision_keys(doctype, doc_names, user):
+    """Return {doc_name: decision key} for the current generations.
+
+    Reads the global, user and per-document generation counters with one
+    MGET.  Returns an empty dict if Redis is unavailable.
+    """
+    generation_keys = [_redis_key("gen"), _redis_key("gen", "user", user)]
+    generation_keys += [_redis_key("gen", doctype, name) for name in doc_names]
+    try:
+        generations = frappe.cache().mget(generation_keys)
+    except Exception:
+        return {}
+
+    prefix = f"{int(generations[0] or 0)}.{int(generations[1] or 0)}"
+    return {
+        name: _redis_key("decision", doctype, name, user, f"{prefix}.{int(gen or 0)}")
+        for name, gen in zip(doc_names, generations[2:])
+    }
+
+
+def _get_cached_decisions(keys):
+    """Return {doc_name: bool} for the decisions present in Redis."""
+    if not keys:
+        return {}
+    names = list(keys)
+    try:
+        values = frappe.cache().mget([keys[n] for n in names])
+    except Exception:
+        return {}
+    return {name: value == b"1" for name, value in zip(names, values) if value is not None}
+
+
+def _set_cached_decisions(keys, results):
+    if not keys:
+        return
+    try:
+        pipe = frappe.cache().pipeline()
+        for name, result in results.items():
+            if name in keys:
+                pipe.set(keys[name], 1 if result else 0, ex=PERMISSION_CACHE_TIMEOUT)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def _bump_generation(key):
+    try:
+        frappe.cache().incr(key)
+    except Exception:
+        pass
+
+
+def _bump_generations(keys):
+    """INCR every generation key in *keys* with one Redis round trip."""
+    try:
+        pipe = frappe.cache().pipeline()
+        for key in keys:
+            pipe.incr(key)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def _bump_generations_around_commit(keys):
+    """Bump *keys* now and again once the transaction commits.
+
+    The first bump keeps this transaction from reading its own stale
+    decisions; the second drops decisions other workers cached from the
+    still-committed old ACL between the first bump and the commit.
+    """
+    keys = list(keys)
+    _bump_generations(keys)
+    frappe.db.after_commit.add(lambda: _bump_generations(keys))
 
 
 def clear_permission_cache():
-    """Clear the in-process BOM permission cache."""
-    global _permission_cache
-    _permission_cache = {}
+    """Invalidate every cached permission decision on all workers."""
+    _bump_generation(_redis_key("gen"))
     debug_log("Permission cache cleared")
 
 
+def invalidate_doc_permissions(doctype, doc_name):
+    """Invalidate cached decisions for one document on all workers (again after commit)."""
+    _bump_generations_around_commit([_redis_key("gen", doctype, doc_name)])
+    invalidate_acl(doctype, doc_name)
+
+
+def invalidate_docs_permissions(doctype, doc_names):
+    """Invalidate cached decisions for many documents with one Redis round trip (again after commit)."""
+    _bump_generations_around_commit(_redis_key("gen", doctype, name) for name in doc_names)
+    for name in doc_names:
+        invalidate_acl(doctype, name)
+
+
+def invalidate_user_permissions(user):
+    """Invalidate cached decisions for one user on all workers."""
+    _bump_generation(_redis_key("gen", "user", user))
+
+
 def invalidate_bom_cache(bom_name):
-    """Remove all cache entries for a specific BOM (call on confidentiality change)."""
-    global _permission_cache
-    _permission_cache = {
-        k: v for k, v in _permission_cache.items()
-        if not k.startswith(f"bom_perm:{bom_name}:")
-    }
+    """Invalidate cached decisions for a specific BOM (call on confidentiality change)."""
+    invalidate_doc_permissions("BOM", bom_name)
 
 
 @frappe.whitelist()
 def check_bom_permission(bom):
     """Client-callable check if current user can access a BOM.
 
-    Uses per-process caching (TTL = PERMISSION_CACHE_TIMEOUT).
+    Decisions are cached in Redis (TTL = PERMISSION_CACHE_TIMEOUT) and
+    shared across workers.
     """
     if not _is_enabled():
         return True
@@ -446,24 +1079,70 @@ def check_bom_permission(bom):
     if _is_admin(user):
         return True
 
-    cache_key = f"bom_perm:{bom}:{user}"
+    cache_keys = _decision_keys("BOM", [bom], user)
+    cached = _get_cached_decisions(cache_keys)
+    if bom in cached:
+        return cached[bom]
 
-    if cache_key in _permission_cache:
-        cache_time, result = _permission_cache[cache_key]
-        if time() - cache_time < _cache_timeout:
-            return result
-
-    is_confidential = frappe.db.get_value("BOM", bom, "is_confidential")
+    is_confidential = _get_doc_acl("BOM", bom).is_confidential
 
     if not is_confidential:
         result = True
     else:
         result = _user_has_doc_access("BOM", bom, user)
 
-    _permission_cache[cache_key] = (time(), result)
+    _set_cached_decisions(cache_keys, {bom: result})
     return result
 
 
+@frappe.whitelist()
+def check_bom_permissions(boms):
+    """Client-callable bulk variant of check_bom_permission.
+
+    Args:
+        boms: list of BOM names (or its JSON encoding), at most
+            MAX_BULK_PERMISSION_CHECK entries.
+
+    Returns:
+        dict mapping each BOM name to True / False.
+
+    Cached decisions are read with one MGET; the misses are resolved with
+    one set-based query per ACL table and written back in one pipeline.
+    """
+    if isinstance(boms, str):
+        boms = frappe.parse_json(boms)
+    names = list(dict.fromkeys(b for b in (boms or []) if b))
+
+    if len(names) > MAX_BULK_PERMISSION_CHECK:
+        frappe.throw(
+            _("Cannot check more than {0} BOMs in one request.").format(MAX_BULK_PERMISSION_CHECK)
+        )
+
+    if not _is_enabled():
+        return dict.fromkeys(names, True)
+
+    user = frappe.session.user
+    if _is_admin(user):
+        return dict.fromkeys(names, True)
+
+    cache_keys = _decision_keys("BOM", names, user)
+    results = _get_cached_decisions(cache_keys)
+
+    misses = [name for name in names if name not in results]
+    if misses:
+        prefetch_acl("BOM", misses)
+        computed = {}
+        for name in misses:
+            if not _get_doc_acl("BOM", name).is_confidential:
+                computed[name] = True
+            else:
+                computed[name] = _user_has_doc_access("BOM", name, user)
+        _set_cached_decisions(cache_keys, computed)
+        results.update(computed)
+
+    return {name: results[name] for name in names}
+
+
 # ---------------------------------------------------------------------------
 # Print / Export restriction helpers
 # ---------------------------------------------------------------------------
@@ -0,0 +1,366 @@
+"""
+Set-based propagation of a BOM's ACL to its linked Stock Entries and Work Orders.
+
+Linked documents are rewritten PROPAGATION_CHUNK at a time:
+
+* one UPDATE sets ``is_confidential`` (and ``modified``) on the chunk,
+* the chunk's `Confidential Role Mapping` / `Confidential User Mapping`
+  rows are deleted and re-inserted with one multi-row INSERT each,
+* the effective-access rows of the chunk are rebuilt, cached permission
+  decisions are invalidated with one pipelined Redis call, and
+* one `Confidential Access Log` entry records the batch.
+
+No controller is loaded or saved, so ERPNext's validate / on_update hooks
+do not run for the linked documents.  Documents whose acl_hash already
+matches the BOM's, and documents sharing the BOM's Confidential ACL
+Profile, are skipped.
+
+BOM changes are propagated by a background job tracked in a
+`Confidential Propagation Job` document (see enqueue_propagation): the job
+commits after every chunk and records the last document it finished, so a
+restarted worker resumes from that checkpoint.  The scheduler re-enqueues
+jobs whose worker died and retries failed ones.
+"""
+
+import frappe
+from frappe.utils import add_to_date, cint, now, now_datetime
+
+from confidential_app.config.settings import (
+    PROPAGATION_CHUNK,
+    PROPAGATION_MAX_ATTEMPTS,
+    PROPAGATION_STALE_MINUTES,
+)
+from .acl_hash import compute_acl_hash
+from .effective_access import sync_effective_access
+from .permissions import _log_access, debug_log, invalidate_docs_permissions
+
+
+ROLE_MAPPING_FIELDS = [
+    "name", "parent", "parenttype", "parentfield", "idx", "docstatus", "role",
+    "owner", "modified_by", "creation", "modified",
+]
+USER_MAPPING_FIELDS = [
+    "name", "parent", "parenttype", "parentfield", "idx", "docstatus", "user",
+    "valid_from", "valid_until", "owner", "modified_by", "creation", "modified",
+]
+PROPAGATION_JOB_DOCTYPE = "Confidential Propagation Job"
+PROPAGATION_DOCTYPES = ("Stock Entry", "Work Order")
+ACTIVE_STATUSES = ("Queued", "Running")
+PROGRESS_EVENT = "confidential_propagation_progress"
+JOB_ID_PREFIX = "confidential_propagation::"
+JOB_LOCK_KEY = "confidential_propagation_job"
+
+
+def get_bom_acl(bom_doc):
+    """Return (is_confidential, roles, users, acl_hash) of a BOM, users as (user, valid_from, valid_until)."""
+    roles = list(dict.fromkeys(d.role for d in bom_doc.get("allowed_roles", [])))
+    users = [(d.user, d.valid_from, d.valid_until) for d in bom_doc.get("allowed_users", [])]
+    is_confidential = cint(bom_doc.is_confidential)
+    return is_confidential, roles, users, compute_acl_hash(is_confidential, roles, users)
+
+
+# Documents whose acl_hash already equals the BOM's are in sync and skipped;
+# (bom_no, acl_hash) is indexed (see indexes.py).  Documents sharing an ACL
+# profile follow the BOM without being rewritten (see acl_profile.py).
+_OUT_OF_SYNC = (
+    "bom_no=%(bom)s AND docstatus IN (0, 1) AND IFNULL(acl_profile, '') = '' "
+    "AND (acl_hash IS NULL OR acl_hash != %(acl_hash)s)"
+)
+
+
+def get_linked_documents(doctype, bom_name, acl_hash, after="", limit=None):
+    """[(name, docstatus)] of draft and submitted *doctype* documents using *bom_name*
+    whose ACL differs from *acl_hash*, by name."""
+    return frappe.db.sql(
+        f"""SELECT name, docstatus FROM `tab{doctype}`
+            WHERE {_OUT_OF_SYNC} AND name > %(after)s
+            ORDER BY name {"LIMIT %(limit)s" if limit else ""}""",
+        {"bom": bom_name, "acl_hash": acl_hash, "after": after or "", "limit": limit},
+    )
+
+
+def count_linked_documents(bom_name, acl_hash):
+    """Number of linked documents not yet carrying *acl_hash*."""
+    return sum(
+        frappe.db.sql(
+            f"SELECT COUNT(*) FROM `tab{doctype}` WHERE {_OUT_OF_SYNC}",
+            {"bom": bom_name, "acl_hash": acl_hash},
+        )[0][0]
+        for doctype in PROPAGATION_DOCTYPES
+    )
+
+
+def _mapping_rows(chunk, doctype, roles, users, timestamp, user):
+    role_rows, user_rows = [], []
+    for parent, docstatus in chunk:
+        for idx, role in enumerate(roles, 1):
+            role_rows.append((
+                frappe.generate_hash(length=10), parent, doctype, "allowed_roles", idx, docstatus, role,
+                user, user, timestamp, timestamp,
+            ))
+        for idx, (allowed_user, valid_from, valid_until) in enumerate(users, 1):
+            user_rows.append((
+                frappe.generate_hash(length=10), parent, doctype, "allowed_users", idx, docstatus,
+                allowed_user, valid_from, valid_until, user, user, timestamp, timestamp,
+            ))
+    return role_rows, user_rows
+
+
+def apply_acl_to_chunk(doctype, chunk, acl, bom_name):
+    """Rewrite is_confidential and the ACL child rows of *chunk* ([(name, docstatus)])."""
+    is_confidential, roles, users, acl_hash = acl
+    names = tuple(name for name, _docstatus in chunk)
+    timestamp = now()
+    user = frappe.session.user
+
+    frappe.db.sql(
+        f"""UPDATE `tab{doctype}`
+            SET is_confidential=%(is_confidential)s, acl_hash=%(acl_hash)s,
+                modified=%(modified)s, modified_by=%(user)s
+            WHERE name IN %(names)s""",
+        {
+            "is_confidential": is_confidential, "acl_hash": acl_hash,
+            "modified": timestamp, "user": user, "names": names,
+        },
+    )
+    for mapping, parentfield in (
+        ("Confidential Role Mapping", "allowed_roles"),
+        ("Confidential User Mapping", "allowed_users"),
+    ):
+        frappe.db.delete(
+            mapping, {"parenttype": doctype, "parentfield": parentfield, "parent": ("in", names)},
+        )
+
+    role_rows, user_rows = _mapping_rows(chunk, doctype, roles, users, timestamp, user)
+    if role_rows:
+        frappe.db.bulk_insert("Confidential Role Mapping", ROLE_MAPPING_FIELDS, role_rows)
+    if user_rows:
+        frappe.db.bulk_insert("Confidential User Mapping", USER_MAPPING_FIELDS, user_rows)
+
+    sync_effective_access(doctype, names)
+    invalidate_docs_permissions(doctype, names)
+    _log_access(
+        user, "Modified", "BOM", bom_name,
+        f"ACL propagated to {len(names)} {doctype} ({names[0]} .. {names[-1]})",
+    )
+
+
+def propagate_bom_acl(bom_doc, doctype, chunk_size=PROPAGATION_CHUNK):
+    """Copy the ACL of *bom_doc* to every out-of-sync linked *doctype* document; return the count updated."""
+    acl = get_bom_acl(bom_doc)
+    linked = get_linked_documents(doctype, bom_doc.name, acl[3])
+    for start in range(0, len(linked), chunk_size):
+        apply_acl_to_chunk(doctype, linked[start:start + chunk_size], acl, bom_doc.name)
+
+    if linked:
+        debug_log("Propagated BOM %s ACL to %s %s documents", bom_doc.name, len(linked), doctype)
+    return len(linked)
+
+
+# ---------------------------------------------------------------------------
+# Background jobs
+# ---------------------------------------------------------------------------
+
+def _enqueue_job(job_name, after_commit=False):
+    frappe.enqueue(
+        "confidential_app.confidential_app.utils.propagation.run_propagation_job",
+        queue="long",
+        job_id=f"{JOB_ID_PREFIX}{job_name}",
+        deduplicate=True,
+        enqueue_after_commit=after_commit,
+        propagation_job=job_name,
+    )
+
+
+def enqueue_propagation(bom_name):
+    """Queue propagation of *bom_name*'s ACL to its linked documents; return the job name.
+
+    A BOM has at most one active job.  If one is queued or running, its
+    acl_version is bumped so it starts over with the new ACL.  The row is
+    read FOR UPDATE: a job completing meanwhile either commits first (and a
+    new job is created here) or waits for the bump and sees it (see
+    _complete).
+    """
+    active = frappe.db.get_value(
+        PROPAGATION_JOB_DOCTYPE,
+        {"bom": bom_name, "status": ("in", ACTIVE_STATUSES)},
+        ["name", "acl_version"],
+        as_dict=True,
+        for_update=True,
+    )
+    if active:
+        frappe.db.set_value(PROPAGATION_JOB_DOCTYPE, active.name, "acl_version", active.acl_version + 1)
+        job_name = active.name
+    else:
+        job_name = frappe.get_doc({
+            "doctype": PROPAGATION_JOB_DOCTYPE,
+            "bom": bom_name,
+            "status": "Queued",
+        }).insert(ignore_permissions=True).name
+
+    # The job must see the committed BOM, so it is only queued after commit.
+    _enqueue_job(job_name, after_commit=True)
+    return job_name
+
+
+def _publish_progress(job):
+    frappe.publish_realtime(
+        PROGRESS_EVENT,
+        {
+            "bom": job.bom,
+            "job": job.name,
+            "status": job.status,
+            "processed": job.processed_count,
+            "total": job.total_count,
+        },
+        doctype="BOM",
+        docname=job.bom,
+    )
+
+
+def _start(job, acl):
+    """Mark *job* Running; a job without a checkpoint also gets its total counted."""
+    values = {"status": "Running", "attempts": job.attempts + 1, "error": None}
+    if not job.current_doctype:
+        values.update(
+            processed_count=0,
+            total_count=count_linked_documents(job.bom, acl[3]),
+            started_on=now_datetime(),
+        )
+    job.db_set(values)
+    frappe.db.commit()
+    _publish_progress(job)
+
+
+def _restart(job, acl):
+    """Drop the checkpoint of *job* after its BOM's ACL changed again."""
+    job.db_set({
+        "current_doctype": None,
+        "last_processed": None,
+        "processed_count": 0,
+        "total_count": count_linked_documents(job.bom, acl[3]),
+    })
+    frappe.db.commit()
+
+
+def _process(job, acl, chunk_size, heartbeat):
+    """Propagate *acl* from the job's checkpoint on; return False if the ACL changed meanwhile."""
+    version = job.acl_version
+    start = PROPAGATION_DOCTYPES.index(job.current_doctype) if job.current_doctype else 0
+
+    for doctype in PROPAGATION_DOCTYPES[start:]:
+        after = job.last_processed if job.current_doctype == doctype else ""
+        while True:
+            if frappe.db.get_value(PROPAGATION_JOB_DOCTYPE, job.name, "acl_version") != version:
+                return False
+            chunk = get_linked_documents(doctype, job.bom, acl[3], after, limit=chunk_size)
+            if not chunk:
+                break
+            apply_acl_to_chunk(doctype, chunk, acl, job.bom)
+            after = chunk[-1][0]
+            job.db_set({
+                "current_doctype": doctype,
+                "last_processed": after,
+                "processed_count": job.processed_count + len(chunk),
+            })
+            frappe.db.commit()
+            heartbeat()
+            _publish_progress(job)
+    return True
+
+
+def _complete(job):
+    """Mark *job* Completed unless its acl_version moved on; return True if it did.
+
+    The re-enqueue of a running job is dropped by deduplicate, so a bump
+    after the last version check in _process must send the job round again
+    instead of being lost.
+    """
+    timestamp = now()
+    frappe.db.sql(
+        f"""UPDATE `tab{PROPAGATION_JOB_DOCTYPE}`
+            SET status='Completed', completed_on=%(now)s, modified=%(now)s
+            WHERE name=%(name)s AND acl_version=%(version)s""",
+        {"now": timestamp, "name": job.name, "version": job.acl_version},
+    )
+    completed = frappe.db.get_value(PROPAGATION_JOB_DOCTYPE, job.name, "status") == "Completed"
+    frappe.db.commit()
+    return completed
+
+
+def run_propagation_job(propagation_job, chunk_size=PROPAGATION_CHUNK):
+    """Background job – run one Confidential Propagation Job from its checkpoint.
+
+    A Redis lock (refreshed after every chunk) keeps a re-enqueued copy of
+    the job from running next to a live one.
+    """
+    cache = frappe.cache()
+    lock = cache.lock(
+        cache.make_key(f"{JOB_LOCK_KEY}:{propagation_job}"), timeout=PROPAGATION_STALE_MINUTES * 60,
+    )
+    if not lock.acquire(blocking=False):
+        return
+
+    try:
+        job = frappe.get_doc(PROPAGATION_JOB_DOCTYPE, propagation_job)
+        if job.status not in ACTIVE_STATUSES:
+            return
+        acl = get_bom_acl(frappe.get_doc("BOM", job.bom))
+        _start(job, acl)
+        while not (_process(job, acl, chunk_size, lock.reacquire) and _complete(job)):
+            job.reload()
+            acl = get_bom_acl(frappe.get_doc("BOM", job.bom))
+            _restart(job, acl)
+
+        job.reload()
+        _publish_progress(job)
+        debug_log("Propagation job %s for BOM %s completed", job.name, job.bom)
+    except Exception:
+        frappe.db.rollback()
+        frappe.db.set_value(PROPAGATION_JOB_DOCTYPE, propagation_job, {
+            "status": "Failed",
+            "error": frappe.get_traceback(),
+        })
+        frappe.db.commit()
+        job = frappe.get_doc(PROPAGATION_JOB_DOCTYPE, propagation_job)
+        _publish_progress(job)
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            pass
+
+
+def resume_propagation_jobs():
+    """Scheduler job – re-enqueue jobs whose worker died and retry failed ones."""
+    stale = add_to_date(now_datetime(), minutes=-PROPAGATION_STALE_MINUTES)
+    names = frappe.get_all(
+        PROPAGATION_JOB_DOCTYPE,
+        filters={"status": ("in", ACTIVE_STATUSES), "modified": ("<", stale)},
+        pluck="name",
+    )
+    for name in frappe.get_all(
+        PROPAGATION_JOB_DOCTYPE,
+        filters={"status": "Failed", "attempts": ("<", PROPAGATION_MAX_ATTEMPTS)},
+        pluck="name",
+    ):
+        frappe.db.set_value(PROPAGATION_JOB_DOCTYPE, name, "status", "Queued")
+        names.append(name)
+    frappe.db.commit()
+
+    for name in names:
+        _enqueue_job(name)
+    return len(names)
+
+
+@frappe.whitelist()
+def get_propagation_status(bom):
+    """Latest propagation job of *bom* for the BOM form, or None."""
+    frappe.has_permission("BOM", "read", bom, throw=True)
+    return frappe.db.get_value(
+        PROPAGATION_JOB_DOCTYPE,
+        {"bom": bom},
+        ["name", "status", "processed_count", "total_count", "modified"],
+        order_by="modified desc",
+        as_dict=True,
+    )
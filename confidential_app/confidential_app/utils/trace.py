@@ -0,0 +1,154 @@
+"""
+Per-request timing spans for the permission path.
+
+Enable with ``bench --site <site> set-config confidential_permission_trace 1``.
+While enabled, every span records wall time and the number of
+``frappe.db.sql`` calls made inside it into a request-local trace,
+aggregated by span name.  At the end of the request the summary is sent in
+the ``X-Confidential-Trace`` response header and kept in Redis for
+get_last_permission_trace().
+
+When disabled, span() returns a shared no-op context manager and
+traced() adds one attribute lookup per call.
+"""
+
+import functools
+from contextlib import nullcontext
+from time import perf_counter
+
+import frappe
+
+
+TRACE_CONFIG_KEY = "confidential_permission_trace"
+TRACE_HEADER = "X-Confidential-Trace"
+LAST_TRACE_KEY = "confidential_last_trace"
+LAST_TRACE_TTL = 600
+
+_NOOP_SPAN = nullcontext()
+_UNSET = object()
+
+
+class PermissionTrace:
+    """Aggregated spans of one request: {name: [calls, seconds, sql]}."""
+
+    __slots__ = ("spans", "sql_count")
+
+    def __init__(self):
+        self.spans = {}
+        self.sql_count = 0
+
+    def add(self, name, seconds, sql):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [1, seconds, sql]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += sql
+
+    def as_list(self):
+        return [
+            {"span": name, "calls": calls, "ms": round(seconds * 1000, 3), "sql": sql}
+            for name, (calls, seconds, sql) in sorted(self.spans.items(), key=lambda i: -i[1][1])
+        ]
+
+    def header_value(self):
+        return ", ".join(
+            f"{row['span']};n={row['calls']};ms={row['ms']};sql={row['sql']}" for row in self.as_list()
+        )
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start", "sql_start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.sql_start = self.trace.sql_count
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, perf_counter() - self.start, self.trace.sql_count - self.sql_start)
+        return False
+
+
+def _install_sql_counter(trace):
+    """Count frappe.db.sql calls on this request's connection."""
+    db = getattr(frappe.local, "db", None)
+    if db is None or getattr(db, "_confidential_sql_counter", False):
+        return
+    original_sql = db.sql
+
+    @functools.wraps(original_sql)
+    def counting_sql(*args, **kwargs):
+        trace.sql_count += 1
+        return original_sql(*args, **kwargs)
+
+    db.sql = counting_sql
+    db._confidential_sql_counter = True
+
+
+def get_trace():
+    """Return this request's PermissionTrace, or None when tracing is off."""
+    trace = getattr(frappe.local, "confidential_trace", _UNSET)
+    if trace is _UNSET:
+        trace = None
+        if frappe.conf.get(TRACE_CONFIG_KEY):
+            trace = PermissionTrace()
+            _install_sql_counter(trace)
+        frappe.local.confidential_trace = trace
+    return trace
+
+
+def span(name):
+    """Context manager timing one stage (no-op when tracing is off)."""
+    trace = get_trace()
+    if trace is None:
+        return _NOOP_SPAN
+    return _Span(trace, name)
+
+
+def traced(name):
+    """Decorator timing every call of a function as span *name*."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = get_trace()
+            if trace is None:
+                return fn(*args, **kwargs)
+            with _Span(trace, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def after_request(response=None, request=None):
+    """after_request hook – publish the trace in a header and in Redis."""
+    trace = getattr(frappe.local, "confidential_trace", None)
+    if not trace or not trace.spans:
+        return
+    if response is not None:
+        response.headers[TRACE_HEADER] = trace.header_value()
+
+    try:
+        frappe.cache().set_value(
+            f"{LAST_TRACE_KEY}:{frappe.session.user}",
+            {"path": getattr(request, "path", None), "spans": trace.as_list()},
+            expires_in_sec=LAST_TRACE_TTL,
+        )
+    except Exception:
+        pass
+
+
+@frappe.whitelist()
+def get_last_permission_trace(user=None):
+    """Return the last recorded permission trace of *user* (System Manager only)."""
+    frappe.only_for("System Manager")
+    return frappe.cache().get_value(f"{LAST_TRACE_KEY}:{user or frappe.session.user}")
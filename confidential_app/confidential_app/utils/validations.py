@@ -13,19 +13,25 @@ from .permissions import (
     _is_protection_enabled,
     _user_has_doc_access,
     check_bom_permission,
-    clear_permission_cache,
+    get_security_context,
     invalidate_bom_cache,
+    invalidate_doc_permissions,
+    invalidate_user_permissions,
+    reset_security_context,
     debug_log,
 )
+from .acl_hash import get_acl_hash, get_stored_acl_hash
+from .acl_profile import detach_overridden_profile, link_bom_profile
+from .propagation import count_linked_documents, enqueue_propagation
 from confidential_app.config.settings import ADMIN_ROLES
 
 
-CONFIDENTIALITY_ADMIN_ROLES = set(ADMIN_ROLES) | {"Confidential Manager"}
+CONFIDENTIALITY_ADMIN_ROLES = frozenset(ADMIN_ROLES) | {"Confidential Manager"}
 
 
 def _user_can_change_confidentiality():
     """Return True if the current user may toggle is_confidential / allowed_roles / allowed_users."""
-    return bool(CONFIDENTIALITY_ADMIN_ROLES & set(frappe.get_roles()))
+    return bool(CONFIDENTIALITY_ADMIN_ROLES & get_security_context().roles)
 
 
 def _assert_linked_bom_access(bom_no, parent_doctype):
@@ -82,27 +88,41 @@ def update_stock_entries_on_bom_change(doc, method=None):
     if not old_doc:
         return
 
-    confidentiality_changed = old_doc.is_confidential != doc.is_confidential
-
-    old_roles = {d.role for d in old_doc.get("allowed_roles", [])}
-    new_roles = {d.role for d in doc.get("allowed_roles", [])}
-    roles_changed = old_roles != new_roles
+    if get_stored_acl_hash(old_doc) == get_stored_acl_hash(doc):
+        return
 
-    old_users = {(d.user, str(d.valid_from or ""), str(d.valid_until or "")) for d in old_doc.get("allowed_users", [])}
-    new_users = {(d.user, str(d.valid_from or ""), str(d.valid_until or "")) for d in doc.get("allowed_users", [])}
-    users_changed = old_users != new_users
+    # Invalidate stale permission decisions for this BOM on every worker
+    invalidate_bom_cache(doc.name)
 
-    if not (confidentiality_changed or roles_changed or users_changed):
+    # Documents sharing the BOM's ACL profile already follow it (see
+    # acl_profile.on_bom_update); only documents with their own ACL rows
+    # are rewritten, by a resumable background job.
+    if not count_linked_documents(doc.name, get_stored_acl_hash(doc)):
         return
+    job = enqueue_propagation(doc.name)
+    debug_log("Queued propagation job %s for BOM %s due to confidentiality changes", job, doc.name)
 
-    # Invalidate stale permission cache for this BOM
-    invalidate_bom_cache(doc.name)
-    clear_permission_cache()
 
-    debug_log(f"Updating linked documents for BOM {doc.name} due to confidentiality changes")
+def set_acl_hash(doc, method=None):
+    """validate / before_update_after_submit hook – keep acl_hash in step with the ACL.
+
+    A Stock Entry / Work Order given its own roles or users is detached from
+    its shared ACL profile first.
+    """
+    detach_overridden_profile(doc)
+    doc.acl_hash = get_acl_hash(doc)
+
+
+def clear_acl_cache(doc, method=None):
+    """on_update / on_update_after_submit hook – drop cached ACL entries and
+    permission decisions for *doc* on every worker."""
+    invalidate_doc_permissions(doc.doctype, doc.name)
+
 
-    _update_linked_documents(doc, "Stock Entry")
-    _update_linked_documents(doc, "Work Order")
+def clear_user_permission_cache(doc, method=None):
+    """User on_update hook – role changes invalidate the user's cached decisions."""
+    invalidate_user_permissions(doc.name)
+    reset_security_context(doc.name)
 
 
 # ---------------------------------------------------------------------------
@@ -120,15 +140,19 @@ def validate_stock_entry_permissions_on_save(doc, method=None):
         return
 
     if _user_can_change_confidentiality():
-        if doc.is_confidential and not doc.get("allowed_roles") and not doc.get("allowed_users"):
+        if doc.is_confidential and not _has_acl(doc):
             frappe.throw(_("You must specify at least one allowed role or user for a confidential Stock Entry."))
         return
 
+    # Access to the BOM does not extend to repointing the shared profile
+    if not doc.is_new():
+        _block_acl_profile_change(doc, "Stock Entry")
+
     if doc.bom_no and doc.purpose in ("Manufacture", "Material Transfer for Manufacture"):
         if _user_has_doc_access("BOM", doc.bom_no, frappe.session.user):
             return
 
-    if doc.is_confidential and not doc.get("allowed_roles") and not doc.get("allowed_users"):
+    if doc.is_confidential and not _has_acl(doc):
         frappe.throw(_("You must specify at least one allowed role or user for a confidential Stock Entry."))
 
     if not doc.is_new():
@@ -153,13 +177,7 @@ def set_stock_entry_confidentiality(doc, method=None):
     except frappe.DoesNotExistError:
         return
 
-    if bom.is_confidential:
-        doc.is_confidential = 1
-        _copy_access_lists(bom, doc)
-    else:
-        doc.is_confidential = 0
-        doc.set("allowed_roles", [])
-        doc.set("allowed_users", [])
+    link_bom_profile(bom, doc)
 
 
 # ---------------------------------------------------------------------------
@@ -177,15 +195,19 @@ def validate_work_order_permissions_on_save(doc, method=None):
         return
 
     if _user_can_change_confidentiality():
-        if doc.is_confidential and not doc.get("allowed_roles") and not doc.get("allowed_users"):
+        if doc.is_confidential and not _has_acl(doc):
             frappe.throw(_("You must specify at least one allowed role or user for a confidential Work Order."))
         return
 
+    # Access to the BOM does not extend to repointing the shared profile
+    if not doc.is_new():
+        _block_acl_profile_change(doc, "Work Order")
+
     if doc.bom_no:
         if _user_has_doc_access("BOM", doc.bom_no, frappe.session.user):
             return
 
-    if doc.is_confidential and not doc.get("allowed_roles") and not doc.get("allowed_users"):
+    if doc.is_confidential and not _has_acl(doc):
         frappe.throw(_("You must specify at least one allowed role or user for a confidential Work Order."))
 
     if not doc.is_new():
@@ -210,13 +232,7 @@ def set_work_order_confidentiality(doc, method=None):
     except frappe.DoesNotExistError:
         return
 
-    if bom.is_confidential:
-        doc.is_confidential = 1
-        _copy_access_lists(bom, doc)
-    else:
-        doc.is_confidential = 0
-        doc.set("allowed_roles", [])
-        doc.set("allowed_users", [])
+    link_bom_profile(bom, doc)
 
 
 # ---------------------------------------------------------------------------
@@ -229,17 +245,9 @@ def _block_confidentiality_modification(doc, doctype):
     if not old_doc:
         return
 
-    confidentiality_changed = old_doc.is_confidential != doc.is_confidential
-
-    old_roles = {d.role for d in old_doc.get("allowed_roles", [])}
-    new_roles = {d.role for d in doc.get("allowed_roles", [])}
-    roles_changed = old_roles != new_roles
+    _block_acl_profile_change(doc, doctype)
 
-    old_users = {d.user for d in old_doc.get("allowed_users", [])}
-    new_users = {d.user for d in doc.get("allowed_users", [])}
-    users_changed = old_users != new_users
-
-    if confidentiality_changed or roles_changed or users_changed:
+    if get_stored_acl_hash(old_doc) != get_acl_hash(doc):
         frappe.throw(
             _("Only System Manager or Confidential Manager can change the confidentiality "
               "settings of an existing {0}.").format(doctype),
@@ -247,19 +255,28 @@ def _block_confidentiality_modification(doc, doctype):
         )
 
 
-def _copy_access_lists(source_doc, target_doc):
-    """Copy allowed_roles and allowed_users from source to target document."""
-    target_doc.set("allowed_roles", [])
-    for role_row in source_doc.get("allowed_roles", []):
-        target_doc.append("allowed_roles", {"role": role_row.role})
+def _block_acl_profile_change(doc, doctype):
+    """Prevent non-admins from repointing or clearing acl_profile on existing docs.
+
+    acl_profile is not part of acl_hash, so the hash comparison does not
+    see it; only link_bom_profile / detach_overridden_profile may change it
+    (they set ``doc.flags.acl_profile_change_allowed``).
+    """
+    old_doc = doc.get_doc_before_save()
+    if not old_doc or doc.flags.acl_profile_change_allowed:
+        return
+
+    if (old_doc.get("acl_profile") or None) != (doc.get("acl_profile") or None):
+        frappe.throw(
+            _("Only System Manager or Confidential Manager can change the ACL profile "
+              "of an existing {0}.").format(doctype),
+            frappe.PermissionError,
+        )
+
 
-    target_doc.set("allowed_users", [])
-    for user_row in source_doc.get("allowed_users", []):
-        target_doc.append("allowed_users", {
-            "user": user_row.user,
-            "valid_from": user_row.valid_from,
-            "valid_until": user_row.valid_until,
-        })
+def _has_acl(doc):
+    """True if *doc* has allowed roles / users of its own or shares an ACL profile."""
+    return bool(doc.get("acl_profile") or doc.get("allowed_roles") or doc.get("allowed_users"))
 
 
 def _check_confidentiality_change_notifications(doc):
@@ -295,54 +312,3 @@ def _fire_notification(doc, action):
         notify_confidentiality_change(doc, action)
     except Exception:
         pass
-
-
-def _update_linked_documents(bom_doc, doctype):
-    """Update all linked documents of a given type when BOM confidentiality changes."""
-    linked_docs = frappe.get_all(
-        doctype,
-        filters={"bom_no": bom_doc.name, "docstatus": ["in", [0, 1]]},
-        pluck="name",
-    )
-
-    for doc_name in linked_docs:
-        try:
-            linked = frappe.get_doc(doctype, doc_name)
-            needs_update = False
-
-            if linked.is_confidential != bom_doc.is_confidential:
-                linked.is_confidential = bom_doc.is_confidential
-                needs_update = True
-
-            current_roles = {d.role for d in linked.get("allowed_roles", [])}
-            new_roles = {d.role for d in bom_doc.get("allowed_roles", [])}
-            if current_roles != new_roles:
-                linked.set("allowed_roles", [])
-                for role_name in new_roles:
-                    linked.append("allowed_roles", {"role": role_name})
-                needs_update = True
-
-            current_users = {d.user for d in linked.get("allowed_users", [])}
-            new_users_data = bom_doc.get("allowed_users", [])
-            new_user_names = {d.user for d in new_users_data}
-            if current_users != new_user_names:
-                linked.set("allowed_users", [])
-                for user_row in new_users_data:
-                    linked.append("allowed_users", {
-                        "user": user_row.user,
-                        "valid_from": user_row.valid_from,
-                        "valid_until": user_row.valid_until,
-                    })
-                needs_update = True
-
-            if needs_update:
-                linked.flags.ignore_permissions = True
-                linked.flags.ignore_validate = True
-                linked.flags.ignore_mandatory = True
-                linked.save()
-                debug_log(f"Updated {doctype} {doc_name} based on BOM {bom_doc.name} change")
-        except Exception as e:
-            frappe.log_error(
-                f"Error propagating confidentiality to {doctype} {doc_name}: {e}",
-                "Confidential Propagation Error",
-            )
@@ -3,7 +3,10 @@ Lifecycle event handlers for the Confidential App.
 Registered in hooks.py under on_login, on_app_update, etc.
 """
 
-from confidential_app.confidential_app.utils.permissions import clear_permission_cache
+from confidential_app.confidential_app.utils.permissions import (
+    clear_permission_cache,
+    invalidate_user_permissions,
+)
 
 
 def on_app_update():
@@ -12,18 +15,47 @@ def on_app_update():
 
 
 def on_login(login_manager):
-    """Clear permission cache when user logs in."""
-    clear_permission_cache()
+    """Invalidate the logging-in user's cached permission decisions."""
+    invalidate_user_permissions(login_manager.user)
 
 
 def after_migrate():
-    """Clear permission cache and sync custom fields after migrations."""
+    """Clear permission cache, sync custom fields and ACL indexes after migrations."""
     clear_permission_cache()
     try:
         from confidential_app.confidential_app.install import create_required_custom_fields
         create_required_custom_fields()
     except Exception:
         pass
+    ensure_acl_indexes()
+
+
+def ensure_acl_indexes():
+    """Create the composite ACL indexes and check the permission queries use them.
+
+    Never fails the migration: missing indexes and unexpected query plans
+    are written to the Error Log only.
+    """
+    import frappe
+    from confidential_app.confidential_app.utils.indexes import (
+        ensure_confidential_indexes,
+        verify_permission_query_plan,
+    )
+
+    try:
+        ensure_confidential_indexes()
+    except Exception:
+        frappe.log_error("Failed to create Confidential ACL indexes", frappe.get_traceback())
+        return
+
+    try:
+        problems = verify_permission_query_plan()
+    except Exception:
+        frappe.log_error("Failed to EXPLAIN Confidential permission queries", frappe.get_traceback())
+        return
+
+    if problems:
+        frappe.log_error("\n".join(problems), "Confidential permission queries not using ACL indexes")
 
 
 def after_sync_fixtures():
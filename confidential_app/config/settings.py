@@ -10,6 +10,42 @@ DEBUG_MODE = os.environ.get('CONFIDENTIAL_DEBUG', '0') == '1'
 # Permission cache timeout in seconds (5 minutes)
 PERMISSION_CACHE_TIMEOUT = 300
 
+# Maximum number of BOM names accepted by check_bom_permissions in one call
+MAX_BULK_PERMISSION_CHECK = 5000
+
+# Compiled permission-query fragments kept per worker process (LRU)
+QUERY_CONDITION_CACHE_SIZE = 2048
+
+# Journaled Confidential Access Log events written per multi-row INSERT
+ACCESS_LOG_FLUSH_BATCH = 1000
+
+# Access log rows deleted per transaction when archiving (keeps row locks short)
+AUDIT_ARCHIVE_BATCH = 1000
+
+# Archive directory under the site's private/files
+AUDIT_ARCHIVE_DIR = 'confidential_audit_archive'
+
+# Access log rows younger than this are left for the next rollup run
+# (lets out-of-order commits of the batched writer land first)
+ROLLUP_LAG_MINUTES = 15
+
+# Width of one denial counter bucket; the burst window is covered by
+# window / bucket HyperLogLogs of denied documents that expire on their own
+DENIAL_BUCKET_SECONDS = 60
+
+# Linked Stock Entries / Work Orders rewritten per set-based propagation batch
+PROPAGATION_CHUNK = 500
+
+# A Queued / Running propagation job untouched for this long is re-enqueued
+# by the scheduler (its worker is assumed dead)
+PROPAGATION_STALE_MINUTES = 10
+
+# Failed propagation jobs are retried by the scheduler up to this many runs
+PROPAGATION_MAX_ATTEMPTS = 3
+
+# Entries kept in the Redis debug ring buffer (Confidential Settings -> Debug Logs)
+DEBUG_LOG_MAX_ENTRIES = 500
+
 # Roles with special access
 CONFIDENTIAL_ROLES = ['Confidential Manager', 'Confidential User']
 
@@ -22,6 +58,14 @@ MANAGED_DOCTYPES = ['BOM', 'Stock Entry', 'Work Order']
 # Default roles to assign when creating a new confidential doctype
 DEFAULT_ALLOWED_ROLES = ['Confidential Manager']
 
+# Sub-BOM cascade evaluation modes (Confidential Settings -> sub_bom_cascade_mode)
+CASCADE_MODE_CLOSURE = 'Closure Table'
+CASCADE_MODE_CTE = 'Recursive CTE'
+CASCADE_MODE_PYTHON = 'Python'
+
+# Recursion guard for the recursive CTE cascade (BOM cycles never terminate a UNION on depth)
+SUB_BOM_MAX_DEPTH = 64
+
 def get_settings():
     """
     Get system-specific settings from database, falling back to defaults
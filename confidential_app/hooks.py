@@ -30,12 +30,18 @@ fixtures = [
                 "BOM-is_confidential",
                 "BOM-allowed_roles",
                 "BOM-allowed_users",
+                "BOM-acl_hash",
+                "BOM-acl_profile",
                 "Stock Entry-is_confidential",
                 "Stock Entry-allowed_roles",
                 "Stock Entry-allowed_users",
+                "Stock Entry-acl_hash",
+                "Stock Entry-acl_profile",
                 "Work Order-is_confidential",
                 "Work Order-allowed_roles",
-                "Work Order-allowed_users"
+                "Work Order-allowed_users",
+                "Work Order-acl_hash",
+                "Work Order-acl_profile"
             ]]
         ]
     },
@@ -72,16 +78,74 @@ has_permission = {
 # Document Events
 doc_events = {
     "BOM": {
-        "validate": "confidential_app.confidential_app.utils.validations.validate_bom_permissions_on_save",
-        "on_update_after_submit": "confidential_app.confidential_app.utils.validations.update_stock_entries_on_bom_change"
+        "validate": [
+            "confidential_app.confidential_app.utils.validations.set_acl_hash",
+            "confidential_app.confidential_app.utils.validations.validate_bom_permissions_on_save"
+        ],
+        "before_update_after_submit": "confidential_app.confidential_app.utils.validations.set_acl_hash",
+        "on_update": [
+            "confidential_app.confidential_app.utils.validations.clear_acl_cache",
+            "confidential_app.confidential_app.utils.effective_access.on_doc_update",
+            "confidential_app.confidential_app.utils.acl_profile.on_bom_update",
+            "confidential_app.confidential_app.utils.bom_closure.on_bom_update"
+        ],
+        "on_update_after_submit": [
+            "confidential_app.confidential_app.utils.validations.clear_acl_cache",
+            "confidential_app.confidential_app.utils.effective_access.on_doc_update",
+            "confidential_app.confidential_app.utils.acl_profile.on_bom_update",
+            "confidential_app.confidential_app.utils.validations.update_stock_entries_on_bom_change"
+        ],
+        "on_trash": [
+            "confidential_app.confidential_app.utils.effective_access.on_doc_trash",
+            "confidential_app.confidential_app.utils.acl_profile.on_bom_trash",
+            "confidential_app.confidential_app.utils.bom_closure.on_bom_trash"
+        ]
     },
     "Stock Entry": {
-        "validate": "confidential_app.confidential_app.utils.validations.validate_stock_entry_permissions_on_save",
-        "before_insert": "confidential_app.confidential_app.utils.validations.set_stock_entry_confidentiality"
+        "validate": [
+            "confidential_app.confidential_app.utils.validations.set_acl_hash",
+            "confidential_app.confidential_app.utils.validations.validate_stock_entry_permissions_on_save"
+        ],
+        "before_update_after_submit": "confidential_app.confidential_app.utils.validations.set_acl_hash",
+        "before_insert": "confidential_app.confidential_app.utils.validations.set_stock_entry_confidentiality",
+        "on_update": [
+            "confidential_app.confidential_app.utils.validations.clear_acl_cache",
+            "confidential_app.confidential_app.utils.effective_access.on_doc_update"
+        ],
+        "on_update_after_submit": [
+            "confidential_app.confidential_app.utils.validations.clear_acl_cache",
+            "confidential_app.confidential_app.utils.effective_access.on_doc_update"
+        ],
+        "on_trash": "confidential_app.confidential_app.utils.effective_access.on_doc_trash"
     },
     "Work Order": {
-        "validate": "confidential_app.confidential_app.utils.validations.validate_work_order_permissions_on_save",
-        "before_insert": "confidential_app.confidential_app.utils.validations.set_work_order_confidentiality"
+        "validate": [
+            "confidential_app.confidential_app.utils.validations.set_acl_hash",
+            "confidential_app.confidential_app.utils.validations.validate_work_order_permissions_on_save"
+        ],
+        "before_update_after_submit": "confidential_app.confidential_app.utils.validations.set_acl_hash",
+        "before_insert": "confidential_app.confidential_app.utils.validations.set_work_order_confidentiality",
+        "on_update": [
+            "confidential_app.confidential_app.utils.validations.clear_acl_cache",
+            "confidential_app.confidential_app.utils.effective_access.on_doc_update"
+        ],
+        "on_update_after_submit": [
+            "confidential_app.confidential_app.utils.validations.clear_acl_cache",
+            "confidential_app.confidential_app.utils.effective_access.on_doc_update"
+        ],
+        "on_trash": "confidential_app.confidential_app.utils.effective_access.on_doc_trash"
+    },
+    "User": {
+        "on_update": [
+            "confidential_app.confidential_app.utils.validations.clear_user_permission_cache",
+            "confidential_app.confidential_app.utils.notifications.clear_manager_cache"
+        ],
+        "on_trash": "confidential_app.confidential_app.utils.notifications.clear_manager_cache"
+    },
+    "Has Role": {
+        "after_insert": "confidential_app.confidential_app.utils.notifications.clear_manager_cache",
+        "on_update": "confidential_app.confidential_app.utils.notifications.clear_manager_cache",
+        "on_trash": "confidential_app.confidential_app.utils.notifications.clear_manager_cache"
     },
     "Confidential Access Request": {
         "after_insert": "confidential_app.confidential_app.utils.notifications.notify_access_request_submitted"
@@ -93,8 +157,39 @@ boot_session = "confidential_app.boot.boot_session"
 
 after_app_install = "confidential_app.confidential_app.override.bom_override.apply_patches"
 
-# Apply monkey-patches on first request if boot_session hasn't fired yet
-before_request = ["confidential_app.confidential_app.override.bom_override.apply_patches"]
+# Apply monkey-patches on first request if boot_session hasn't fired yet, and
+# register the names a bulk request (print-all, bulk actions) is about to check
+before_request = [
+    "confidential_app.confidential_app.override.bom_override.apply_patches",
+    "confidential_app.confidential_app.utils.permissions.register_request_candidates",
+]
+
+# Write journaled Confidential Access Log events once the request / job is done,
+# and publish the permission trace (if enabled)
+after_request = [
+    "confidential_app.confidential_app.utils.audit.flush_after_request",
+    "confidential_app.confidential_app.utils.trace.after_request"
+]
+after_job = ["confidential_app.confidential_app.utils.audit.flush_after_request"]
+
+# Scheduled Tasks
+scheduler_events = {
+    "all": [
+        "confidential_app.confidential_app.utils.audit.flush_pending",
+        "confidential_app.confidential_app.utils.propagation.resume_propagation_jobs"
+    ],
+    "hourly": [
+        "confidential_app.confidential_app.utils.notifications.send_notification_digests"
+    ],
+    "daily_long": [
+        "confidential_app.confidential_app.utils.audit_archive.archive_access_log_job"
+    ],
+    "cron": {
+        "*/15 * * * *": [
+            "confidential_app.confidential_app.utils.audit_rollup.refresh_access_rollups_job"
+        ]
+    }
+}
 
 # Overriding Methods
 override_whitelisted_methods = {
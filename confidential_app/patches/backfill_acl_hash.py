@@ -0,0 +1,8 @@
+from confidential_app.confidential_app.install import create_required_custom_fields
+from confidential_app.confidential_app.utils.acl_hash import backfill_acl_hashes
+
+
+def execute():
+    # The acl_hash custom field is otherwise only created in after_migrate.
+    create_required_custom_fields()
+    backfill_acl_hashes()
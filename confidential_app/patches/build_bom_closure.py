@@ -0,0 +1,5 @@
+from confidential_app.confidential_app.utils.bom_closure import rebuild_bom_closure
+
+
+def execute():
+    rebuild_bom_closure()
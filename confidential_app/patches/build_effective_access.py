@@ -0,0 +1,5 @@
+from confidential_app.confidential_app.utils.effective_access import rebuild_effective_access
+
+
+def execute():
+    rebuild_effective_access()
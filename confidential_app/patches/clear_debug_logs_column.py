@@ -0,0 +1,6 @@
+import frappe
+
+
+def execute():
+    # Debug entries moved to a Redis ring buffer; drop the old text blob.
+    frappe.db.set_single_value("Confidential Settings", "debug_logs", "", update_modified=False)
@@ -0,0 +1,7 @@
+from confidential_app.confidential_app.install import create_required_custom_fields
+from confidential_app.confidential_app.utils.acl_profile import migrate_to_acl_profiles
+
+
+def execute():
+    create_required_custom_fields()
+    migrate_to_acl_profiles()
@@ -1,5 +1,31 @@
 frappe.ui.form.on("BOM", {
+  setup: function (frm) {
+    frappe.realtime.on("confidential_propagation_progress", function (data) {
+      if (data.bom === frm.doc.name) {
+        confidential_app.showPropagationProgress(frm, data);
+      }
+    });
+  },
+
   refresh: function (frm) {
+    if (!frm.is_new() && frm.doc.docstatus === 1) {
+      frappe.call({
+        method:
+          "confidential_app.confidential_app.utils.propagation.get_propagation_status",
+        args: { bom: frm.doc.name },
+        callback: function (r) {
+          if (r.message && r.message.status !== "Completed") {
+            confidential_app.showPropagationProgress(frm, {
+              job: r.message.name,
+              status: r.message.status,
+              processed: r.message.processed_count,
+              total: r.message.total_count,
+            });
+          }
+        },
+      });
+    }
+
     if (frm.doc.is_confidential) {
       frm.page.set_indicator(__("Confidential"), "red");
       frm.set_intro(
@@ -7,6 +7,9 @@ frappe.provide("confidential_app");
 
 confidential_app.checkPrintPermission = function (frm) {
   if (!frm.doc.is_confidential) return true;
+  // Roles / users of a shared ACL profile are not on the form; the server
+  // checked them when the document was loaded and checks again on print.
+  if (frm.doc.acl_profile) return true;
 
   var hasAccess =
     frappe.user_roles.includes("System Manager") ||
@@ -40,6 +43,51 @@ confidential_app.checkPrintPermission = function (frm) {
   return true;
 };
 
+confidential_app.checkBomPermissions = function (boms) {
+  // Resolves to a { bom_name: true/false } map in a single round trip.
+  return frappe
+    .call({
+      method:
+        "confidential_app.confidential_app.utils.permissions.check_bom_permissions",
+      args: { boms: boms },
+    })
+    .then(function (r) {
+      return r.message || {};
+    });
+};
+
+confidential_app.showPropagationProgress = function (frm, data) {
+  // data: { job, status, processed, total } from the propagation job.
+  var title = __("Confidentiality propagation");
+  if (data.status === "Completed") {
+    frm.dashboard.hide_progress(title);
+    frappe.show_alert({
+      message: __("Confidentiality propagated to {0} linked documents", [
+        data.processed,
+      ]),
+      indicator: "green",
+    });
+    return;
+  }
+  if (data.status === "Failed") {
+    frm.dashboard.hide_progress(title);
+    frm.dashboard.set_headline_alert(
+      __(
+        "Propagation of this BOM's access settings failed and will be retried. See {0}.",
+        [frappe.utils.get_form_link("Confidential Propagation Job", data.job, true)]
+      ),
+      "red"
+    );
+    return;
+  }
+  var percent = data.total ? (data.processed / data.total) * 100 : 0;
+  frm.dashboard.show_progress(
+    title,
+    percent,
+    __("{0} of {1} linked documents updated", [data.processed, data.total])
+  );
+};
+
 confidential_app.requestAccess = function (doctype, docName) {
   frappe.prompt(
     [